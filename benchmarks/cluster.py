@@ -0,0 +1,186 @@
+"""
+Run the cluster launcher against a stand-in for Discord.
+
+Run from the root of the repository:
+
+    python -m benchmarks.cluster [processes] [shards] [guilds]
+
+The launcher starts its processes as it would in production, but the bots
+talk to benchmarks.fake_discord. The harness checks that:
+
+- every shard IDENTIFYs once, and never two within the IDENTIFY interval;
+- a command sent in every guild is answered exactly once, by the process
+  serving the guild;
+- a process that is killed is started again, and its guilds are answered
+  again once its shards are back.
+"""
+
+
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+from functools import partial
+from time import perf_counter
+from typing import Dict, List
+
+import launcher
+from benchmarks.fake_discord import FakeDiscord
+
+
+# shorter than Discord's, so that the harness doesn't take long
+IDENTIFY_INTERVAL = 0.5
+RESTART_DELAY = 1.0
+
+# how long a bot waits for the last GUILD_CREATE before it's ready, and
+# then some
+READY_DELAY = 3.0
+
+
+def worker(api_base: str, identify_interval: float, cluster_id: int,
+            shard_ids: List[int], shard_count: int, identify_slot) -> None:
+    """Run a process of the cluster against the stand-in."""
+
+    import discord.http
+    discord.http.Route.BASE = api_base
+
+    import bot
+    bot.ShardedSVBot.identify_interval = identify_interval
+
+    # only errors; the database and the calendar can't be reached here
+    logging.disable(logging.WARNING)
+
+    launcher.run_cluster(cluster_id, shard_ids, shard_count, identify_slot)
+
+
+def set_environment(scratch: str) -> None:
+    stickers = os.path.join(scratch, 'stickers.txt')
+    with open(stickers, 'w') as f:
+        f.write('hello https://example.com/hello.png\n')
+
+    os.environ.update({
+        'DISCORD_TOKEN': 'harness',
+        'DISCORD_CMD_PREFIX': '!',
+        'GOOGLE_API_KEY': 'harness',
+        'TZ_FILENAME': 'tzinfo.txt',
+        'S_FILENAME': stickers,
+        'HAND_RANKS_FILENAME': os.path.join(scratch, 'hand_ranks.bin'),
+        # nothing listens there, so connecting fails straight away
+        'DATABASE_URL': 'postgresql://svbot@127.0.0.1:9/svbot',
+        'RUNNING_ON_HEROKU': '1',
+    })
+
+
+async def ask_every_guild(fake: FakeDiscord, round_no: int) -> List[float]:
+    """
+    Send !id in every guild and check every one is answered once.
+
+    Return the time each answer took, in seconds.
+    """
+
+    sent_before = len(fake.sent)
+    asked: Dict[int, float] = {}
+    for i, guild_id in enumerate(fake.guilds):
+        author = fake.user_id(round_no * len(fake.guilds) + i)
+        asked[fake.guilds[guild_id]] = perf_counter()
+        if not await fake.message(guild_id, author, '!id'):
+            raise AssertionError(f"Guild {guild_id} has no shard.")
+
+    try:
+        await fake.wait_for_sent(sent_before + len(asked))
+    except asyncio.TimeoutError:
+        pass
+    # answers that would come twice
+    await asyncio.sleep(0.5)
+
+    answers = fake.sent[sent_before:]
+    by_channel: Dict[int, List[float]] = {}
+    for answer in answers:
+        by_channel.setdefault(answer.channel_id, []).append(answer.time)
+
+    missing = [c for c in asked if c not in by_channel]
+    twice = [c for c, times in by_channel.items() if len(times) > 1]
+    if missing or twice:
+        raise AssertionError(
+            f"{len(missing)} channels weren't answered, {len(twice)} were "
+            "answered more than once."
+        )
+
+    return [by_channel[c][0] - t for c, t in asked.items()]
+
+
+def report(name: str, latencies: List[float]) -> None:
+    latencies = sorted(latencies)
+    p95 = latencies[int(0.95 * (len(latencies) - 1))]
+    print(
+        f"{name:<28} {len(latencies):>5} answers "
+        f"median {1e3 * statistics.median(latencies):7.1f} ms "
+        f"p95 {1e3 * p95:7.1f} ms"
+    )
+
+
+async def run(processes: int, shard_count: int, guilds: int) -> None:
+    fake = FakeDiscord(guilds, shard_count)
+    await fake.start()
+
+    launcher.RESTART_DELAY = RESTART_DELAY
+    cluster = launcher.Launcher(
+        shard_count, processes,
+        target=partial(worker, fake.api_base, IDENTIFY_INTERVAL)
+    )
+
+    async def supervise():
+        while True:
+            cluster.check()
+            await asyncio.sleep(0.1)
+
+    start = perf_counter()
+    cluster.start()
+    supervisor = asyncio.get_event_loop().create_task(supervise())
+    try:
+        await fake.wait_for_shards(list(range(shard_count)))
+        print(
+            f"{shard_count} shards in {len(cluster.ranges)} processes "
+            f"identified after {perf_counter() - start:.1f}s"
+        )
+
+        times = sorted(i.time for i in fake.identifies)
+        gaps = [b - a for a, b in zip(times, times[1:])]
+        if gaps:
+            print(f"shortest gap between IDENTIFYs: {min(gaps):.2f}s")
+            if min(gaps) < 0.9 * IDENTIFY_INTERVAL:
+                raise AssertionError("Two shards IDENTIFYed too close.")
+        if len(fake.identifies) != shard_count:
+            raise AssertionError("A shard IDENTIFYed more than once.")
+
+        await asyncio.sleep(READY_DELAY)
+        report("every guild", await ask_every_guild(fake, 0))
+
+        # kill the first process and wait for its shards to come back
+        killed = cluster.ranges[0]
+        killed_at = perf_counter()
+        cluster.processes[0].kill()
+        await fake.wait_for_shards(killed, since=killed_at)
+        print(
+            f"cluster 0 (shards {killed[0]}-{killed[-1]}) back after "
+            f"{perf_counter() - killed_at:.1f}s, {cluster.restarts} restart"
+        )
+
+        await asyncio.sleep(READY_DELAY)
+        report("every guild, after restart", await ask_every_guild(fake, 1))
+    finally:
+        supervisor.cancel()
+        cluster.stop()
+        await fake.stop()
+
+
+def main(processes: int = 2, shard_count: int = 4, guilds: int = 40) -> None:
+    with tempfile.TemporaryDirectory() as scratch:
+        set_environment(scratch)
+        asyncio.run(run(processes, shard_count, guilds))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,135 @@
+"""
+Serve !dog from the ImageBuffer against a local stand-in for the dog API.
+
+Run from the root of the repository:
+
+    python -m benchmarks.dog_buffer [requests] [channels]
+
+The stand-in answers like api.thedogapi.com/v1/images/search, picking from
+a small pool of pictures after a fixed delay. The harness compares asking
+the API once per command with taking pictures from the buffer, checks that
+no channel is shown a picture it was shown lately, and that the buffer
+backs off while the API fails and fills up again once it's back.
+"""
+
+
+import asyncio
+import random
+import statistics
+import sys
+from time import perf_counter
+from typing import List
+
+from benchmarks.fake_services import FakeDogAPI
+from cogs.DogPictureAux import Buffer
+from cogs.DogPictureAux.Buffer import Image, ImageBuffer
+from cogs.utils.web import HTTPClient, RequestFailed
+
+
+# seconds the stand-in takes to answer
+API_DELAY = 0.08
+BATCH_SIZE = 10
+
+
+def report(name: str, latencies: List[float]) -> None:
+    latencies = sorted(latencies)
+    p95 = latencies[int(0.95 * (len(latencies) - 1))]
+    print(
+        f"{name:<22} {len(latencies):>5} pictures "
+        f"median {1e3 * statistics.median(latencies):7.2f} ms "
+        f"p95 {1e3 * p95:7.2f} ms"
+    )
+
+
+async def run(requests: int, channels: int) -> None:
+    api = FakeDogAPI(API_DELAY)
+    await api.start()
+    http = HTTPClient(retries=0)
+
+    async def fetch(count: int) -> List[Image]:
+        resp = await http.get(
+            api.url, endpoint='dog', params={'limit': min(count, BATCH_SIZE)}
+        )
+        if resp.status != 200:
+            raise RequestFailed(f"The dog API answered {resp.status}.")
+        return [Image(i['id'], i['url']) for i in resp.json()]
+
+    rng = random.Random(1)
+    try:
+        # one request per command, as before
+        latencies = []
+        for _ in range(requests // 10):
+            start = perf_counter()
+            await fetch(1)
+            latencies.append(perf_counter() - start)
+        report("a request per !dog", latencies)
+        direct_requests = api.requests
+
+        # from the buffer, filled before the first command like the cog
+        buffer = ImageBuffer(fetch)
+        await buffer.refill()
+        api.requests = 0
+
+        latencies = []
+        shown = {c: [] for c in range(channels)}
+        for _ in range(requests):
+            channel = rng.randrange(channels)
+            start = perf_counter()
+            image = await buffer.take(channel)
+            latencies.append(perf_counter() - start)
+            shown[channel].append(image.id)
+
+            # commands don't come back to back
+            await asyncio.sleep(0.01)
+        report("from the buffer", latencies)
+        print(
+            f"API requests: {direct_requests / (requests // 10):.2f} per "
+            f"picture before, {api.requests / requests:.2f} with the buffer"
+        )
+
+        repeats = sum(
+            ids[i] in ids[max(0, i - Buffer.RECENT_SIZE):i]
+            for ids in shown.values() for i in range(len(ids))
+        )
+        print(f"repeats within the last {Buffer.RECENT_SIZE}: {repeats}")
+        if repeats:
+            raise AssertionError("A channel was shown a recent picture.")
+
+        # the API fails: commands are answered straight away, with no
+        # picture once the buffer is empty, and the API isn't hammered
+        api.failing = True
+        api.requests = 0
+        start = perf_counter()
+        empty = 0
+        while perf_counter() - start < 5.0:
+            t = perf_counter()
+            if await buffer.take(0) is None:
+                empty += 1
+                if perf_counter() - t > 2 * API_DELAY:
+                    raise AssertionError("An empty buffer kept a command.")
+            await asyncio.sleep(0.01)
+        print(
+            f"API down for 5s: {empty} commands without a picture, "
+            f"{api.requests} API requests, {buffer.failures} failures"
+        )
+        if api.requests > 5:
+            raise AssertionError("The buffer didn't back off.")
+
+        # and back: the buffer fills up once the delay is over
+        api.failing = False
+        start = perf_counter()
+        while not len(buffer):
+            buffer.refill()
+            await asyncio.sleep(0.05)
+        print(f"API back: pictures again after {perf_counter() - start:.1f}s")
+    finally:
+        await http.close()
+        await api.stop()
+
+
+def main(requests: int = 1000, channels: int = 5) -> None:
+    asyncio.run(run(requests, channels))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
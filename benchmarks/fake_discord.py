@@ -0,0 +1,473 @@
+"""
+A stand-in for Discord, to run the bot against on one machine.
+
+It serves the parts of the REST API and of the gateway that the bot uses:
+logging in, finding the gateway, IDENTIFYing shards, heartbeats, the guilds
+of every shard, opening DMs and sending messages. Guild i is served by shard
+i % shard_count. Messages can be sent to the bot as if a member wrote them,
+mentioning other members, and everything the bot sends is recorded.
+
+Sending messages is rate limited like Discord does it: per channel, and
+globally for the bot. A request over a limit gets a 429 telling the bot
+how long to wait, and every request gets the X-RateLimit headers.
+
+discord.py is pointed at it by setting discord.http.Route.BASE to
+api_base before the bot logs in.
+"""
+
+
+import asyncio
+import json
+from collections import deque
+from datetime import datetime, timezone
+from time import perf_counter
+from typing import (
+    Any, Callable, Deque, Dict, List, NamedTuple, Optional, Sequence, Tuple
+)
+
+from aiohttp import WSMsgType, web
+
+
+HEARTBEAT_INTERVAL = 41250
+
+# snowflakes are made by shifting these left by 22 bits, like Discord's
+_GUILD_BASE = 1000000
+_USER_BASE = 2000000
+BOT_ID = 3000000 << 22
+
+# messages a bot may send to a channel, and requests it may make in all,
+# per that many seconds
+CHANNEL_RATE_LIMIT = (5, 5.0)
+GLOBAL_RATE_LIMIT = (50, 1.0)
+
+RateLimit = Optional[Tuple[int, float]]
+
+
+class Identify(NamedTuple):
+    """An IDENTIFY the gateway received."""
+
+    time: float
+    shard_id: int
+    shard_count: int
+
+
+class Sent(NamedTuple):
+    """A message the bot sent."""
+
+    time: float
+    channel_id: int
+    content: str
+
+
+def _user(user_id: int) -> Dict[str, Any]:
+    return {
+        'id': str(user_id), 'username': f'user{user_id >> 22}',
+        'discriminator': '0001', 'avatar': None, 'bot': user_id == BOT_ID,
+    }
+
+
+def _json(data: Any, status: int = 200,
+            headers: Optional[Dict[str, str]] = None) -> web.Response:
+    # discord.py only parses a body whose type is exactly application/json
+    return web.Response(
+        status=status, body=json.dumps(data).encode(),
+        headers=dict(headers or {}, **{'Content-Type': 'application/json'})
+    )
+
+
+class _Window:
+    """The times of the requests in the last per seconds, for a limit."""
+
+    def __init__(self, rate: int, per: float) -> None:
+        self.rate = rate
+        self.per = per
+        self._times: Deque[float] = deque()
+
+    def hit(self, now: float) -> float:
+        """Count a request; return how long to wait if it's over the limit."""
+
+        while self._times and self._times[0] <= now - self.per:
+            self._times.popleft()
+
+        if len(self._times) >= self.rate:
+            return self._times[0] + self.per - now
+
+        self._times.append(now)
+        return 0.0
+
+    def headers(self, now: float) -> Dict[str, str]:
+        reset_after = (
+            self._times[0] + self.per - now if self._times else self.per
+        )
+        return {
+            'X-RateLimit-Limit': str(self.rate),
+            'X-RateLimit-Remaining': str(self.rate - len(self._times)),
+            'X-RateLimit-Reset-After': f'{reset_after:.3f}',
+        }
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _member() -> Dict[str, Any]:
+    """Return what makes a user a member of a guild, with no roles."""
+
+    return {'roles': [], 'joined_at': _now(), 'deaf': False, 'mute': False}
+
+
+class FakeDiscord:
+    """The REST API and the gateway, served on a local port."""
+
+    def __init__(self, guilds: int = 8, shard_count: int = 2,
+                    host: str = '127.0.0.1', port: int = 0,
+                    channel_name: str = 'general',
+                    channel_rate_limit: RateLimit = CHANNEL_RATE_LIMIT,
+                    global_rate_limit: RateLimit = GLOBAL_RATE_LIMIT
+                    ) -> None:
+        self.shard_count = shard_count
+        self.host = host
+        self.port = port
+        self.channel_name = channel_name
+        self.channel_rate_limit = channel_rate_limit
+        self.global_rate_limit = global_rate_limit
+
+        # guild id -> the id of its text channel, named channel_name
+        self.guilds: Dict[int, int] = {}
+        for i in range(guilds):
+            guild_id = (_GUILD_BASE + i) << 22
+            self.guilds[guild_id] = guild_id + 1
+
+        self.identifies: List[Identify] = []
+        self.sent: List[Sent] = []
+
+        # requests answered with a 429, per channel and globally
+        self.rate_limited = 0
+        self.globally_rate_limited = 0
+        self._channel_windows: Dict[int, _Window] = {}
+        self._global_window = (
+            _Window(*global_rate_limit) if global_rate_limit else None
+        )
+
+        # shard id -> the websocket connected for it
+        self._shards: Dict[int, web.WebSocketResponse] = {}
+        self._sequence: Dict[int, int] = {}
+        self._next_id = 1 << 40
+
+        # set whenever the bot sends a message, and the futures waiting for
+        # the next message to a channel
+        self._sent_event = asyncio.Event()
+        self._waiters: Dict[int, List[asyncio.Future]] = {}
+
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def api_base(self) -> str:
+        return f'http://{self.host}:{self.port}/api/v7'
+
+    def shard_of(self, guild_id: int) -> int:
+        return (guild_id >> 22) % self.shard_count
+
+    def connected(self) -> List[int]:
+        """Return the shards that are connected, sorted."""
+
+        return sorted(
+            shard_id for shard_id, ws in self._shards.items()
+            if not ws.closed
+        )
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get('/api/v7/users/@me', self._me)
+        app.router.add_get('/api/v7/gateway', self._gateway)
+        app.router.add_get('/api/v7/gateway/bot', self._gateway_bot)
+        app.router.add_post('/api/v7/users/@me/channels', self._create_dm)
+        app.router.add_post(
+            '/api/v7/channels/{channel_id}/messages', self._create_message
+        )
+        app.router.add_get('/gateway', self._websocket)
+
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+
+        # the port the OS chose, if it was 0
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        for ws in list(self._shards.values()):
+            await ws.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def wait_for_shards(self, shard_ids: List[int],
+                                since: float = 0.0,
+                                timeout: float = 60.0) -> None:
+        """Wait till every shard in shard_ids has IDENTIFYed after since."""
+
+        async def wait():
+            while True:
+                done = {i.shard_id for i in self.identifies if i.time > since}
+                if set(shard_ids) <= done:
+                    return
+                await asyncio.sleep(0.05)
+
+        await asyncio.wait_for(wait(), timeout)
+
+    async def wait_for_sent(self, count: int, timeout: float = 30.0) -> None:
+        """Wait till the bot has sent at least count messages."""
+
+        async def wait():
+            while len(self.sent) < count:
+                self._sent_event.clear()
+                await self._sent_event.wait()
+
+        await asyncio.wait_for(wait(), timeout)
+
+    async def wait_for_message(self, channel_id: int,
+                                match: Callable[[str], bool],
+                                since: int = 0, timeout: float = 30.0
+                                ) -> Sent:
+        """
+        Wait for a message the bot sends to a channel that match accepts.
+
+        Messages from self.sent[since] on count, so that one sent along
+        with others, or before the wait started, isn't missed.
+        """
+
+        async def wait():
+            i = since
+            while True:
+                for sent in self.sent[i:]:
+                    if sent.channel_id == channel_id and match(sent.content):
+                        return sent
+                i = len(self.sent)
+                self._sent_event.clear()
+                await self._sent_event.wait()
+
+        return await asyncio.wait_for(wait(), timeout)
+
+    def next_sent(self, channel_id: int) -> 'asyncio.Future[Sent]':
+        """Return a future of the next message the bot sends to a channel."""
+
+        future = asyncio.get_event_loop().create_future()
+        self._waiters.setdefault(channel_id, []).append(future)
+        return future
+
+    async def message(self, guild_id: int, author_id: int, content: str,
+                        mentions: Sequence[int] = ()) -> bool:
+        """
+        Send the bot a message written by a member in the guild's channel.
+
+        The members whose ids are in mentions are mentioned in it, which is
+        how the bot gets to know them. Return False if the guild's shard
+        isn't connected.
+        """
+
+        shard_id = self.shard_of(guild_id)
+        ws = self._shards.get(shard_id)
+        if ws is None or ws.closed:
+            return False
+
+        await self._dispatch(shard_id, 'MESSAGE_CREATE', {
+            'id': str(self._snowflake()),
+            'channel_id': str(self.guilds[guild_id]),
+            'guild_id': str(guild_id),
+            'author': _user(author_id),
+            'member': _member(),
+            'content': content,
+            'timestamp': _now(),
+            'edited_timestamp': None,
+            'tts': False,
+            'mention_everyone': False,
+            'mentions': [
+                dict(_user(user_id), member=_member()) for user_id in mentions
+            ],
+            'mention_roles': [],
+            'attachments': [],
+            'embeds': [],
+            'pinned': False,
+            'type': 0,
+        })
+        return True
+
+    def user_id(self, i: int) -> int:
+        """Return the id of the i-th member."""
+
+        return (_USER_BASE + i) << 22
+
+    def _snowflake(self) -> int:
+        self._next_id += 1
+        return self._next_id
+
+    async def _me(self, request: web.Request) -> web.Response:
+        return _json(_user(BOT_ID))
+
+    async def _gateway(self, request: web.Request) -> web.Response:
+        return _json(
+            {'url': f'ws://{self.host}:{self.port}/gateway'}
+        )
+
+    async def _gateway_bot(self, request: web.Request) -> web.Response:
+        return _json({
+            'url': f'ws://{self.host}:{self.port}/gateway',
+            'shards': self.shard_count,
+            'session_start_limit': {
+                'total': 1000, 'remaining': 1000, 'reset_after': 0,
+                'max_concurrency': 1,
+            },
+        })
+
+    async def _create_dm(self, request: web.Request) -> web.Response:
+        recipient_id = int((await request.json())['recipient_id'])
+
+        # a member's DM channel is the id after theirs
+        return _json({
+            'id': str(recipient_id + 1),
+            'type': 1,
+            'last_message_id': None,
+            'recipients': [_user(recipient_id)],
+        })
+
+    async def _create_message(self, request: web.Request) -> web.Response:
+        channel_id = int(request.match_info['channel_id'])
+        payload = await request.json()
+
+        now = perf_counter()
+        headers: Dict[str, str] = {}
+        if self._global_window is not None:
+            retry_after = self._global_window.hit(now)
+            if retry_after:
+                self.globally_rate_limited += 1
+                return self._too_many(retry_after, True)
+
+        if self.channel_rate_limit is not None:
+            window = self._channel_windows.get(channel_id)
+            if window is None:
+                window = self._channel_windows[channel_id] = _Window(
+                    *self.channel_rate_limit
+                )
+            retry_after = window.hit(now)
+            if retry_after:
+                self.rate_limited += 1
+                return self._too_many(retry_after, False)
+            headers = window.headers(now)
+
+        sent = Sent(now, channel_id, payload['content'])
+        self.sent.append(sent)
+        self._sent_event.set()
+        for future in self._waiters.pop(channel_id, ()):
+            if not future.done():
+                future.set_result(sent)
+
+        message = {
+            'id': str(self._snowflake()),
+            'channel_id': str(channel_id),
+            'author': _user(BOT_ID),
+            'content': payload['content'],
+            'timestamp': _now(),
+            'edited_timestamp': None,
+            'tts': False,
+            'mention_everyone': False,
+            'mentions': [],
+            'mention_roles': [],
+            'attachments': [],
+            'embeds': [],
+            'pinned': False,
+            'type': 0,
+        }
+        return _json(message, headers=headers)
+
+    @staticmethod
+    def _too_many(retry_after: float, is_global: bool) -> web.Response:
+        # discord.py takes a 429 without Via for a ban by Cloudflare; the
+        # API version it uses gives retry_after in milliseconds
+        headers = {'Via': '1.1 google', 'X-RateLimit-Remaining': '0'}
+        if is_global:
+            headers['X-RateLimit-Global'] = 'true'
+
+        return _json(
+            {
+                'message': 'You are being rate limited.',
+                'retry_after': 1e3 * retry_after,
+                'global': is_global,
+            },
+            status=429, headers=headers
+        )
+
+    async def _websocket(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+
+        await ws.send_str(json.dumps({
+            'op': 10, 'd': {'heartbeat_interval': HEARTBEAT_INTERVAL},
+        }))
+
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                break
+
+            payload = json.loads(msg.data)
+            if payload['op'] == 1:
+                await ws.send_str(json.dumps({'op': 11}))
+            elif payload['op'] == 2:
+                await self._identify(ws, payload['d'])
+
+        return ws
+
+    async def _identify(self, ws: web.WebSocketResponse,
+                        data: Dict[str, Any]) -> None:
+        shard_id, shard_count = data.get('shard', [0, 1])
+        self.identifies.append(Identify(perf_counter(), shard_id, shard_count))
+
+        self._shards[shard_id] = ws
+        self._sequence[shard_id] = 0
+
+        guild_ids = [g for g in self.guilds if self.shard_of(g) == shard_id]
+        await self._dispatch(shard_id, 'READY', {
+            'v': 6,
+            'user': _user(BOT_ID),
+            'guilds': [
+                {'id': str(g), 'unavailable': True} for g in guild_ids
+            ],
+            'session_id': f'session-{shard_id}-{len(self.identifies)}',
+            'shard': [shard_id, shard_count],
+            'private_channels': [],
+            'relationships': [],
+        })
+
+        for guild_id in guild_ids:
+            await self._dispatch(shard_id, 'GUILD_CREATE', {
+                'id': str(guild_id),
+                'name': f'guild{guild_id >> 22}',
+                'owner_id': str(self.user_id(0)),
+                'member_count': 1,
+                'roles': [{
+                    'id': str(guild_id), 'name': '@everyone',
+                    'permissions': 104324673, 'position': 0, 'color': 0,
+                    'hoist': False, 'managed': False, 'mentionable': False,
+                }],
+                'channels': [{
+                    'id': str(self.guilds[guild_id]), 'type': 0,
+                    'name': self.channel_name, 'position': 0,
+                    'permission_overwrites': [],
+                }],
+                'members': [{
+                    'user': _user(BOT_ID), 'roles': [],
+                    'joined_at': _now(), 'deaf': False, 'mute': False,
+                }],
+                'emojis': [],
+                'features': [],
+                'voice_states': [],
+                'presences': [],
+                'large': False,
+                'unavailable': False,
+            })
+
+    async def _dispatch(self, shard_id: int, event: str,
+                        data: Dict[str, Any]) -> None:
+        self._sequence[shard_id] += 1
+        await self._shards[shard_id].send_str(json.dumps({
+            'op': 0, 't': event, 's': self._sequence[shard_id], 'd': data,
+        }))
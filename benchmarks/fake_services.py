@@ -0,0 +1,278 @@
+"""
+Stand-ins for the services the cogs use besides Discord, to run the bot
+against on one machine.
+
+- FakeDogAPI answers like api.thedogapi.com/v1/images/search;
+- FakeCalendarAPI answers like the events listing of Google Calendar, with
+  a livestream every day;
+- FakeDatabase is a Database whose tables live in memory, for the
+  statements the cogs prepare.
+
+Every stand-in takes a fixed delay to answer, like the real service over a
+network. The web APIs are served on local ports; the cogs are pointed at
+them with DOG_API_URL and CALENDAR_API_URL.
+"""
+
+
+import asyncio
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from aiohttp import web
+
+from cogs.utils.db import Database
+from cogs.utils.metrics import Metrics
+
+
+class _LocalServer:
+    """An aiohttp app served on a port the OS picks."""
+
+    def __init__(self) -> None:
+        self.base = ''
+        self.requests = 0
+        self._runner: Optional[web.AppRunner] = None
+
+    def routes(self, app: web.Application) -> None:
+        raise NotImplementedError
+
+    async def start(self) -> None:
+        app = web.Application()
+        self.routes(app)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+
+        port = site._server.sockets[0].getsockname()[1]
+        self.base = f'http://127.0.0.1:{port}'
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+class FakeDogAPI(_LocalServer):
+    """The images/search endpoint, picking from a pool of pictures."""
+
+    def __init__(self, delay: float = 0.08, pool_size: int = 300) -> None:
+        super().__init__()
+        self.delay = delay
+        self.pool_size = pool_size
+
+        # while set, every request gets a 503
+        self.failing = False
+
+        self._rng = random.Random(0)
+
+    @property
+    def url(self) -> str:
+        return f'{self.base}/v1/images/search'
+
+    def routes(self, app: web.Application) -> None:
+        app.router.add_get('/v1/images/search', self._search)
+
+    async def _search(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        await asyncio.sleep(self.delay)
+        if self.failing:
+            return web.Response(status=503)
+
+        limit = int(request.query.get('limit', 1))
+        # picked with replacement, like the real API
+        ids = [self._rng.randrange(self.pool_size) for _ in range(limit)]
+        return web.json_response([
+            {'id': f'dog{i}', 'url': f'https://cdn.example/dog{i}.jpg'}
+            for i in ids
+        ])
+
+
+class FakeCalendarAPI(_LocalServer):
+    """The events listing of a calendar with a livestream every day."""
+
+    def __init__(self, delay: float = 0.1, hour: int = 17,
+                    days: int = 30) -> None:
+        super().__init__()
+        self.delay = delay
+
+        today = datetime.now(timezone.utc).replace(
+            hour=hour, minute=0, second=0, microsecond=0
+        )
+        self.streams = [
+            today + timedelta(days=d) for d in range(-1, days)
+        ]
+
+    @property
+    def url(self) -> str:
+        """The URL of the listing, with {} for the calendar's ID."""
+
+        return f'{self.base}/calendar/v3/calendars/{{}}/events'
+
+    def routes(self, app: web.Application) -> None:
+        app.router.add_get(
+            '/calendar/v3/calendars/{calendar_id}/events', self._events
+        )
+
+    async def _events(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        await asyncio.sleep(self.delay)
+
+        # the streams don't change, so asking for changes finds none
+        if 'updatedMin' in request.query:
+            return web.json_response({'items': []})
+
+        time_min = _parse_time(request.query['timeMin'])
+        time_max = _parse_time(request.query['timeMax'])
+        items = []
+        for start in self.streams:
+            end = start + timedelta(hours=2)
+            if end > time_min and start < time_max:
+                items.append({
+                    'id': f'stream{start:%Y%m%d}',
+                    'status': 'confirmed',
+                    'summary': 'Study with me',
+                    'start': {'dateTime': start.isoformat()},
+                    'end': {'dateTime': end.isoformat()},
+                })
+
+        return web.json_response({'items': items})
+
+
+def _parse_time(text: str) -> datetime:
+    return datetime.fromisoformat(text.replace('Z', '+00:00'))
+
+
+class _FakePool:
+    def closeall(self) -> None:
+        pass
+
+
+class _FakeConnection:
+    def __init__(self) -> None:
+        self.prepared = set()
+
+
+class _FakeCursor:
+    """Runs the statements of the cogs against the tables in memory."""
+
+    def __init__(self, db: 'FakeDatabase') -> None:
+        self.db = db
+        self.connection = db.connection
+        self._rows: List[Tuple] = []
+
+    def execute(self, query: str, args: Sequence[Any] = ()) -> None:
+        match = re.match(r'\s*EXECUTE (\w+)', query)
+        if match is None:
+            # PREPARE, CREATE TABLE, ALTER TABLE
+            self._rows = []
+            return
+
+        handler = self.db.handlers.get(match.group(1))
+        if handler is None:
+            raise NotImplementedError(
+                f"The fake database can't run {match.group(1)}."
+            )
+        self._rows = handler(*args)
+
+    def fetchone(self) -> Optional[Tuple]:
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self) -> List[Tuple]:
+        return self._rows
+
+
+class FakeDatabase(Database):
+    """
+    A Database whose timezones table lives in memory.
+
+    Calls run on worker threads like the real ones and take latency
+    seconds each, so the pool and the metrics behave as they would.
+    """
+
+    def __init__(self, latency: float = 0.002,
+                    metrics: Optional[Metrics] = None) -> None:
+        super().__init__('fake', metrics=metrics)
+        self.latency = latency
+        self.connection = _FakeConnection()
+
+        # member id -> its row of the timezones table
+        self.rows: Dict[int, Dict[str, Any]] = {}
+        self._next_id = 1
+        self._rows_lock = threading.Lock()
+
+        self.handlers: Dict[str, Callable[..., List[Tuple]]] = {
+            'tz_upsert': self._tz_upsert,
+            'tz_lookup': self._tz_lookup,
+            'tz_page': self._tz_page,
+            'remind_set': self._remind_set,
+            'remind_unset': self._remind_unset,
+            'remind_all': self._remind_all,
+        }
+
+    def add_timezone(self, member_id: int, tz_name: str) -> None:
+        """Put a row in the table, as if the member had used !tzset."""
+
+        self._tz_upsert(member_id, tz_name)
+
+    async def _open(self) -> None:
+        if self._pool is None:
+            self._executor = ThreadPoolExecutor(
+                self.max_size, thread_name_prefix='fake-db'
+            )
+            self._pool = _FakePool()
+
+    def _run(self, fn: Callable[[Any], Any], retry: bool = True) -> Any:
+        time.sleep(self.latency)
+        with self._rows_lock:
+            return fn(_FakeCursor(self))
+
+    def _row(self, member_id: int) -> Dict[str, Any]:
+        row = self.rows.get(member_id)
+        if row is None:
+            row = self.rows[member_id] = {
+                'id': self._next_id, 'timezone_name': None,
+                'remind_lead': None, 'remind_channel': None,
+            }
+            self._next_id += 1
+
+        return row
+
+    def _tz_upsert(self, member_id: int, tz_name: str) -> List[Tuple]:
+        self._row(member_id)['timezone_name'] = tz_name
+        return []
+
+    def _tz_lookup(self, member_id: int) -> List[Tuple]:
+        row = self.rows.get(member_id)
+        return [] if row is None else [(row['timezone_name'],)]
+
+    def _tz_page(self, last_id: int, limit: int) -> List[Tuple]:
+        rows = sorted(
+            (row['id'], member_id, row['timezone_name'])
+            for member_id, row in self.rows.items()
+            if row['id'] > last_id and row['timezone_name'] is not None
+        )
+        return rows[:limit]
+
+    def _remind_set(self, member_id: int, lead: int,
+                    channel_id: Optional[int]) -> List[Tuple]:
+        row = self._row(member_id)
+        row['remind_lead'], row['remind_channel'] = lead, channel_id
+        return []
+
+    def _remind_unset(self, member_id: int) -> List[Tuple]:
+        row = self.rows.get(member_id)
+        if row is not None:
+            row['remind_lead'] = row['remind_channel'] = None
+        return []
+
+    def _remind_all(self) -> List[Tuple]:
+        return [
+            (member_id, row['remind_lead'], row['remind_channel'])
+            for member_id, row in self.rows.items()
+            if row['remind_lead'] is not None
+        ]
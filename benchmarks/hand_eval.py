@@ -0,0 +1,91 @@
+"""
+Compare the speed of the built-in hand evaluator with pokereval's.
+
+Run from the root of the repository:
+
+    python -m benchmarks.hand_eval [number of hands]
+"""
+
+
+import random
+import sys
+from time import perf_counter
+
+from pokereval.card import Card as PECard
+from pokereval.hand_evaluator import HandEvaluator
+
+from cogs.PokerAux import Evaluator
+
+
+def random_showdowns(n: int, n_players: int, seed: int = 0):
+    """Return n random boards, each with hole cards for n_players."""
+
+    rng = random.Random(seed)
+    deals = []
+    for _ in range(n):
+        cards = rng.sample(range(52), 5 + 2 * n_players)
+        board = cards[:5]
+        holes = [cards[5 + 2 * i:7 + 2 * i] for i in range(n_players)]
+        deals.append((board, holes))
+
+    return deals
+
+
+def to_pokereval(code: int) -> PECard:
+    """Turn an evaluator card code into a pokereval Card."""
+
+    return PECard((code >> 2) + 2, (code & 3) + 1)
+
+
+def timed(fn, *args) -> float:
+    """Return the number of seconds fn(*args) takes."""
+
+    start = perf_counter()
+    fn(*args)
+    return perf_counter() - start
+
+
+def run_builtin(deals):
+    for board, holes in deals:
+        for hole in holes:
+            Evaluator.evaluate(board + hole)
+
+
+def run_builtin_batch(deals):
+    for board, holes in deals:
+        Evaluator.evaluate_many(board, holes)
+
+
+def run_pokereval(deals):
+    for board, holes in deals:
+        for hole in holes:
+            HandEvaluator.evaluate_hand(hole, board)
+
+
+def main(n: int = 2000, n_players: int = 6):
+    start = perf_counter()
+    Evaluator.load()
+    print(f"loading tables: {perf_counter() - start:.3f}s")
+
+    deals = random_showdowns(n, n_players)
+    pe_deals = [
+        ([to_pokereval(c) for c in board],
+         [[to_pokereval(c) for c in hole] for hole in holes])
+        for board, holes in deals
+    ]
+    n_hands = n * n_players
+
+    for name, fn, arg in (
+        ('built-in', run_builtin, deals),
+        ('built-in (batch)', run_builtin_batch, deals),
+        ('pokereval', run_pokereval, pe_deals),
+    ):
+        t = timed(fn, arg)
+        print(
+            f"{name:<18} {n_hands / t:>12,.0f} hands/s "
+            f"{1e6 * t / n_hands:>9.2f} us/hand"
+        )
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
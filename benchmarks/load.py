@@ -0,0 +1,423 @@
+"""
+Put the bot under load from many members at once.
+
+Run from the root of the repository:
+
+    python -m benchmarks.load [users] [seconds] [think]
+
+The bot from bot.py runs in a process of its own, with every extension
+loaded, against stand-ins for everything it talks to: Discord
+(benchmarks.fake_discord), which rate limits what the bot sends, and the dog
+API, the calendar and the database (benchmarks.fake_services).
+
+Every user is a member in a guild of their own who sends a command, waits
+for the answer, thinks for a while and sends the next one, for the given
+number of seconds. Commands are drawn from a mix of !id, !dog, !s, !nextls,
+!odds and !chips.
+
+One user in POKER_SHARE plays poker instead, at a table of TABLE_SIZE
+members in a guild of their own. They ask whose turn it is with !turn, and
+that member calls, bets or folds; when no game is on, one of them starts
+the next with !poker. The cards are dealt to them by DM.
+
+The harness reports, for every command, how many were sent, how many got
+the answer expected, the error rate, the throughput and latency
+percentiles, from the message to the answer reaching Discord. Then it
+shows the bot's own !stats.
+"""
+
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import random
+import re
+import sys
+import tempfile
+from time import perf_counter
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence
+
+from benchmarks.fake_discord import FakeDiscord
+from benchmarks.fake_services import (
+    FakeCalendarAPI, FakeDatabase, FakeDogAPI
+)
+
+
+# seconds to wait for an answer before it counts as lost
+ANSWER_TIMEOUT = 10.0
+
+# seconds to wait for the bot to be ready; the first run builds the
+# poker hand table, which takes a while
+READY_TIMEOUT = 300.0
+
+# the only member !s answers
+STICKER_AUTHOR = 711994085480726639
+
+# members whose timezone is in the database, one in this many
+TZ_SHARE = 2
+
+# one user in this many plays poker, at tables of TABLE_SIZE
+POKER_SHARE = 5
+TABLE_SIZE = 3
+
+
+class Command(NamedTuple):
+    """A command users send, and what's in the answer when it works."""
+
+    name: str
+    content: str
+    expected: str
+    weight: int
+    author: Optional[int] = None
+
+
+MIX = [
+    Command('id', '!id', 'Your ID is', 3),
+    Command('dog', '!dog', 'https://', 3),
+    Command('s', '!s hello', 'https://', 2, STICKER_AUTHOR),
+    Command('nextls', '!nextls', 'livestream', 2),
+    Command('nextls', '!nextls japan', 'livestream', 1),
+    Command('odds', '!odds AsKd vs QhQc on 2c7d9h', '% win', 1),
+    Command('chips', '!chips', 'poker game', 1),
+]
+
+
+# what the member to act does, and how often
+ACTIONS = [('call', '!call', 6), ('bet', '!bet 100', 2), ('fold', '!fold', 1)]
+
+# how the bot answers an action, after the member's mention: when it's
+# taken or turned down for its amount, and when the member may not act
+ACTED = (
+    'checks.', 'calls with ', 'bets ', 'folds.', 'goes all in ',
+    'You must bet ', "You don't have enough chips.",
+)
+NO_GAME = "We're not inside a poker game"
+REFUSED = ("It's not your turn", NO_GAME, "The cards are being dealt")
+
+# the answers to !turn, and the first line of a game
+TURN = re.compile(r"^It's <@!?(\d+)>'s turn\.$", re.MULTILINE)
+DEALING = 'The cards are being dealt. No one is to act yet.'
+NEW_ROUND = 'N E W    R O U N D'
+
+
+class Result(NamedTuple):
+    command: str
+
+    # 'ok', 'wrong' if the answer isn't the one expected, 'timeout' if
+    # there was none
+    outcome: str
+    latency: float
+
+
+def worker(api_base: str, users: int) -> None:
+    """Run the bot against the stand-ins."""
+
+    import discord.http
+    discord.http.Route.BASE = api_base
+
+    import bot
+    from benchmarks.fake_discord import _USER_BASE
+
+    # only errors; warnings about rate limits are expected
+    logging.disable(logging.WARNING)
+
+    svbot = bot.SVBot(command_prefix='!')
+    svbot.db = FakeDatabase(metrics=svbot.metrics)
+    for i in range(1, users + 1, TZ_SHARE):
+        svbot.db.add_timezone((_USER_BASE + i) << 22, 'india')
+
+    svbot.load_extensions()
+    svbot.run('harness')
+
+
+def set_environment(scratch: str, dog: FakeDogAPI,
+                    calendar: FakeCalendarAPI) -> None:
+    stickers = os.path.join(scratch, 'stickers.txt')
+    with open(stickers, 'w') as f:
+        f.write('hello https://example.com/hello.png\n')
+
+    os.environ.update({
+        'GOOGLE_API_KEY': 'harness',
+        'TZ_FILENAME': 'tzinfo.txt',
+        'S_FILENAME': stickers,
+        'DOG_API_URL': dog.url,
+        'CALENDAR_API_URL': calendar.url,
+        'RUNNING_ON_HEROKU': '1',
+    })
+
+
+async def ask(fake: FakeDiscord, guild_id: int, author: int,
+                content: str, timeout: float = ANSWER_TIMEOUT
+                ) -> Optional[str]:
+    """Send a command and return the answer, or None if there's none."""
+
+    answer = fake.next_sent(fake.guilds[guild_id])
+    if not await fake.message(guild_id, author, content):
+        answer.cancel()
+        return None
+
+    try:
+        return (await asyncio.wait_for(answer, timeout)).content
+    except asyncio.TimeoutError:
+        return None
+
+
+async def wait_until_ready(fake: FakeDiscord, guild_id: int) -> None:
+    """Wait till the bot answers, and its poker tables are built."""
+
+    async def wait():
+        while await ask(fake, guild_id, fake.user_id(0), '!id', 1.0) is None:
+            pass
+        await ask(fake, guild_id, fake.user_id(0), MIX[5].content, 1e9)
+
+    await asyncio.wait_for(wait(), READY_TIMEOUT)
+
+
+async def user(fake: FakeDiscord, guild_id: int, author: int, think: float,
+                until: float, rng: random.Random,
+                results: List[Result]) -> None:
+    """Send commands from the mix one after the other till until."""
+
+    channel_id = fake.guilds[guild_id]
+    weights = [c.weight for c in MIX]
+
+    # users don't all start at once
+    await asyncio.sleep(rng.uniform(0, think))
+    while perf_counter() < until:
+        command = rng.choices(MIX, weights)[0]
+
+        answer = fake.next_sent(channel_id)
+        start = perf_counter()
+        if not await fake.message(
+                guild_id, command.author or author, command.content):
+            answer.cancel()
+            results.append(Result(command.name, 'timeout', 0.0))
+        else:
+            try:
+                sent = await asyncio.wait_for(answer, ANSWER_TIMEOUT)
+            except asyncio.TimeoutError:
+                results.append(Result(command.name, 'timeout', 0.0))
+            else:
+                outcome = (
+                    'ok' if command.expected in sent.content else 'wrong'
+                )
+                results.append(
+                    Result(command.name, outcome, sent.time - start)
+                )
+
+        await asyncio.sleep(rng.expovariate(1 / think))
+
+
+def reply_to(member: int, phrases: Sequence[str]) -> Callable[[str], bool]:
+    """Return a test of whether a message replies to member with a phrase."""
+
+    mention = f'<@{member}> '
+
+    def match(content: str) -> bool:
+        return any(
+            line.startswith(mention)
+            and line[len(mention):].startswith(tuple(phrases))
+            for line in content.split('\n')
+        )
+
+    return match
+
+
+async def command(fake: FakeDiscord, guild_id: int, author: int, name: str,
+                    content: str, answered: Callable[[str], bool],
+                    ok: Callable[[str], bool], results: List[Result],
+                    mentions: Sequence[int] = ()) -> Optional[str]:
+    """
+    Send a command and wait for the message that answers it.
+
+    Other messages of the bot to the channel are skipped. The outcome is
+    recorded under name, 'ok' if ok accepts the answer; the answer is
+    returned, or None if there's none.
+    """
+
+    since = len(fake.sent)
+    start = perf_counter()
+    sent = None
+    if await fake.message(guild_id, author, content, mentions):
+        try:
+            sent = await fake.wait_for_message(
+                fake.guilds[guild_id], answered, since, ANSWER_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            pass
+
+    if sent is None:
+        results.append(Result(name, 'timeout', 0.0))
+        return None
+
+    outcome = 'ok' if ok(sent.content) else 'wrong'
+    results.append(Result(name, outcome, sent.time - start))
+    return sent.content
+
+
+async def table(fake: FakeDiscord, guild_id: int, players: List[int],
+                think: float, until: float, rng: random.Random,
+                results: List[Result]) -> None:
+    """Play poker at the guild's table till until, taking turns."""
+
+    host, *guests = players
+    no_game = reply_to(host, [NO_GAME])
+    weights = [weight for _, _, weight in ACTIONS]
+
+    await asyncio.sleep(rng.uniform(0, think))
+    while perf_counter() < until:
+        answer = await command(
+            fake, guild_id, host, 'turn', '!turn',
+            lambda c: (TURN.search(c) is not None or no_game(c)
+                       or DEALING in c.split('\n')),
+            lambda c: True, results
+        )
+        turn = TURN.search(answer) if answer is not None else None
+
+        if answer is None or DEALING in answer.split('\n'):
+            pass
+        elif turn is None:
+            await command(
+                fake, guild_id, host, 'poker',
+                '!poker ' + ' '.join(f'<@{g}>' for g in guests),
+                lambda c: (NEW_ROUND in c
+                           or reply_to(host, ['Someone is'])(c)),
+                lambda c: NEW_ROUND in c, results, mentions=guests
+            )
+        else:
+            member = int(turn.group(1))
+            name, content, _ = rng.choices(ACTIONS, weights)[0]
+            await command(
+                fake, guild_id, member, name, content,
+                reply_to(member, ACTED + REFUSED), reply_to(member, ACTED),
+                results
+            )
+
+        await asyncio.sleep(rng.expovariate(1 / think))
+
+
+def percentile(values: List[float], q: float) -> float:
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+def report(results: List[Result], seconds: float) -> None:
+    by_command: Dict[str, List[Result]] = {}
+    for result in results:
+        by_command.setdefault(result.command, []).append(result)
+    by_command['all'] = results
+
+    print(
+        f"{'command':<8} {'sent':>6} {'ok':>6} {'wrong':>6} {'lost':>6} "
+        f"{'errors':>7} {'per s':>7} {'p50 ms':>8} {'p95 ms':>8} "
+        f"{'p99 ms':>8}"
+    )
+    for name, rs in by_command.items():
+        ok = sorted(r.latency for r in rs if r.outcome == 'ok')
+        wrong = sum(r.outcome == 'wrong' for r in rs)
+        lost = sum(r.outcome == 'timeout' for r in rs)
+        cells = (
+            [f'{1e3 * percentile(ok, q):8.1f}' for q in (0.5, 0.95, 0.99)]
+            if ok else [f"{'-':>8}"] * 3
+        )
+        print(
+            f"{name:<8} {len(rs):>6} {len(ok):>6} {wrong:>6} {lost:>6} "
+            f"{(wrong + lost) / len(rs):>7.1%} {len(ok) / seconds:>7.1f} "
+            + ' '.join(cells)
+        )
+
+
+async def run(users: int, seconds: float, think: float) -> None:
+    dog = FakeDogAPI()
+    calendar = FakeCalendarAPI()
+    await dog.start()
+    await calendar.start()
+
+    tables = users // POKER_SHARE // TABLE_SIZE
+    players = tables * TABLE_SIZE
+    alone = users - players
+
+    # guild 0 is the harness's own, where it checks the bot is up; then
+    # every user who doesn't play poker has one, and so has every table.
+    # Any channel will do for poker
+    fake = FakeDiscord(alone + tables + 1, shard_count=1, channel_name='poker')
+    await fake.start()
+    guild_ids = list(fake.guilds)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        set_environment(scratch, dog, calendar)
+
+        # the bot gets a process of its own, like in production, so the
+        # harness doesn't take its time from it
+        process = multiprocessing.get_context('spawn').Process(
+            target=worker, args=(fake.api_base, users), name='bot'
+        )
+        process.start()
+        try:
+            start = perf_counter()
+            await fake.wait_for_shards([0])
+            await wait_until_ready(fake, guild_ids[0])
+            print(f"bot ready after {perf_counter() - start:.1f}s")
+
+            limited = fake.rate_limited, fake.globally_rate_limited
+            sent = len(fake.sent)
+            results: List[Result] = []
+            start = perf_counter()
+            until = start + seconds
+            await asyncio.gather(
+                *(
+                    user(
+                        fake, guild_ids[i + 1], fake.user_id(i + 1), think,
+                        until, random.Random(i), results
+                    )
+                    for i in range(alone)
+                ),
+                *(
+                    table(
+                        fake, guild_ids[alone + t + 1],
+                        [
+                            fake.user_id(alone + t * TABLE_SIZE + j + 1)
+                            for j in range(TABLE_SIZE)
+                        ],
+                        think, until, random.Random(users + t), results
+                    )
+                    for t in range(tables)
+                )
+            )
+            elapsed = perf_counter() - start
+
+            print(
+                f"{users} users, {players} of them at {tables} poker "
+                f"tables, for {elapsed:.1f}s, thinking {think:.2f}s on "
+                f"average"
+            )
+            report(results, elapsed)
+            print(
+                f"messages sent: {len(fake.sent) - sent}, answered with "
+                f"429: {fake.rate_limited - limited[0]} per channel, "
+                f"{fake.globally_rate_limited - limited[1]} globally"
+            )
+            print(
+                f"dog API requests: {dog.requests}, calendar requests: "
+                f"{calendar.requests}"
+            )
+
+            stats = await ask(
+                fake, guild_ids[0], fake.user_id(0), '!stats io'
+            )
+            print(stats or "!stats didn't answer")
+        finally:
+            process.terminate()
+            process.join()
+            await fake.stop()
+            await calendar.stop()
+            await dog.stop()
+
+
+def main(users: int = 50, seconds: float = 20.0, think: float = 1.0) -> None:
+    asyncio.run(run(users, seconds, think))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50,
+         *map(float, sys.argv[2:]))
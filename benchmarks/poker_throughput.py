@@ -0,0 +1,69 @@
+"""
+Measure how fast the poker engine plays, without Discord.
+
+Run from the root of the repository:
+
+    python -m benchmarks.poker_throughput [hands] [players] [seed]
+
+Reports hands per second, the latency of each stage of a hand, and the
+memory the simulation allocates.
+"""
+
+
+import asyncio
+import sys
+import tracemalloc
+from collections import defaultdict
+from time import perf_counter
+
+from cogs.PokerAux import Evaluator, Headless
+
+
+def allocations(n_hands: int, n_players: int, seed: int):
+    """Return the peak traced memory and the bytes retained per hand."""
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+
+    asyncio.run(Headless.simulate(n_hands, n_players, seed=seed))
+
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stats = after.compare_to(before, 'filename')
+    retained = sum(s.size_diff for s in stats)
+
+    return peak, retained / n_hands
+
+
+def main(n_hands: int = 5000, n_players: int = 6, seed: int = 0):
+    Evaluator.load()
+
+    timings = defaultdict(list)
+    start = perf_counter()
+    games = asyncio.run(
+        Headless.simulate(n_hands, n_players, seed=seed, timings=timings)
+    )
+    elapsed = perf_counter() - start
+
+    print(f"{n_hands} hands, {games} games, {n_players} players")
+    print(f"{n_hands / elapsed:,.0f} hands/s")
+    print()
+
+    print(f"{'stage':<12}{'mean':>10}{'p50':>10}{'p99':>10}{'max':>10}")
+    for stage in Headless.STAGES:
+        s = Headless.summarize(timings[stage])
+        cols = ''.join(
+            f"{1e6 * s[k]:>8.1f}us" for k in ('mean', 'p50', 'p99', 'max')
+        )
+        print(f"{stage:<12}{cols}")
+    print()
+
+    peak, retained = allocations(min(n_hands, 500), n_players, seed)
+    print(f"peak memory: {peak / 1024:.0f} KiB")
+    print(f"retained per hand: {retained:.0f} bytes")
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,58 @@
+"""
+Replay a corpus of logged poker hands and check they end the same way.
+
+Run from the root of the repository:
+
+    python -m benchmarks.replay_corpus FILE
+    python -m benchmarks.replay_corpus --generate HANDS [FILE]
+
+FILE holds one HandLog.dumps line per hand, e.g. collected from the bot's
+"Hand finished" log lines. With --generate, a corpus of simulated hands is
+created first (and saved to FILE, if given).
+"""
+
+
+import asyncio
+import sys
+from time import perf_counter
+
+from cogs.PokerAux import Evaluator, Headless, Replay
+
+
+def generate(n_hands: int):
+    """Return the logs of n_hands simulated hands, as lines."""
+
+    logs = []
+    asyncio.run(Headless.simulate(n_hands, seed=0, logs=logs))
+    return [log.dumps() for log in logs]
+
+
+def main(args):
+    if args and args[0] == '--generate':
+        lines = generate(int(args[1]))
+        if len(args) > 2:
+            with open(args[2], 'w') as f:
+                f.write('\n'.join(lines) + '\n')
+    elif args:
+        with open(args[0]) as f:
+            lines = f.readlines()
+    else:
+        print(__doc__)
+        return
+
+    Evaluator.load()
+
+    start = perf_counter()
+    n, mismatches = asyncio.run(Replay.replay_corpus(lines))
+    elapsed = perf_counter() - start
+
+    print(f"replayed {n} hands in {elapsed:.2f}s ({n / elapsed:,.0f} hands/s)")
+    if mismatches:
+        print(f"{len(mismatches)} hands didn't match, on lines: "
+              + ', '.join(map(str, mismatches[:20])))
+    else:
+        print("all hands matched")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
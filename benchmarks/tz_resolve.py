@@ -0,0 +1,97 @@
+"""
+Compare resolving timezones with the TimezoneResolver against the old way
+of looking the country up in tzinfo.txt and calling pytz.timezone.
+
+Run from the root of the repository:
+
+    python -m benchmarks.tz_resolve [number of queries]
+"""
+
+
+import random
+import sys
+from time import perf_counter
+
+import pytz
+
+from cogs.NextLiveStreamAux.Resolver import TimezoneResolver
+
+
+TZ_FILENAME = 'tzinfo.txt'
+
+
+def load_aliases():
+    with open(TZ_FILENAME) as tzf:
+        return dict(
+            (t[0].lower(), t[1]) for t in [line.split() for line in tzf]
+        )
+
+
+def typo(rng: random.Random, text: str) -> str:
+    """Return text with one random character dropped, doubled or swapped."""
+
+    i = rng.randrange(len(text) - 1)
+    kind = rng.randrange(3)
+    if kind == 0:
+        return text[:i] + text[i + 1:]
+    if kind == 1:
+        return text[:i] + text[i] + text[i:]
+    return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+
+
+def old_path(aliases, query):
+    """What nextls did before: an exact alias or an exact IANA name."""
+
+    if '/' not in query:
+        query = query.lower()
+        if query not in aliases:
+            return None
+        tzname = aliases[query]
+    else:
+        tzname = query
+
+    try:
+        return pytz.timezone(tzname)
+    except pytz.UnknownTimeZoneError:
+        return None
+
+
+def new_path(resolver, query):
+    resolution = resolver.resolve(query)
+    return None if resolution is None else resolver.tz(resolution.zone)
+
+
+def run(name, fn, index, queries):
+    start = perf_counter()
+    found = sum(fn(index, q) is not None for q in queries)
+    t = perf_counter() - start
+
+    print(
+        f"{name:<28} {1e6 * t / len(queries):>9.2f} us/query "
+        f"{found / len(queries):>7.1%} resolved"
+    )
+
+
+def main(n: int = 20000):
+    aliases = load_aliases()
+
+    start = perf_counter()
+    resolver = TimezoneResolver(aliases)
+    print(f"building the index: {perf_counter() - start:.3f}s")
+
+    start = perf_counter()
+    resolver.build_typo_index()
+    print(f"building the typo index: {perf_counter() - start:.3f}s")
+
+    rng = random.Random(0)
+    names = list(aliases) + list(pytz.common_timezones)
+    exact = [rng.choice(names) for _ in range(n)]
+    typos = [typo(rng, q) for q in exact]
+
+    for label, queries in (('exact', exact), ('one typo', typos)):
+        run(f"old path, {label}", old_path, aliases, queries)
+        run(f"resolver, {label}", new_path, resolver, queries)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
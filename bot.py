@@ -1,33 +1,512 @@
-"""A modular and extensible Discord bot."""
+"""
+A modular and extensible Discord bot.
 
+The bot comes online in two phases. Extensions are loaded before the bot
+connects to Discord, and only register their commands and the work they
+need done; anything slow (reading the database, building indexes, loading
+tables) is handed to warm_up and runs once the bot is connected. The time
+spent on each extension and warm-up is logged in a startup report.
+
+Every command is timed by the bot's invoke hooks, and the bot's services
+time their calls too; the metrics are served on METRICS_PORT if it's set.
+A watchdog reports whatever blocks the event loop, and the command it was
+blocked in.
+
+Extensions can be reloaded while the bot runs, with !reload or, with
+AUTO_RELOAD set, whenever their files change. Cogs hand their state (poker
+tables, caches) over to their new versions.
+
+The bot runs every shard of the gateway in one process unless it's told
+otherwise: with DISCORD_SHARDS set to a number or to 'auto', it runs that
+many shards, or as many as Discord recommends. launcher.py spreads the
+shards over several processes.
+"""
 
-from os import getenv, environ, listdir
 
-from discord.ext.commands import Bot
+from time import perf_counter, time
+
+# the report counts the imports below too
+_STARTED = perf_counter()
+
+import asyncio
+import logging
+import os
+import sys
+from os import getenv, environ, listdir
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
 
+from discord import ClientException
+from discord.ext.commands import (
+    AutoShardedBot, Bot, Cog, Context, ExtensionNotLoaded
+)
 
-if not 'RUNNING_ON_HEROKU' in environ:
-    from dotenv import load_dotenv
-    load_dotenv()
+from cogs.utils.db import Database
+from cogs.utils.metrics import Metrics, instrument_discord
+from cogs.utils.monitor import LoopMonitor
+from cogs.utils.outbox import Outbox
+from cogs.utils.web import HTTPClient
 
 
-TOKEN = getenv('DISCORD_TOKEN')
-CMD_PREFIX = getenv('DISCORD_CMD_PREFIX')
+log = logging.getLogger('bot')
 
 COG_FILE_EXT = '.py'
 
+# Discord lets a bot IDENTIFY a shard once every this many seconds
+IDENTIFY_INTERVAL = 5.0
+
+# the longest a process waits to book its turn to IDENTIFY; the slot is
+# only locked while it's read and moved on, but a process could die then
+IDENTIFY_LOCK_TIMEOUT = 5.0
+
+# seconds between two checks of the extensions' files, with AUTO_RELOAD set
+AUTO_RELOAD_INTERVAL = 2.0
+
+# extension name + this is the package of its auxiliary modules
+AUX_SUFFIX = 'Aux'
+
+
+def _cog_key(cog: Cog) -> str:
+    """Return what a cog is known by across reloads of its extension."""
+
+    return f'{cog.__module__}.{type(cog).__qualname__}'
+
+
+class SVBot(Bot):
+    """The bot, along with the services shared by its cogs."""
+
+    def __init__(self, metrics_port: Optional[int] = None,
+                    **options) -> None:
+        super().__init__(**options)
+
+        # what the bot and its services do is measured here
+        self.metrics = Metrics()
+        self.metrics_port = metrics_port
+        self._command_latency = self.metrics.histogram(
+            'svbot_command_seconds',
+            "Time taken by commands, from their before to their after "
+            "invoke hook.",
+            ('command', 'cog', 'outcome')
+        )
+        self._command_rejections = self.metrics.counter(
+            'svbot_command_rejections_total',
+            "Commands that didn't run, because of failed checks, bad "
+            "arguments or cooldowns.",
+            ('command', 'cog', 'reason')
+        )
+        self.before_invoke(self._command_started)
+        self.after_invoke(self._command_finished)
+        instrument_discord(self.http, self.metrics)
+
+        # the event loop's lag, and what blocks it
+        self.loop_monitor = LoopMonitor(self.metrics)
+        self.loop_monitor.start(self.loop)
+
+        # all messages sent by the cogs are queued here
+        self.outbox = Outbox()
+
+        # connections to the database are shared by all the cogs
+        self.db = Database(getenv('DATABASE_URL'), metrics=self.metrics)
+
+        # and so are connections to web APIs; discord.py already uses the
+        # name http
+        self.http_client = HTTPClient(metrics=self.metrics)
+
+        # seconds from the start of the process to here, and to the moment
+        # the bot was first connected
+        self.init_time = perf_counter() - _STARTED
+        self.ready_time: Optional[float] = None
+
+        # seconds spent loading each extension and on each warm-up, in the
+        # order they finished
+        self.load_times: Dict[str, float] = {}
+        self.warm_up_times: Dict[str, float] = {}
+
+        # seconds taken by the last reload of each extension
+        self.reload_times: Dict[str, float] = {}
+
+        # cog key -> the state its previous version handed over, while its
+        # extension is being reloaded
+        self._handed_over: Dict[str, Dict[str, Any]] = {}
+
+        # warm-ups started before the bot was ready that are still running;
+        # the report is logged when the last one is done
+        self._warming_up: Set[asyncio.Task] = set()
+        self._reported = False
+
+        if metrics_port is not None:
+            self.warm_up('metrics endpoint', self._serve_metrics)
+
+    @property
+    def cluster_shards(self) -> Optional[List[int]]:
+        """The shards this process runs, or None if it runs all of them."""
+
+        return None
+
+    @property
+    def owns_all_guilds(self) -> bool:
+        """Whether no other process serves any of the bot's guilds."""
+
+        return self.cluster_shards is None
+
+    @property
+    def owns_dms(self) -> bool:
+        """Whether this process serves DMs, which Discord sends to shard 0."""
+
+        return self.cluster_shards is None or 0 in self.cluster_shards
+
+    def owns_guild(self, guild_id: int) -> bool:
+        """Whether the guild is served by one of this process's shards."""
+
+        shards = self.cluster_shards
+        return shards is None or (guild_id >> 22) % self.shard_count in shards
+
+    def load_extensions(self, directory: str = 'cogs') -> None:
+        """Load every extension in directory, timing each one."""
+
+        for filename in sorted(listdir(directory)):
+            if filename.endswith(COG_FILE_EXT):
+                name = f'{directory}.{filename[:-len(COG_FILE_EXT)]}'
+
+                start = perf_counter()
+                self.load_extension(name)
+                self.load_times[name] = perf_counter() - start
+
+    def reload(self, name: str) -> float:
+        """
+        Reload an extension and its Aux package; return the seconds taken.
+
+        Cogs of the extension with an export_state method hand what it
+        returns over to their new versions, which get it from take_state.
+        The objects are handed over as they are, so they keep the code
+        they were made with. If the new code doesn't load, the old
+        extension is loaded again and gets the state back.
+        """
+
+        if name not in self.extensions:
+            raise ExtensionNotLoaded(name)
+
+        start = perf_counter()
+        for cog in list(self.cogs.values()):
+            if cog.__module__ == name and hasattr(cog, 'export_state'):
+                self._handed_over[_cog_key(cog)] = cog.export_state()
+
+        # discord.py only reloads the extension's own submodules
+        aux = name + AUX_SUFFIX
+        modules = {
+            module_name: module
+            for module_name, module in sys.modules.items()
+            if module_name == aux or module_name.startswith(aux + '.')
+        }
+        for module_name in modules:
+            del sys.modules[module_name]
+
+        try:
+            self.reload_extension(name)
+        except Exception:
+            sys.modules.update(modules)
+            raise
+        finally:
+            # state no cog took is dropped
+            self._handed_over.clear()
+
+        elapsed = self.reload_times[name] = perf_counter() - start
+        log.info("Reloaded %s in %.1f ms.", name, 1e3 * elapsed)
+
+        return elapsed
+
+    def take_state(self, cog: Cog) -> Dict[str, Any]:
+        """Return the state handed over to cog, if it's being reloaded."""
+
+        return self._handed_over.pop(_cog_key(cog), {})
+
+    def add_cog(self, cog: Cog) -> None:
+        """
+        Add a cog, unless one with the same name is loaded.
+
+        discord.py would replace the loaded cog in self.cogs without
+        unloading it, and reloading its extension would then miss it.
+        """
+
+        if cog.qualified_name in self.cogs:
+            raise ClientException(
+                f"A cog named {cog.qualified_name} is already loaded."
+            )
+
+        super().add_cog(cog)
+
+    async def auto_reload(self, interval: float = AUTO_RELOAD_INTERVAL
+                            ) -> None:
+        """Reload every extension whose files change."""
+
+        versions = await self.loop.run_in_executor(
+            None, self._extension_versions
+        )
+        while True:
+            await asyncio.sleep(interval)
+            changed = await self.loop.run_in_executor(
+                None, self._extension_versions
+            )
+            for name, version in changed.items():
+                if versions.get(name, version) == version:
+                    continue
+
+                try:
+                    self.reload(name)
+                except Exception:
+                    log.exception("Couldn't reload %s.", name)
+            versions = changed
+
+    def after_ready(self, fn: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        """Call the coroutine function fn once the bot is connected."""
+
+        async def wait_and_run():
+            await self.wait_until_ready()
+            return await fn()
+
+        return self.loop.create_task(wait_and_run())
+
+    def warm_up(self, name: str, fn: Callable[[], Any]) -> asyncio.Task:
+        """
+        Call fn once the bot is connected, timing it; return its task.
+
+        fn is a coroutine function or a blocking function, which runs on a
+        worker thread. Errors are logged, not raised.
+        """
+
+        async def run():
+            start = perf_counter()
+            try:
+                if asyncio.iscoroutinefunction(fn):
+                    await fn()
+                else:
+                    await self.loop.run_in_executor(None, fn)
+            except Exception:
+                log.exception("Warm-up %s failed.", name)
+            self.warm_up_times[name] = perf_counter() - start
+
+        task = self.after_ready(run)
+        if not self._reported:
+            self._warming_up.add(task)
+            task.add_done_callback(self._warm_up_done)
+
+        return task
+
+    async def on_ready(self) -> None:
+        print(f'{self.user.name} is online!')
+
+        if self.ready_time is None:
+            self.ready_time = perf_counter() - _STARTED
+            self._warm_up_done()
+
+    async def invoke(self, ctx: Context) -> None:
+        # the checks and converters are run here too, and can block as well
+        if ctx.command is not None:
+            self.loop_monitor.enter(ctx.command.qualified_name)
+        try:
+            await super().invoke(ctx)
+        finally:
+            self.loop_monitor.exit()
+
+    async def on_command_error(self, ctx: Context,
+                                exception: Exception) -> None:
+        # commands that failed while running were counted by the after
+        # invoke hook
+        if ctx.command is not None and not hasattr(ctx, 'started_at'):
+            self._command_rejections.inc(
+                ctx.command.qualified_name, ctx.command.cog_name or '',
+                type(exception).__name__
+            )
+
+        await super().on_command_error(ctx, exception)
+
+    async def close(self) -> None:
+        await self.outbox.close()
+        await self.db.close()
+        await self.http_client.close()
+        await self.metrics.close()
+        await self.loop_monitor.close()
+        await super().close()
+
+    async def _command_started(self, ctx: Context) -> None:
+        ctx.started_at = perf_counter()
+
+    async def _command_finished(self, ctx: Context) -> None:
+        self._command_latency.observe(
+            perf_counter() - ctx.started_at, ctx.command.qualified_name,
+            ctx.command.cog_name or '',
+            'error' if ctx.command_failed else 'ok'
+        )
+
+    async def _serve_metrics(self) -> None:
+        await self.metrics.serve(
+            getenv('METRICS_HOST', '127.0.0.1'), self.metrics_port
+        )
+
+    def startup_report(self) -> str:
+        """Return how long each phase of startup took."""
+
+        lines = ["Startup report:"]
+        lines.append(f"  {'imports':<36} {self.init_time:7.3f}s")
+        for name, t in self.load_times.items():
+            lines.append(f"  {name:<36} {t:7.3f}s")
+
+        if self.ready_time is not None:
+            lines.append(f"  {'online after':<36} {self.ready_time:7.3f}s")
+
+        for name, t in self.warm_up_times.items():
+            lines.append(f"  {'warm-up: ' + name:<36} {t:7.3f}s")
+
+        return '\n'.join(lines)
+
+    def _extension_versions(self) -> Dict[str, int]:
+        # runs on a worker thread; the last time any file of each extension
+        # changed
+        versions = {}
+        for name in list(self.extensions):
+            path = name.replace('.', os.sep)
+            files = [path + COG_FILE_EXT]
+            for root, _, filenames in os.walk(path + AUX_SUFFIX):
+                files += [
+                    os.path.join(root, f) for f in filenames
+                    if f.endswith(COG_FILE_EXT)
+                ]
+
+            mtimes = []
+            for f in files:
+                try:
+                    mtimes.append(os.stat(f).st_mtime_ns)
+                except OSError:
+                    pass
+            versions[name] = max(mtimes, default=0)
+
+        return versions
+
+    def _warm_up_done(self, task: Optional[asyncio.Task] = None) -> None:
+        self._warming_up.discard(task)
+
+        if self._reported or self.ready_time is None or self._warming_up:
+            return
+
+        self._reported = True
+        log.info(self.startup_report())
+
+
+class ShardedSVBot(SVBot, AutoShardedBot):
+    """
+    The bot, running several shards of the gateway in one process.
+
+    Guilds are split between the shards by their ID. When the shards are
+    spread over several processes, each process owns the guilds of its
+    shards: their channels, their poker tables and the reminders sent in
+    them. DMs belong to the process with shard 0.
+    """
+
+    identify_interval = IDENTIFY_INTERVAL
+
+    def __init__(self, identify_slot: Optional[Any] = None,
+                    **options) -> None:
+        super().__init__(**options)
+
+        # a multiprocessing Value shared by the processes of a cluster: the
+        # time.time() at which the next shard may IDENTIFY. Every shard
+        # books the next free turn and waits for it, so a process that dies
+        # holds up no one
+        self.identify_slot = identify_slot
+
+    @property
+    def cluster_shards(self) -> Optional[List[int]]:
+        return self.shard_ids
+
+    async def before_identify_hook(self, shard_id: int, *,
+                                    initial: bool = False) -> None:
+        if self.identify_slot is None:
+            await super().before_identify_hook(shard_id, initial=initial)
+            return
+
+        delay = await self.loop.run_in_executor(None, self._book_identify)
+        if delay is None:
+            # the slot is held by a process that died; pacing this
+            # process's own shards is the most that can be done
+            log.warning(
+                "Shard %d couldn't book a turn to IDENTIFY.", shard_id
+            )
+            delay = self.identify_interval
+
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def _book_identify(self) -> Optional[float]:
+        """Book the next turn to IDENTIFY; return how long to wait for it."""
+
+        # runs on a worker thread
+        lock = self.identify_slot.get_lock()
+        if not lock.acquire(timeout=IDENTIFY_LOCK_TIMEOUT):
+            return None
+
+        try:
+            now = time()
+            turn = max(now, self.identify_slot.value)
+            self.identify_slot.value = turn + self.identify_interval
+        finally:
+            lock.release()
+
+        return turn - now
+
+
+def create_bot(command_prefix: Optional[str] = None, sharded: bool = False,
+                **options) -> SVBot:
+    """
+    Return the bot with every extension loaded, without connecting it.
+
+    A sharded bot runs the shards given by the shard_ids and shard_count
+    options, or all the shards Discord recommends.
+    """
+
+    if command_prefix is None:
+        command_prefix = getenv('DISCORD_CMD_PREFIX')
+
+    cls = ShardedSVBot if sharded else SVBot
+    bot = cls(command_prefix=command_prefix, **options)
+    bot.load_extensions()
+
+    if getenv('AUTO_RELOAD'):
+        bot.after_ready(bot.auto_reload)
+
+    return bot
+
+
+def configure() -> None:
+    """Read the environment and set up logging."""
+
+    if not 'RUNNING_ON_HEROKU' in environ:
+        from dotenv import load_dotenv
+        load_dotenv()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s %(processName)s %(levelname)s %(name)s: '
+               '%(message)s'
+    )
+
+
+def main(**options) -> None:
+    """Run the bot; options are passed on to create_bot."""
 
-bot = Bot(command_prefix=CMD_PREFIX)
+    configure()
 
+    port = getenv('METRICS_PORT')
+    if port and 'metrics_port' not in options:
+        options['metrics_port'] = int(port)
 
-for filename in listdir('cogs'):
-    if filename.endswith(COG_FILE_EXT):
-        cog_name = filename[:-len(COG_FILE_EXT)]
-        bot.load_extension(f'cogs.{cog_name}')
+    shards = getenv('DISCORD_SHARDS')
+    if shards and 'sharded' not in options:
+        options['sharded'] = True
+        if shards != 'auto':
+            options['shard_count'] = int(shards)
 
-@bot.event
-async def on_ready():
-    print(f'{bot.user.name} is online!')
+    bot = create_bot(**options)
+    bot.run(getenv('DISCORD_TOKEN'))
 
 
-bot.run(TOKEN)
\ No newline at end of file
+if __name__ == '__main__':
+    main()
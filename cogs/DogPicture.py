@@ -2,11 +2,20 @@
 A Cog to display a dog picture whenever !dog command is issued.
 """
 
-from requests import get as http_get
+from os import getenv
+from typing import List
 
 from discord.ext import commands
 
-from .utils.utils import reply
+from .DogPictureAux.Buffer import Image, ImageBuffer
+from .utils.utils import reply, send
+from .utils.web import RequestFailed
+
+
+API_URL = 'https://api.thedogapi.com/v1/images/search'
+
+# the most pictures the API returns per request without an API key
+BATCH_SIZE = 10
 
 
 class DogPicture(commands.Cog):
@@ -15,6 +24,23 @@ class DogPicture(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
+        # DOG_API_URL points the cog at another API, e.g. a local stand-in
+        self.api_url = getenv('DOG_API_URL', API_URL)
+        state = bot.take_state(self)
+        self.images = state.get('images')
+        if self.images is None:
+            self.images = ImageBuffer(self._fetch)
+        self.images.fetch = self._fetch
+        bot.warm_up('dog pictures', self._fill)
+
+    def export_state(self):
+        """Hand the pictures over to a new version of the cog."""
+
+        return {'images': self.images}
+
+    def cog_unload(self):
+        self.images.close()
+
     @commands.command(
         name='dog',
         help='Display a random dog image.'
@@ -22,15 +48,28 @@ class DogPicture(commands.Cog):
     async def dog(self, ctx):
         """Display a random dog image."""
 
-        API_CALL = "https://api.thedogapi.com/v1/images/search"
-
-        resp = http_get(API_CALL)
-        if resp.status_code != 200:
+        image = await self.images.take(ctx.channel.id)
+        if image is None:
             await reply(ctx, "An error occurred!")
             return
 
-        await ctx.send(resp.json()[0]['url'])
+        await send(ctx, image.url)
+
+    async def _fill(self) -> None:
+        refill = self.images.refill()
+        if refill is not None:
+            await refill
+
+    async def _fetch(self, count: int) -> List[Image]:
+        resp = await self.bot.http_client.get(
+            self.api_url, endpoint='dog',
+            params={'limit': min(count, BATCH_SIZE)}
+        )
+        if resp.status != 200:
+            raise RequestFailed(f"The dog API answered {resp.status}.")
+
+        return [Image(str(i['id']), i['url']) for i in resp.json()]
 
 
 def setup(bot):
-    bot.add_cog(DogPicture(bot))
\ No newline at end of file
+    bot.add_cog(DogPicture(bot))
@@ -0,0 +1,197 @@
+"""
+Auxiliary module for the DogPicture Cog. This module keeps dog pictures
+ready to be shown.
+
+Image URLs are fetched ahead of time, a batch per request, and kept in a
+buffer; the buffer is topped up in the background whenever it runs low, so
+commands are answered from memory. Every channel remembers the pictures it
+was last shown, which aren't shown there again for a while. If the API
+fails, it's only tried again after a growing delay, and commands get no
+picture till the buffer has some again.
+"""
+
+
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from time import monotonic
+from typing import (
+    Awaitable, Callable, Deque, List, NamedTuple, Optional, Set
+)
+
+
+log = logging.getLogger(__name__)
+
+# the most pictures kept, and how few there are when the buffer is topped up
+CAPACITY = 50
+LOW_WATER = 15
+
+# pictures a channel remembers, and channels that remember theirs
+RECENT_SIZE = 30
+MAX_CHANNELS = 1000
+
+# seconds to wait before fetching again after a failure; doubled every time
+# it fails again, up to the maximum
+RETRY_DELAY = 1.0
+MAX_RETRY_DELAY = 300.0
+
+
+class Image(NamedTuple):
+    """A picture from the API."""
+
+    id: str
+    url: str
+
+
+# returns up to the given number of pictures; raises if the API fails
+Fetch = Callable[[int], Awaitable[List[Image]]]
+
+
+class RecentlyShown:
+    """The last size pictures shown in a channel."""
+
+    def __init__(self, size: int = RECENT_SIZE) -> None:
+        self._order: Deque[str] = deque()
+        self._ids: Set[str] = set()
+        self.size = size
+
+    def __contains__(self, image_id: str) -> bool:
+        return image_id in self._ids
+
+    def add(self, image_id: str) -> None:
+        if image_id in self._ids:
+            return
+
+        if len(self._order) == self.size:
+            self._ids.discard(self._order.popleft())
+        self._order.append(image_id)
+        self._ids.add(image_id)
+
+
+class ImageBuffer:
+    """Pictures fetched ahead of time, shown without waiting for the API."""
+
+    def __init__(self, fetch: Fetch, capacity: int = CAPACITY,
+                    low_water: int = LOW_WATER,
+                    recent_size: int = RECENT_SIZE) -> None:
+        self.fetch = fetch
+        self.capacity = capacity
+        self.low_water = low_water
+        self.recent_size = recent_size
+
+        self._images: Deque[Image] = deque()
+        self._buffered: Set[str] = set()
+
+        # channel id -> what it was shown lately, least recently used first
+        self._recent: 'OrderedDict[int, RecentlyShown]' = OrderedDict()
+
+        self._refill: Optional[asyncio.Task] = None
+        self._retry_at = 0.0
+        self._retry_delay = RETRY_DELAY
+
+        self.fetches = 0
+        self.failures = 0
+
+    def __len__(self) -> int:
+        return len(self._images)
+
+    async def take(self, channel_id: int) -> Optional[Image]:
+        """
+        Return a picture for the channel, one not shown there lately if any.
+
+        If the buffer is empty, wait for the fetch under way, if there's
+        one; return None if there's still no picture.
+        """
+
+        image = self._pop(channel_id)
+        if image is None and self.refill() is not None:
+            try:
+                await asyncio.shield(self._refill)
+            except Exception:
+                pass
+            image = self._pop(channel_id)
+
+        if image is None and self._images:
+            image = self._pop(channel_id, fresh=False)
+
+        self.refill()
+        return image
+
+    def refill(self) -> Optional[asyncio.Task]:
+        """
+        Top the buffer up in the background if it's low; return the task.
+
+        Nothing is fetched while a fetch is under way, or before the delay
+        after a failure is over.
+        """
+
+        if self._refill is None:
+            if (len(self._images) >= self.low_water
+                    or monotonic() < self._retry_at):
+                return None
+
+            self._refill = asyncio.ensure_future(self._top_up())
+            self._refill.add_done_callback(self._refilled)
+
+        return self._refill
+
+    def close(self) -> None:
+        if self._refill is not None:
+            self._refill.cancel()
+
+    def _pop(self, channel_id: int, fresh: bool = True) -> Optional[Image]:
+        recent = self._recent.pop(channel_id, None)
+        if recent is None:
+            recent = RecentlyShown(self.recent_size)
+        self._recent[channel_id] = recent
+        if len(self._recent) > MAX_CHANNELS:
+            self._recent.popitem(last=False)
+
+        for i, image in enumerate(self._images):
+            if not fresh or image.id not in recent:
+                del self._images[i]
+                self._buffered.discard(image.id)
+                recent.add(image.id)
+                return image
+
+        return None
+
+    async def _top_up(self) -> None:
+        # fetch may return fewer pictures than it's asked for, e.g. as many
+        # as the API gives per request, so it's called till the buffer is
+        # full or a batch brings nothing new
+        while len(self._images) < self.capacity:
+            self.fetches += 1
+            try:
+                images = await self.fetch(self.capacity - len(self._images))
+            except Exception as ex:
+                self.failures += 1
+                self._retry_at = monotonic() + self._retry_delay
+                log.warning(
+                    "Couldn't fetch dog pictures, trying again in %.0fs: %r",
+                    self._retry_delay, ex
+                )
+                self._retry_delay = min(
+                    2 * self._retry_delay, MAX_RETRY_DELAY
+                )
+                raise
+
+            self._retry_delay = RETRY_DELAY
+            added = 0
+            for image in images:
+                # the API picks at random, so a batch may repeat a picture
+                if (image.id not in self._buffered
+                        and len(self._images) < self.capacity):
+                    self._images.append(image)
+                    self._buffered.add(image.id)
+                    added += 1
+
+            if not added:
+                return
+
+    def _refilled(self, task: asyncio.Task) -> None:
+        self._refill = None
+
+        # the error was logged; this only keeps asyncio from complaining
+        if not task.cancelled():
+            task.exception()
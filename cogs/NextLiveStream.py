@@ -4,49 +4,124 @@ timezone.
 """
 
 
+import asyncio
 from os import getenv
 
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
 
 from pytz import timezone
 from pytz.exceptions import UnknownTimeZoneError
 
-import psycopg2
-
-from requests import get as http_get
-
 from discord.ext import commands
 
+from .NextLiveStreamAux.Calendar import CalendarCache, Livestream
+from .NextLiveStreamAux.Reminders import DEFAULT_LEAD, Reminders
+from .NextLiveStreamAux.Resolver import TimezoneResolver
+from .NextLiveStreamAux.Schedule import WINDOW_DAYS, EventStore
+from .NextLiveStreamAux.Timezones import TimezoneCache
 from .utils.utils import reply
 
 
+# seconds between two reads of the members' settings, when other processes
+# change them too
+RELOAD_INTERVAL = 5 * 60
+
+
+def _loaded(task: Optional[asyncio.Task]) -> bool:
+    """Whether the load run by task, if any, is over."""
+
+    return task is None or (task.done() and not task.cancelled())
+
+
 class NextLiveStreamCog(commands.Cog):
     """Cog to display the next stream's time in a given country's timezone."""
 
     def __init__(self, bot):
         self.bot = bot
 
-        self.timezones = self._get_timezones()
+        # nothing is read here; the files, the database and the calendar
+        # are read once the bot is online, unless the previous version of
+        # the cog handed them over
+        state = bot.take_state(self)
+
+        # the country aliases of the tz file, and the index of every name a
+        # timezone goes by
+        self.timezones: Dict[str, str] = state.get('timezones', {})
+        self.resolver: Optional[TimezoneResolver] = state.get('resolver')
+        self._resolver_build: Optional[asyncio.Future] = None
+        if self.resolver is None:
+            bot.warm_up('timezone index', self._get_resolver)
         self.time_format = "%B %d at %I:%M %P"
 
+        # the upcoming weeks of the calendar, kept up to date by the cache
+        self.schedule = state.get('schedule')
+        if self.schedule is None:
+            self.schedule = EventStore(self._get_events_page)
+        self.schedule.fetch_page = self._get_events_page
+        self.calendar = state.get('calendar')
+        if self.calendar is None:
+            self.calendar = CalendarCache(self._get_future_livestream)
+        self.calendar.fetch = self._get_future_livestream
+        self._calendar_task = bot.after_ready(self.calendar.run)
+
         self.tz_table = 'timezones'
 
-        conn = psycopg2.connect(getenv('DATABASE_URL'), sslmode='require')
-        cur = conn.cursor()
-
-        cur.execute(
-            f"""
-            CREATE TABLE IF NOT EXISTS {self.tz_table} (
-                id              SERIAL PRIMARY KEY,
-                member_id       BIGINT UNIQUE,
-                timezone_name   TEXT
-            );
-            """
-        )
-        conn.commit()
+        # timezones members have set for themselves
+        self.member_timezones = state.get('member_timezones')
+        self._tz_load_task = None
+        if self.member_timezones is None:
+            self.member_timezones = TimezoneCache(bot.db, self.tz_table)
+            self._tz_load_task = bot.warm_up(
+                'member timezones', self.member_timezones.load
+            )
 
-        cur.close()
-        conn.close()
+        # reminders before streams, for the members who asked for them
+        self.reminders = state.get('reminders')
+        self._reminders_load_task = None
+        if self.reminders is None:
+            self.reminders = Reminders(
+                bot.db, self.tz_table, self.member_timezones.ensure_table,
+                self._deliver_reminder
+            )
+            self._reminders_load_task = bot.warm_up(
+                'reminders', self.reminders.load
+            )
+        self.reminders.deliver = self._deliver_reminder
+        self._reminders_task = bot.after_ready(self.reminders.run)
+
+        # other processes of a cluster write to the same table
+        self._reload_task = None
+        if not bot.owns_all_guilds:
+            self._reload_task = bot.after_ready(self._reload_members)
+
+    def export_state(self):
+        """Hand the indexes, caches and reminders over to a new version."""
+
+        state = {
+            'timezones': self.timezones,
+            'resolver': self.resolver,
+            'schedule': self.schedule,
+            'calendar': self.calendar,
+        }
+
+        # unloading the cog cancels the loads still running, so what
+        # hasn't been loaded yet is left for the new version to load
+        if _loaded(self._tz_load_task):
+            state['member_timezones'] = self.member_timezones
+        if _loaded(self._reminders_load_task):
+            state['reminders'] = self.reminders
+
+        return state
+
+    def cog_unload(self):
+        self._calendar_task.cancel()
+        self._reminders_task.cancel()
+        for task in (
+            self._tz_load_task, self._reminders_load_task, self._reload_task
+        ):
+            if task is not None:
+                task.cancel()
 
     @commands.command(
         name='tzset',
@@ -68,24 +143,7 @@ class NextLiveStreamCog(commands.Cog):
             )
             return
 
-        conn = psycopg2.connect(getenv('DATABASE_URL'), sslmode='require')
-        cur = conn.cursor()
-
-        cur.execute(
-            f"""
-            INSERT INTO {self.tz_table} (member_id, timezone_name)
-            VALUES (%s, %s)
-            ON CONFLICT (member_id)
-            DO
-                UPDATE SET timezone_name = EXCLUDED.timezone_name;
-            """,
-
-            (user_id, tz_name)
-        )
-        conn.commit()
-
-        cur.close()
-        conn.close()
+        await self.member_timezones.set(user_id, tz_name)
 
         await reply(ctx, f"You've successfully set your timezone to {tz_name}")
 
@@ -101,44 +159,27 @@ class NextLiveStreamCog(commands.Cog):
         """
 
         if country is None:
-            conn = psycopg2.connect(getenv('DATABASE_URL'), sslmode='require')
-            cur = conn.cursor()
-
-            cur.execute(
-                f"""
-                SELECT timezone_name FROM {self.tz_table}
-                    WHERE member_id = %s;
-                """,
-                (ctx.author.id,)
-            )
-            result = cur.fetchone()
-            country = 'Heleen' if result is None else result[0]
-
-        if '/' not in country:
-            country = country.lower()
-
-            if country not in self.timezones:
-                await reply(
-                    ctx,
-                    f"TZ data for {country} is not available yet. "
-                    "You can request the mods to add TZ data for your country."
-                )
-                return
-            tzname = self.timezones[country]
-        else:
-            tzname = country
-
-        try:
-            tz = timezone(tzname)
-        except UnknownTimeZoneError:
+            result = await self.member_timezones.get(ctx.author.id)
+            country = 'Heleen' if result is None else result
+
+        # countries, cities and timezone names are all understood, even
+        # when they're misspelled a little
+        resolver = await self._get_resolver()
+        resolution = resolver.resolve(country)
+        if resolution is None:
             await reply(
                 ctx,
-                f"'{tzname}' is not a valid timezone."
+                f"TZ data for {country} is not available yet. "
+                "You can request the mods to add TZ data for your country."
             )
             return
 
+        country = resolution.name
+        tzname = resolution.zone
+        tz = resolver.tz(tzname)
+
         try:
-            stream_time = self._get_future_livestream()
+            stream_time = (await self.calendar.next_livestream()).start
         except ValueError:
             await reply(
                 ctx,
@@ -167,39 +208,198 @@ class NextLiveStreamCog(commands.Cog):
             else:
                 msg += " (Heleen's original time)"
 
+        # completions and typos may not be what the member meant
+        if resolution.match != 'exact':
+            msg = f"I assumed you meant {resolution.name}. " + msg
+
         await reply(ctx, msg)
 
-    
-    def _get_future_livestream(self):
-        """Return the time for the next livestream."""
+    @commands.command(
+        name='remind',
+        help="Get reminded before every livestream: !remind [minutes|off]"
+    )
+    async def remind(self, ctx, lead: str = str(DEFAULT_LEAD)):
+        """
+        Remind the user the given number of minutes before every stream.
+
+        The user is mentioned in the channel the command is used in, or sent
+        a DM if the command is used in a DM. 'off' stops the reminders.
+        """
+
+        if lead.lower() == 'off':
+            if await self.reminders.unsubscribe(ctx.author.id):
+                await reply(ctx, "You won't be reminded of livestreams.")
+            else:
+                await reply(ctx, "You weren't being reminded anyway.")
+            return
+
+        try:
+            minutes = int(lead)
+        except ValueError:
+            await reply(ctx, f"{lead} is not a number of minutes.")
+            return
+
+        channel_id = ctx.channel.id if ctx.guild is not None else None
+        try:
+            await self.reminders.subscribe(ctx.author.id, minutes, channel_id)
+        except ValueError as ex:
+            await reply(ctx, str(ex))
+            return
+
+        where = "here" if channel_id is not None else "by DM"
+        await reply(
+            ctx,
+            f"You'll be reminded {minutes} minutes before every livestream "
+            f"{where}."
+        )
+
+    @commands.command(
+        name='schedule',
+        help="Display the livestreams of the next few days in your timezone."
+    )
+    async def schedule(self, ctx, days: int = 7):
+        """
+        Display the livestreams of the next given number of days.
+
+        Times are in the timezone set with tzset, or in Heleen's timezone.
+        """
+
+        days = min(max(days, 1), WINDOW_DAYS)
+
+        resolver = await self._get_resolver()
+        tzname = await self.member_timezones.get(ctx.author.id)
+        if tzname is None:
+            tzname = self.timezones['Heleen'.lower()]
+        tz = resolver.tz(tzname)
+
+        try:
+            await self.calendar.next_livestream()
+        except ValueError:
+            pass
+        except ConnectionError as ex:
+            await reply(
+                ctx,
+                str(ex) + " This shouldn't have happened. "
+                "Please note the status code and inform the mods."
+            )
+            return
+
+        now = datetime.now().astimezone(tz)
+        streams = self.schedule.upcoming(now + timedelta(days=days))
+        if not streams:
+            await reply(
+                ctx,
+                f"No streams in the next {days} days. The study calendar may "
+                "not have been updated yet."
+            )
+            return
+
+        lines = [f"Livestreams in the next {days} days ({tzname}):"]
+        for stream in streams:
+            start_time = stream.start.astimezone(tz)
+            line = start_time.strftime("%A, " + self.time_format)
+            if start_time <= now:
+                line += " (live now!)"
+            if stream.summary:
+                line += f" -- {stream.summary}"
+            lines.append(line)
+
+        await reply(ctx, '\n'.join(lines))
+
+    async def _get_future_livestream(self) -> Optional[Livestream]:
+        """Return the next livestream that hasn't ended, if there's one."""
+
+        await self.schedule.sync()
+        self.reminders.reschedule(
+            self.schedule.upcoming(self.schedule.window_end)
+        )
+
+        return self.schedule.next_livestream()
+
+    async def _deliver_reminder(self, channel_id: Optional[int],
+                                member_id: Optional[int], text: str):
+        """Queue a reminder for a channel, or for a member's DMs."""
+
+        # in a cluster, a channel is only known to the process that serves
+        # its guild, and DMs are sent by one process
+        if channel_id is not None:
+            target = self.bot.get_channel(channel_id)
+        elif not self.bot.owns_dms:
+            return
+        else:
+            target = self.bot.get_user(member_id)
+            if target is None:
+                target = await self.bot.fetch_user(member_id)
+
+        if target is not None:
+            self.bot.outbox.post(target, text)
+
+    async def _reload_members(self) -> None:
+        """Pick up timezones and reminders set through other processes."""
+
+        while True:
+            await asyncio.sleep(RELOAD_INTERVAL)
+            await self.member_timezones.load()
+            await self.reminders.load()
+
+    async def _get_events_page(self, params: Dict[str, str]) -> Dict:
+        """Return a page of events from the study calendar."""
 
         API_KEY     = getenv('GOOGLE_API_KEY')
-        HELEEN_TZ   = timezone(self.timezones['Heleen'.lower()])
         CALENDAR_ID = 'oro5litmqb6972jgi5bgp4dg4k@group.calendar.google.com'
-        API_CALL    = (
-            'https://www.googleapis.com/calendar/v3/calendars/{}/events?'
-            'maxResults=1&singleEvents=true&timeMin={}&key={}&orderBy=startTime'
+        # CALENDAR_API_URL points the cog at another API, e.g. a local
+        # stand-in; {} stands for the calendar's ID
+        API_CALL    = getenv(
+            'CALENDAR_API_URL',
+            'https://www.googleapis.com/calendar/v3/calendars/{}/events'
         )
 
-        now = datetime.now().astimezone(HELEEN_TZ)
-        
-        # look only for those livestreams that are to end after time_min
-        # special characters must be replaced by URL-friendly codes
-        time_min = now.isoformat().replace(':', '%3A').replace('+', '%2B')
-
-        resp = http_get(API_CALL.format(CALENDAR_ID, time_min, API_KEY))
-        if resp.status_code != 200:
+        # RequestFailed is a ConnectionError too
+        resp = await self.bot.http_client.get(
+            API_CALL.format(CALENDAR_ID),
+            params=dict(params, key=API_KEY),
+            endpoint='calendar/events'
+        )
+        if resp.status != 200:
             raise ConnectionError(
-                f"GET failed. Status code: {resp.status_code}."
+                f"GET failed. Status code: {resp.status}."
             )
 
-        events = resp.json()['items']
-        if not events:
-            raise ValueError("No upcoming events.")
+        return resp.json()
+
+    async def _get_resolver(self) -> TimezoneResolver:
+        """Return the timezone index, waiting for it to be built."""
+
+        # it's built once, on a worker thread; the warm-up and the commands
+        # that come before it's done all wait for the same build
+        if self.resolver is None:
+            if self._resolver_build is None:
+                self._resolver_build = self.bot.loop.run_in_executor(
+                    None, self._build_resolver
+                )
+            build = self._resolver_build
+
+            try:
+                # a command that's cancelled doesn't cancel the build
+                timezones, resolver = await asyncio.shield(build)
+            except Exception:
+                # the next command tries again
+                if self._resolver_build is build:
+                    self._resolver_build = None
+                raise
+            self.timezones, self.resolver = timezones, resolver
+
+        return self.resolver
+
+    def _build_resolver(self) -> Tuple[Dict[str, str], TimezoneResolver]:
+        """Read the tz file and index every timezone name; blocking."""
+
+        timezones = self._get_timezones()
+        resolver = TimezoneResolver(timezones)
+        resolver.build_typo_index()
 
-        return datetime.fromisoformat(events[0]['start']['dateTime'])
+        return timezones, resolver
 
-    
     def _get_timezones(self):
         """Return a dictionary mapping country with timezone."""
 
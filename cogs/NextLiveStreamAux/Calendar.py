@@ -0,0 +1,147 @@
+"""
+Auxiliary module for the NextLiveStream Cog. This module keeps the next
+livestream from the study calendar in memory.
+
+The calendar changes only a few times a week, so commands are answered from
+the cache. The cache is refreshed in the background on a schedule and as
+soon as the cached stream is over. Concurrent requests that find the cache
+out of date share a single upstream request. If the calendar can't be
+reached, the cached stream is served for as long as it hasn't ended.
+"""
+
+
+import asyncio
+import logging
+from datetime import datetime, timezone
+from time import monotonic
+from typing import Awaitable, Callable, NamedTuple, Optional
+
+
+log = logging.getLogger(__name__)
+
+# seconds between two background refreshes
+REFRESH_INTERVAL = 15 * 60
+
+# seconds to wait before trying again after a failed background refresh
+RETRY_INTERVAL = 60
+
+
+class Livestream(NamedTuple):
+    """A livestream in the calendar; times are timezone-aware."""
+
+    start: datetime
+    end: datetime
+    summary: str = ''
+
+
+# returns the next livestream that hasn't ended, or None if there's none;
+# raises ConnectionError if the calendar can't be reached
+Fetch = Callable[[], Awaitable[Optional[Livestream]]]
+
+
+class CalendarCache:
+    """The next livestream, fetched by fetch and kept in memory."""
+
+    def __init__(self, fetch: Fetch,
+                    refresh_interval: float = REFRESH_INTERVAL) -> None:
+        self.fetch = fetch
+        self.refresh_interval = refresh_interval
+
+        self._stream: Optional[Livestream] = None
+        self._fetched_at: Optional[float] = None
+        self._inflight: Optional[asyncio.Future] = None
+
+        # answers served from memory, upstream requests and answers served
+        # from memory because the calendar couldn't be reached
+        self.hits = 0
+        self.fetches = 0
+        self.stale_served = 0
+
+    def _fresh(self) -> bool:
+        """Can the cached answer be served as it is?"""
+
+        if self._fetched_at is None:
+            return False
+        if monotonic() - self._fetched_at >= self.refresh_interval:
+            return False
+
+        return self._stream is None or not self._over(self._stream)
+
+    @staticmethod
+    def _over(stream: Livestream) -> bool:
+        return stream.end <= datetime.now(timezone.utc)
+
+    async def next_livestream(self) -> Livestream:
+        """
+        Return the next livestream that hasn't ended.
+
+        Raise ValueError if there's none and ConnectionError if the calendar
+        can't be reached and nothing usable is cached.
+        """
+
+        if self._fresh():
+            self.hits += 1
+        else:
+            try:
+                await self.refresh()
+            except ConnectionError:
+                stream = self._stream
+                if stream is None or self._over(stream):
+                    raise
+
+                log.warning("Calendar unreachable; serving the cached stream.")
+                self.stale_served += 1
+
+        if self._stream is None:
+            raise ValueError("No upcoming events.")
+
+        return self._stream
+
+    async def refresh(self) -> None:
+        """Fetch the next livestream; concurrent callers share one request."""
+
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._fetch())
+            self._inflight.add_done_callback(self._fetched)
+
+        # one caller being cancelled mustn't cancel the request of the others
+        await asyncio.shield(self._inflight)
+
+    async def _fetch(self) -> None:
+        self.fetches += 1
+        stream = await self.fetch()
+
+        self._stream = stream
+        self._fetched_at = monotonic()
+
+    def _fetched(self, future: asyncio.Future) -> None:
+        self._inflight = None
+
+        # every caller gets the exception; this only keeps asyncio from
+        # complaining when there are none left
+        if not future.cancelled():
+            future.exception()
+
+    async def run(self) -> None:
+        """Refresh the cache on a schedule and whenever the stream ends."""
+
+        while True:
+            try:
+                await self.refresh()
+            except ConnectionError as ex:
+                log.warning("Couldn't refresh the calendar: %s", ex)
+                await asyncio.sleep(RETRY_INTERVAL)
+                continue
+            except Exception:
+                log.exception("Couldn't refresh the calendar.")
+                await asyncio.sleep(RETRY_INTERVAL)
+                continue
+
+            delay = self.refresh_interval
+            if self._stream is not None:
+                until_end = (
+                    self._stream.end - datetime.now(timezone.utc)
+                ).total_seconds()
+                delay = min(delay, max(until_end, 1))
+
+            await asyncio.sleep(delay)
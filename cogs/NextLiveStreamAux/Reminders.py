@@ -0,0 +1,327 @@
+"""
+Auxiliary module for the NextLiveStream Cog. This module reminds members
+that a livestream is about to start.
+
+Members choose how many minutes ahead they want to be reminded, in a
+channel or by DM. Everyone who chose the same lead is reminded of a stream
+at the same time, so a single timer heap holds one entry per stream and
+lead, however many members there are. One task sleeps till the earliest
+entry is due. Reminders are handed to the bot's outbox, which merges and
+paces them; the members of a channel are mentioned together.
+
+Subscriptions are kept in the timezones table and read back when the cog
+is loaded, and the heap is rebuilt whenever the calendar is synced. When
+other processes change subscriptions too, they're read again every now and
+then.
+"""
+
+
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import (
+    Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+)
+
+from .Calendar import Livestream
+from ..utils.db import Database
+from ..utils.outbox import MAX_MESSAGE_LEN
+
+
+log = logging.getLogger(__name__)
+
+# the lead members get if they don't choose one, and the longest one, in
+# minutes
+DEFAULT_LEAD = 15
+MAX_LEAD = 24 * 60
+
+# sends text to the channel with the given ID, or else to the member with
+# the given ID by DM
+Deliver = Callable[[Optional[int], Optional[int], str], Awaitable[None]]
+
+
+class Subscription:
+    """How a member wants to be reminded."""
+
+    __slots__ = ('lead', 'channel_id')
+
+    def __init__(self, lead: int, channel_id: Optional[int]) -> None:
+        # minutes before the start of a stream
+        self.lead = lead
+
+        # where the member is mentioned; None for a DM
+        self.channel_id = channel_id
+
+
+def timestamp(time: datetime, style: str = 'F') -> str:
+    """Return markup that Discord shows in every reader's own timezone."""
+
+    return f"<t:{int(time.timestamp())}:{style}>"
+
+
+def _batches(header: str, mentions: List[str]) -> List[str]:
+    """Split the mentions into messages that Discord accepts."""
+
+    messages = []
+    current = header
+    for m in mentions:
+        if len(current) + 1 + len(m) > MAX_MESSAGE_LEN:
+            messages.append(current)
+            current = header
+        current += ' ' + m
+    messages.append(current)
+
+    return messages
+
+
+class Reminders:
+    """The subscriptions of all members and the heap of reminders due."""
+
+    def __init__(self, db: Database, table: str,
+                    ensure_table: Callable[[], Awaitable[None]],
+                    deliver: Deliver) -> None:
+        self.db = db
+        self.table = table
+        self.ensure_table = ensure_table
+        self.deliver = deliver
+
+        # member id -> subscription, and the members by lead
+        self.subscriptions: Dict[int, Subscription] = {}
+        self._by_lead: Dict[int, Set[int]] = {}
+
+        # (time due, start of the stream, lead) of every reminder to send,
+        # and the streams by their start
+        self._heap: List[Tuple[datetime, datetime, int]] = []
+        self._streams: Dict[datetime, Livestream] = {}
+
+        # (start, lead) of the reminders that have been sent
+        self._sent: Set[Tuple[datetime, int]] = set()
+
+        # set when the heap changes, to wake up the task
+        self._changed = asyncio.Event()
+        self._columns_ready = False
+
+        # members who (un)subscribed while the subscriptions are being read
+        self._changed_while_loading: Optional[Set[int]] = None
+
+        self.sent = 0
+
+        self._set = db.prepare(
+            'remind_set',
+            f"""
+            INSERT INTO {table} (member_id, remind_lead, remind_channel)
+            VALUES ($1, $2, $3)
+            ON CONFLICT (member_id)
+            DO
+                UPDATE SET remind_lead = EXCLUDED.remind_lead,
+                           remind_channel = EXCLUDED.remind_channel
+            """
+        )
+        self._unset = db.prepare(
+            'remind_unset',
+            f"""
+            UPDATE {table} SET remind_lead = NULL, remind_channel = NULL
+                WHERE member_id = $1
+            """
+        )
+        self._all = db.prepare(
+            'remind_all',
+            f"""
+            SELECT member_id, remind_lead, remind_channel FROM {table}
+                WHERE remind_lead IS NOT NULL
+            """
+        )
+
+    async def load(self) -> None:
+        """Read every subscription from the database, replacing ours."""
+
+        self._changed_while_loading = set()
+        try:
+            await self._ensure_columns()
+            rows = await self._all.fetchall()
+        except Exception as ex:
+            log.warning("Couldn't load reminder subscriptions: %r", ex)
+            return
+        finally:
+            changed, self._changed_while_loading = (
+                self._changed_while_loading, None
+            )
+
+        # changes made while loading are newer than the rows
+        kept = {
+            member_id: self.subscriptions[member_id]
+            for member_id in changed if member_id in self.subscriptions
+        }
+
+        self.subscriptions = {}
+        self._by_lead = {}
+        for member_id, lead, channel_id in rows:
+            if member_id not in changed:
+                self._subscribe(member_id, lead, channel_id)
+        for member_id, sub in kept.items():
+            self._subscribe(member_id, sub.lead, sub.channel_id)
+        self._rebuild()
+
+        log.info("Loaded %d reminder subscriptions.", len(rows))
+
+    async def subscribe(self, member_id: int, lead: int,
+                        channel_id: Optional[int]) -> None:
+        """Remind the member lead minutes before every stream."""
+
+        if not 1 <= lead <= MAX_LEAD:
+            raise ValueError(f"The lead must be 1 to {MAX_LEAD} minutes.")
+
+        await self._ensure_columns()
+        await self._set.execute(member_id, lead, channel_id)
+
+        self._subscribe(member_id, lead, channel_id)
+        self._rebuild()
+
+    async def unsubscribe(self, member_id: int) -> bool:
+        """Stop reminding the member; return whether they were subscribed."""
+
+        await self._ensure_columns()
+        await self._unset.execute(member_id)
+
+        if not self._unsubscribe(member_id):
+            return False
+
+        self._rebuild()
+        return True
+
+    def reschedule(self, streams: Iterable[Livestream]) -> None:
+        """Replace the streams that reminders are sent for."""
+
+        self._streams = {s.start: s for s in streams}
+        self._rebuild()
+
+    async def run(self) -> None:
+        """Send reminders as they become due."""
+
+        while True:
+            self._changed.clear()
+
+            now = datetime.now(timezone.utc)
+            if self._heap and self._heap[0][0] <= now:
+                _, start, lead = heapq.heappop(self._heap)
+                await self._remind(start, lead)
+                continue
+
+            timeout = None
+            if self._heap:
+                timeout = (self._heap[0][0] - now).total_seconds()
+
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _subscribe(self, member_id: int, lead: int,
+                    channel_id: Optional[int]) -> None:
+        self._unsubscribe(member_id)
+        if self._changed_while_loading is not None:
+            self._changed_while_loading.add(member_id)
+
+        self.subscriptions[member_id] = Subscription(lead, channel_id)
+        self._by_lead.setdefault(lead, set()).add(member_id)
+
+    def _unsubscribe(self, member_id: int) -> bool:
+        if self._changed_while_loading is not None:
+            self._changed_while_loading.add(member_id)
+
+        sub = self.subscriptions.pop(member_id, None)
+        if sub is None:
+            return False
+
+        members = self._by_lead[sub.lead]
+        members.discard(member_id)
+        if not members:
+            del self._by_lead[sub.lead]
+
+        return True
+
+    def _rebuild(self) -> None:
+        """Rebuild the heap from the streams and the leads in use."""
+
+        now = datetime.now(timezone.utc)
+
+        # reminders that were due while the bot was down aren't sent late
+        self._heap = [
+            (start - timedelta(minutes=lead), start, lead)
+            for start in self._streams
+            for lead in self._by_lead
+            if start - timedelta(minutes=lead) > now
+            and (start, lead) not in self._sent
+        ]
+        heapq.heapify(self._heap)
+
+        self._sent = {(s, lead) for s, lead in self._sent if s > now}
+        self._changed.set()
+
+    async def _remind(self, start: datetime, lead: int) -> None:
+        """Remind everyone with the given lead of the stream at start."""
+
+        self._sent.add((start, lead))
+
+        stream = self._streams.get(start)
+        members = self._by_lead.get(lead)
+        if stream is None or not members:
+            return
+
+        name = stream.summary or "The next livestream"
+        text = (
+            f"{name} starts {timestamp(start, 'R')} "
+            f"({timestamp(start)})."
+        )
+
+        # members of the same channel are mentioned together
+        by_channel: Dict[Optional[int], List[int]] = {}
+        for member_id in members:
+            sub = self.subscriptions[member_id]
+            by_channel.setdefault(sub.channel_id, []).append(member_id)
+
+        # delivering a DM may have to look the member up first; the lookups
+        # run together, so that a reminder due next isn't held up by them
+        deliveries = []
+        for channel_id, member_ids in by_channel.items():
+            if channel_id is None:
+                deliveries += [
+                    self._deliver(None, member_id, text)
+                    for member_id in member_ids
+                ]
+            else:
+                mentions = [f"<@{m}>" for m in member_ids]
+                deliveries += [
+                    self._deliver(channel_id, None, message)
+                    for message in _batches(text, mentions)
+                ]
+        await asyncio.gather(*deliveries)
+
+        self.sent += len(members)
+
+    async def _deliver(self, channel_id: Optional[int],
+                        member_id: Optional[int], text: str) -> None:
+        try:
+            await self.deliver(channel_id, member_id, text)
+        except Exception as ex:
+            log.info(
+                "Couldn't deliver a reminder to %s: %r",
+                channel_id or member_id, ex
+            )
+
+    async def _ensure_columns(self) -> None:
+        """Add the subscription columns to the table if they're missing."""
+
+        if self._columns_ready:
+            return
+
+        await self.ensure_table()
+        await self.db.execute(
+            f"""
+            ALTER TABLE {self.table}
+                ADD COLUMN IF NOT EXISTS remind_lead    INTEGER,
+                ADD COLUMN IF NOT EXISTS remind_channel BIGINT;
+            """
+        )
+        self._columns_ready = True
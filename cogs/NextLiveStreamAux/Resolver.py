@@ -0,0 +1,166 @@
+"""
+Auxiliary module for the NextLiveStream Cog. This module turns what members
+type into a timezone.
+
+Every name a timezone can be asked for by is indexed once: the country
+aliases of tzinfo.txt, every IANA zone name, and the city part of the
+common zone names ('kolkata' for Asia/Kolkata). Exact names are found in a
+dict, a prefix trie completes unfinished names, and typos are matched by
+edit distance. To avoid comparing a typo with every name, each name is
+also indexed by the strings left after deleting up to MAX_DISTANCE of its
+characters; two names within that distance of each other always share one
+of those strings. The deletion index is built by build_typo_index, or else
+on the first typo.
+"""
+
+
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+import pytz
+
+from ..utils.text import TypoIndex, distance
+
+
+# the most edits a typo may be away from a name
+MAX_DISTANCE = 2
+
+# queries no longer than this may only be one edit away from a name
+SHORT_NAME = 4
+
+# the shortest query that is completed to a name
+MIN_PREFIX = 3
+
+# the most names a completion returns
+COMPLETIONS = 10
+
+
+class Resolution(NamedTuple):
+    """The timezone a query was resolved to."""
+
+    # the IANA name of the timezone
+    zone: str
+
+    # the indexed name that matched the query
+    name: str
+
+    # edits between the query and name; 0 if it matched exactly or was a
+    # prefix
+    distance: int
+
+    # how name was found: 'exact', 'prefix' or 'typo'
+    match: str
+
+
+def _normalize(text: str) -> str:
+    return text.strip().lower().replace(' ', '_')
+
+
+class _Node:
+    """A node of the prefix trie."""
+
+    __slots__ = ('children', 'names')
+
+    def __init__(self) -> None:
+        self.children: Dict[str, '_Node'] = {}
+
+        # the first COMPLETIONS names under this node, shortest first
+        self.names: List[str] = []
+
+
+class TimezoneResolver:
+    """An index of the names of all timezones."""
+
+    def __init__(self, aliases: Dict[str, str],
+                    zones: Iterable[str] = pytz.all_timezones,
+                    cities: Iterable[str] = pytz.common_timezones) -> None:
+        # normalized name -> IANA name; aliases win over zone names, which
+        # win over cities
+        self.names: Dict[str, str] = {}
+
+        for zone in cities:
+            city = _normalize(zone.rsplit('/', 1)[-1])
+            self.names.setdefault(city, zone)
+        for zone in zones:
+            self.names[_normalize(zone)] = zone
+        for alias, zone in aliases.items():
+            self.names[_normalize(alias)] = zone
+
+        self._trie = _Node()
+        for name in sorted(self.names, key=lambda n: (len(n), n)):
+            node = self._trie
+            for ch in name:
+                node = node.children.setdefault(ch, _Node())
+                if len(node.names) < COMPLETIONS:
+                    node.names.append(name)
+
+        self._typo_index: Optional[TypoIndex] = None
+        self._tzinfos: Dict[str, pytz.BaseTzInfo] = {}
+
+    def resolve(self, query: str) -> Optional[Resolution]:
+        """
+        Return the timezone query stands for, or None if it's too far from
+        every name.
+
+        An exact name is preferred, then the shortest name that starts with
+        query, then the closest name.
+        """
+
+        query = _normalize(query)
+
+        zone = self.names.get(query)
+        if zone is not None:
+            return Resolution(zone, query, 0, 'exact')
+
+        completions = self.complete(query, 1)
+        if completions and len(query) >= MIN_PREFIX:
+            name = completions[0]
+            return Resolution(self.names[name], name, 0, 'prefix')
+
+        matches = self.closest(query, 1)
+        if matches:
+            name = matches[0]
+            return Resolution(
+                self.names[name], name, distance(query, name), 'typo'
+            )
+
+        return None
+
+    def complete(self, prefix: str,
+                    limit: int = COMPLETIONS) -> List[str]:
+        """Return the shortest names that start with prefix."""
+
+        node = self._trie
+        for ch in _normalize(prefix):
+            node = node.children.get(ch)
+            if node is None:
+                return []
+
+        return node.names[:limit]
+
+    def closest(self, query: str, limit: int = 3) -> List[str]:
+        """Return the names closest to query, closest first."""
+
+        query = _normalize(query)
+        max_distance = 1 if len(query) <= SHORT_NAME else MAX_DISTANCE
+
+        return self._typos().closest(query, max_distance, limit)
+
+    def tz(self, zone: str) -> pytz.BaseTzInfo:
+        """Return the tzinfo of an IANA name, made once per name."""
+
+        tzinfo = self._tzinfos.get(zone)
+        if tzinfo is None:
+            tzinfo = self._tzinfos[zone] = pytz.timezone(zone)
+
+        return tzinfo
+
+    def build_typo_index(self) -> None:
+        """Build the index typos are matched with, if it isn't built yet."""
+
+        self._typos()
+
+    def _typos(self) -> TypoIndex:
+        if self._typo_index is None:
+            self._typo_index = TypoIndex(self.names, MAX_DISTANCE)
+
+        return self._typo_index
@@ -0,0 +1,196 @@
+"""
+Auxiliary module for the NextLiveStream Cog. This module keeps a copy of the
+upcoming part of the study calendar.
+
+The events of the next few weeks are listed once. After that, only the
+events changed since the last sync are asked for (with updatedMin), and
+cancelled events and events moved out of the window are dropped. The
+window is listed again from scratch once a day, so that it keeps moving
+forward, and so that events moved into the past are dropped too.
+"""
+
+
+from datetime import datetime, timedelta, timezone
+from time import monotonic
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .Calendar import Livestream
+
+
+# days of the calendar kept in memory
+WINDOW_DAYS = 28
+
+# seconds between two full syncs
+FULL_SYNC_INTERVAL = 24 * 60 * 60
+
+# how much further back than the last sync updatedMin reaches, to make up
+# for our clock and Google's not agreeing
+CLOCK_SKEW = timedelta(minutes=5)
+
+# the most events the Calendar API returns in a page
+PAGE_SIZE = 250
+
+
+# gets one page of events.list with the given parameters and returns the
+# JSON; raises ConnectionError if the calendar can't be reached
+FetchPage = Callable[[Dict[str, str]], Awaitable[Dict[str, Any]]]
+
+
+def _rfc3339(time: datetime) -> str:
+    return time.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _parse_time(text: str) -> datetime:
+    # fromisoformat doesn't know the Z suffix before Python 3.11
+    if text.endswith('Z'):
+        text = text[:-1] + '+00:00'
+
+    return datetime.fromisoformat(text)
+
+
+def _parse(item: Dict[str, Any]) -> Optional[Livestream]:
+    """Return the livestream an event stands for; None for all-day events."""
+
+    start = item.get('start', {}).get('dateTime')
+    end = item.get('end', {}).get('dateTime')
+    if start is None or end is None:
+        return None
+
+    return Livestream(
+        _parse_time(start), _parse_time(end), item.get('summary', '')
+    )
+
+
+class EventStore:
+    """The livestreams in the next WINDOW_DAYS days of the calendar."""
+
+    def __init__(self, fetch_page: FetchPage,
+                    window_days: int = WINDOW_DAYS) -> None:
+        self.fetch_page = fetch_page
+        self.window = timedelta(days=window_days)
+
+        # event id -> livestream, and the ids in order of the start time
+        self._events: Dict[str, Livestream] = {}
+        self._order: List[str] = []
+
+        # the end of the window and when it was last synced, by our clock
+        self._window_end: Optional[datetime] = None
+        self._synced_at: Optional[datetime] = None
+        self._full_sync_at: Optional[float] = None
+
+        self.full_syncs = 0
+        self.incremental_syncs = 0
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    @property
+    def window_end(self) -> Optional[datetime]:
+        return self._window_end
+
+    async def sync(self) -> None:
+        """Bring the store up to date with the calendar."""
+
+        now = datetime.now(timezone.utc)
+
+        if (self._full_sync_at is None
+                or monotonic() - self._full_sync_at >= FULL_SYNC_INTERVAL):
+            await self._full_sync(now)
+        else:
+            await self._incremental_sync(now)
+
+    def next_livestream(self) -> Optional[Livestream]:
+        """Return the next livestream that hasn't ended, if there's one."""
+
+        if self._window_end is None:
+            return None
+
+        upcoming = self.upcoming(self._window_end)
+        return upcoming[0] if upcoming else None
+
+    def upcoming(self, until: datetime) -> List[Livestream]:
+        """Return the livestreams that haven't ended and start before until."""
+
+        now = datetime.now(timezone.utc)
+
+        streams = []
+        for event_id in self._order:
+            stream = self._events[event_id]
+            if stream.start >= until:
+                break
+            if stream.end > now:
+                streams.append(stream)
+
+        return streams
+
+    async def _list(self, params: Dict[str, str]) -> List[Dict[str, Any]]:
+        """Return the events of every page of a listing."""
+
+        params = dict(params, singleEvents='true', maxResults=str(PAGE_SIZE))
+
+        items = []
+        while True:
+            page = await self.fetch_page(params)
+            items += page.get('items', [])
+
+            token = page.get('nextPageToken')
+            if token is None:
+                return items
+            params['pageToken'] = token
+
+    async def _full_sync(self, now: datetime) -> None:
+        window_end = now + self.window
+        items = await self._list({
+            'timeMin': _rfc3339(now),
+            'timeMax': _rfc3339(window_end),
+        })
+
+        events = {}
+        for item in items:
+            stream = _parse(item)
+            if stream is not None and item.get('status') != 'cancelled':
+                events[item['id']] = stream
+
+        self._events = events
+        self._window_end = window_end
+        self._synced_at = now
+        self._full_sync_at = monotonic()
+        self._sort()
+
+        self.full_syncs += 1
+
+    async def _incremental_sync(self, now: datetime) -> None:
+        # no timeMax: an event moved out of the window is only listed at its
+        # new time, and must still be dropped. timeMin stays, or an edit to
+        # an open-ended recurring series would list every instance it ever
+        # had; so an event moved into the past isn't listed, and is only
+        # dropped by the next full sync
+        items = await self._list({
+            'timeMin': _rfc3339(now),
+            'updatedMin': _rfc3339(self._synced_at - CLOCK_SKEW),
+            'showDeleted': 'true',
+        })
+
+        for item in items:
+            stream = _parse(item)
+            if (stream is None or item.get('status') == 'cancelled'
+                    or stream.start >= self._window_end):
+                self._events.pop(item['id'], None)
+            else:
+                self._events[item['id']] = stream
+
+        # events that have ended aren't needed anymore
+        self._events = {
+            event_id: stream for event_id, stream in self._events.items()
+            if stream.end > now
+        }
+
+        self._synced_at = now
+        self._sort()
+
+        self.incremental_syncs += 1
+
+    def _sort(self) -> None:
+        self._order = sorted(
+            self._events, key=lambda event_id: self._events[event_id].start
+        )
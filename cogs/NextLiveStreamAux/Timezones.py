@@ -0,0 +1,199 @@
+"""
+Auxiliary module for the NextLiveStream Cog. This module keeps the
+timezones members have set for themselves.
+
+The timezones live in the database, and the most recently used ones are
+kept in memory as well. The whole table is read in pages when the cog is
+loaded. As long as every row fits in memory, a member missing from the
+cache has no timezone and the database isn't asked. Changes are written to
+the database first and to the cache after.
+
+When other processes write to the table too, load is called again every
+now and then to pick up their changes.
+"""
+
+
+import logging
+from collections import OrderedDict
+from typing import Optional, Set
+
+from ..utils.db import Database
+
+
+log = logging.getLogger(__name__)
+
+# the most timezones kept in memory
+CAPACITY = 10000
+
+# rows read from the database at a time while loading
+PAGE_SIZE = 1000
+
+
+class TimezoneCache:
+    """The timezone of every member who has set one."""
+
+    def __init__(self, db: Database, table: str = 'timezones',
+                    capacity: int = CAPACITY) -> None:
+        self.db = db
+        self.table = table
+        self.capacity = capacity
+
+        # member id -> timezone name, least recently used first
+        self._cache: 'OrderedDict[int, str]' = OrderedDict()
+
+        # whether every row of the table is in the cache
+        self.complete = False
+
+        self._table_ready = False
+
+        # members whose timezone was set while the table is being read
+        self._set_while_loading: Optional[Set[int]] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._upsert = db.prepare(
+            'tz_upsert',
+            f"""
+            INSERT INTO {table} (member_id, timezone_name)
+            VALUES ($1, $2)
+            ON CONFLICT (member_id)
+            DO
+                UPDATE SET timezone_name = EXCLUDED.timezone_name
+            """
+        )
+        self._lookup = db.prepare(
+            'tz_lookup',
+            f"""
+            SELECT timezone_name FROM {table}
+                WHERE member_id = $1
+            """
+        )
+        self._page = db.prepare(
+            'tz_page',
+            f"""
+            SELECT id, member_id, timezone_name FROM {table}
+                WHERE id > $1 AND timezone_name IS NOT NULL
+                ORDER BY id
+                LIMIT $2
+            """
+        )
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    async def load(self) -> None:
+        """
+        Read the table into the cache, a page at a time.
+
+        If the database can't be read, timezones are looked up as they're
+        needed instead.
+        """
+
+        try:
+            await self._load()
+        except Exception as ex:
+            log.warning("Couldn't load timezones: %r", ex)
+
+    async def _load(self) -> None:
+        await self.ensure_table()
+
+        # the table is read into a new cache, which replaces the old one
+        cache: 'OrderedDict[int, str]' = OrderedDict()
+        complete = False
+        self._set_while_loading = set()
+        try:
+            last_id = 0
+            while len(cache) < self.capacity:
+                rows = await self._page.fetchall(last_id, PAGE_SIZE)
+                for row_id, member_id, tz_name in rows:
+                    cache[member_id] = tz_name
+
+                if len(rows) < PAGE_SIZE:
+                    # every row has been read; the cache is complete if
+                    # they all fit
+                    complete = len(cache) <= self.capacity
+                    break
+                last_id = rows[-1][0]
+
+            # entries set while loading are newer than the table
+            for member_id in self._set_while_loading:
+                tz_name = self._cache.get(member_id)
+                if tz_name is not None:
+                    cache[member_id] = tz_name
+        finally:
+            self._set_while_loading = None
+
+        self._cache = cache
+        self.complete = complete
+        while len(self._cache) > self.capacity:
+            self._cache.popitem(last=False)
+            self.evictions += 1
+            self.complete = False
+
+        log.info(
+            "Loaded %d timezones; the cache is %scomplete.",
+            len(self._cache), '' if self.complete else 'not '
+        )
+
+    async def get(self, member_id: int) -> Optional[str]:
+        """Return the member's timezone, or None if they haven't set one."""
+
+        tz_name = self._cache.get(member_id)
+        if tz_name is not None:
+            self._cache.move_to_end(member_id)
+            self.hits += 1
+            return tz_name
+
+        if self.complete:
+            self.hits += 1
+            return None
+
+        self.misses += 1
+
+        await self.ensure_table()
+        row = await self._lookup.fetchone(member_id)
+        if row is None or row[0] is None:
+            return None
+
+        self._put(member_id, row[0])
+        return row[0]
+
+    async def set(self, member_id: int, tz_name: str) -> None:
+        """Save the member's timezone in the database and the cache."""
+
+        await self.ensure_table()
+        await self._upsert.execute(member_id, tz_name)
+
+        self._put(member_id, tz_name)
+        if self._set_while_loading is not None:
+            self._set_while_loading.add(member_id)
+
+    def _put(self, member_id: int, tz_name: str) -> None:
+        self._cache[member_id] = tz_name
+        self._cache.move_to_end(member_id)
+
+        if len(self._cache) > self.capacity:
+            self._cache.popitem(last=False)
+            self.evictions += 1
+
+            # members who were evicted are in the database only
+            self.complete = False
+
+    async def ensure_table(self) -> None:
+        """Create the table if it doesn't exist."""
+
+        if self._table_ready:
+            return
+
+        await self.db.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {self.table} (
+                id              SERIAL PRIMARY KEY,
+                member_id       BIGINT UNIQUE,
+                timezone_name   TEXT
+            );
+            """
+        )
+        self._table_ready = True
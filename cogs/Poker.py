@@ -1,14 +1,16 @@
 """A cog to play poker on Discord."""
 
 
+from concurrent.futures import ProcessPoolExecutor
 from typing import Optional
 
 import discord
 from discord.ext import commands
 
-from .utils.utils import reply
+from .utils.utils import reply, send
 from .PokerAux.Game import Game
-from .PokerAux import Implementation
+from .PokerAux import Equity, Evaluator, Implementation
+from .PokerAux.Tables import TableRegistry
 from .PokerAux.Constants import CHANNEL_NAME
 
 
@@ -18,8 +20,38 @@ class Poker(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
 
-        self.poker_channel: Optional[discord.TextChannel] = None
-        self.game: Optional[Game] = None
+        # every channel can have its own game of poker; the games being
+        # played carry on when the cog is reloaded
+        state = bot.take_state(self)
+        self.tables = state.get('tables')
+        if self.tables is None:
+            self.tables = TableRegistry()
+
+        # map the hand rank tables, building them if they're missing, once
+        # the bot is online rather than at the first showdown; NumPy is
+        # imported for !odds then too
+        bot.warm_up('hand ranks', Evaluator.load)
+        bot.warm_up('numpy', Equity.load_numpy)
+
+        # simulations for !odds run here, away from the event loop
+        self._odds_executor: Optional[ProcessPoolExecutor] = None
+
+    def export_state(self):
+        """Hand the tables over to a new version of the cog."""
+
+        return {'tables': self.tables}
+
+    def cog_unload(self):
+        if self._odds_executor is not None:
+            self._odds_executor.shutdown(wait=False)
+
+    def odds_executor(self) -> ProcessPoolExecutor:
+        """Return the process pool used to calculate odds."""
+
+        if self._odds_executor is None:
+            self._odds_executor = ProcessPoolExecutor()
+
+        return self._odds_executor
 
     @commands.command(
         name='poker',
@@ -37,14 +69,12 @@ class Poker(commands.Cog):
                 "there."
             )
             return
-        else:
-            self.poker_channel = ctx.channel
 
-        if self.game is not None:
+        if self.tables.get(ctx.channel) is not None:
             await reply(
                 ctx,
-                "Someone is already player poker. Please wait for them to "
-                "finish."
+                "Someone is already playing poker in this channel. Please "
+                "wait for them to finish or use another poker channel."
             )
             return
 
@@ -62,6 +92,14 @@ class Poker(commands.Cog):
             )
             return
 
+        for p in players:
+            if self.tables.table_of(p) is not None:
+                await reply(
+                    ctx,
+                    f"{p.mention} is already playing at another table."
+                )
+                return
+
         await Implementation.poker(self, ctx, players)
 
     @commands.command(
@@ -76,7 +114,7 @@ class Poker(commands.Cog):
         This command can only be run by an admin.
         """
 
-        self.game = None
+        self.tables.close(ctx.channel)
 
     @commands.command(
         name='endpoker',
@@ -89,13 +127,14 @@ class Poker(commands.Cog):
         This command can only be run by one of the active players.
         """
 
-        if not await Implementation.runnable(self, ctx, False):
+        game = self.tables.get(ctx.channel)
+        if not await Implementation.runnable(game, ctx, False):
             return
-        if not ctx.author in (p.member for p in self.game.players):
+        if not ctx.author in (p.member for p in game.players):
             await reply(ctx, "You can't run this command.")
             return
 
-        self.game = None
+        self.tables.close(ctx.channel)
 
     @commands.command(
         name='call',
@@ -105,12 +144,11 @@ class Poker(commands.Cog):
     async def call(self, ctx: commands.Context):
         """Bet the minimum required chips in poker."""
 
-        if not await Implementation.runnable(self, ctx):
+        game = await self._table(ctx)
+        if game is None:
             return
-        if ctx.channel != self.poker_channel:
-            raise commands.NoPrivateMessage
 
-        await Implementation.call(self, ctx)
+        await Implementation.call(game, ctx)
 
     @commands.command(
         name='bet',
@@ -120,16 +158,15 @@ class Poker(commands.Cog):
     async def bet(self, ctx: commands.Context, amt: int = None):
         """Bet the given amount of chips."""
 
-        if not await Implementation.runnable(self, ctx):
+        game = await self._table(ctx)
+        if game is None:
             return
-        if ctx.channel != self.poker_channel:
-            raise commands.NoPrivateMessage
 
         if amt is None:
             await reply(ctx, "You didn't say how much you want to bet!")
             return
 
-        await Implementation.bet(self, ctx, amt)
+        await Implementation.bet(game, ctx, amt)
 
     @commands.command(
         name='fold',
@@ -139,12 +176,11 @@ class Poker(commands.Cog):
     async def fold(self, ctx: commands.Context):
         """Fold your cards for this round."""
 
-        if not await Implementation.runnable(self, ctx):
+        game = await self._table(ctx)
+        if game is None:
             return
-        if ctx.channel != self.poker_channel:
-            raise commands.NoPrivateMessage
 
-        await Implementation.fold(self, ctx)
+        await Implementation.fold(game, ctx)
 
     @commands.command(
         name='all-in',
@@ -154,16 +190,16 @@ class Poker(commands.Cog):
     async def all_in(self, ctx: commands.Context):
         """
         Bet all your chips.
-        
-        TODO: Implement side pots.
+
+        If others bet more than you can match, you can only win what you
+        put in from each of them; the rest goes to a side pot.
         """
 
-        if not await Implementation.runnable(self, ctx):
+        game = await self._table(ctx)
+        if game is None:
             return
-        if ctx.channel != self.poker_channel:
-            raise commands.NoPrivateMessage
 
-        await Implementation.all_in(self, ctx)
+        await Implementation.all_in(game, ctx)
 
     @commands.command(
         name='chips',
@@ -176,13 +212,14 @@ class Poker(commands.Cog):
         If no player is given, the person who runs the command is used.
         """
 
-        if not await Implementation.runnable(self, ctx, False):
+        game = await self._table(ctx, False)
+        if game is None:
             return
 
         if player is None:
             player = ctx.author
 
-        await Implementation.chips(self, ctx, player)
+        await Implementation.chips(game, ctx, player)
 
     @commands.command(
         name='pot',
@@ -191,10 +228,11 @@ class Poker(commands.Cog):
     async def pot(self, ctx: commands.Context):
         """Show the amount of chips in the pot."""
 
-        if not await Implementation.runnable(self, ctx, False):
+        game = await self._table(ctx, False)
+        if game is None:
             return
 
-        await Implementation.pot(self, ctx)
+        await Implementation.pot(game, ctx)
 
     @commands.command(
         name='turn',
@@ -203,66 +241,131 @@ class Poker(commands.Cog):
     async def turn(self, ctx: commands.Context):
         """Display which player's turn it is."""
 
-        if not await Implementation.runnable(self, ctx, False):
+        game = await self._table(ctx, False)
+        if game is None:
             return
 
-        await Implementation.turn(self, ctx)
+        await Implementation.turn(game, ctx)
+
+    @commands.command(
+        name='handlog',
+        help='Show the log of the last hand played in this channel.'
+    )
+    @commands.has_permissions(administrator=True)
+    async def handlog(self, ctx: commands.Context):
+        """
+        Show the log of the last finished hand at this channel's table.
+
+        The log includes the seed of the hand, so it can be replayed, e.g. to
+        settle a dispute. This command can only be run by an admin.
+        """
+
+        game = self.tables.get(ctx.channel)
+        if game is None or not game.history:
+            await reply(ctx, "No hand has been finished here yet.")
+            return
+
+        await send(ctx, f"```{game.history[-1].dumps()}```")
+
+    @commands.command(
+        name='odds',
+        help='Show the odds of poker hands, e.g. !odds AsKd vs QhQc on 2c7d9h'
+    )
+    async def odds(self, ctx: commands.Context, *args: str):
+        """Show how often each of the given hands wins on a board."""
+
+        await Implementation.odds(self, ctx, args)
+
+    async def _table(self, ctx: commands.Context,
+                        pp: bool = True) -> Optional[Game]:
+        """
+        Return the game the command in ctx is meant for.
+
+        Action commands (pp=True) must be run at the table itself. Other
+        commands also work elsewhere for someone who is sitting at a table.
+        """
+
+        game = self.tables.get(ctx.channel)
+        if game is None:
+            table = self.tables.table_of(ctx.author)
+            if table is not None and pp:
+                await self._wrong_channel(ctx)
+                return None
+            elif table is not None:
+                game = table.game
+
+        if not await Implementation.runnable(game, ctx, pp):
+            return None
+
+        return game
+
+    async def _wrong_channel(self, ctx: commands.Context):
+        """Tell the author where their table is."""
+
+        table = self.tables.table_of(ctx.author)
+        if table is None:
+            await send(ctx, "You can't use this command in a DM.")
+            return
+
+        await send(
+            ctx,
+            "You can't use this command here. "
+            f"Please go to {table.channel.mention}, and use this "
+            "command there."
+        )
 
     @poker.error
     async def poker_error(self, ctx: commands.Context, err: Exception):
         if isinstance(err, commands.NoPrivateMessage):
-            await ctx.send("You can't use this command in a DM.")
+            await send(ctx, "You can't use this command in a DM.")
         else:
             raise err
 
     @killpoker.error
     async def killpoker_error(self, ctx: commands.Context, err: Exception):
         if isinstance(err, commands.MissingPermissions):
-            await ctx.send("You don't have the permission to run this command.")
+            await send(
+                ctx,
+                "You don't have the permission to run this command."
+            )
+        else:
+            raise err
+
+    @handlog.error
+    async def handlog_error(self, ctx: commands.Context, err: Exception):
+        if isinstance(err, commands.MissingPermissions):
+            await send(
+                ctx,
+                "You don't have the permission to run this command."
+            )
         else:
             raise err
 
     @call.error
     async def call_error(self, ctx: commands.Context, err: Exception):
         if isinstance(err, commands.NoPrivateMessage):
-            await ctx.send(
-                "You can't use this command here. "
-                f"Please go to {self.poker_channel.mention}, and use this "
-                "command there."
-            )
+            await self._wrong_channel(ctx)
         else:
             raise err
 
     @bet.error
     async def bet_error(self, ctx: commands.Context, err: Exception):
         if isinstance(err, commands.NoPrivateMessage):
-            await ctx.send(
-                "You can't use this command here. "
-                f"Please go to {self.poker_channel.mention}, and use this "
-                "command there."
-            )
+            await self._wrong_channel(ctx)
         else:
             raise err
 
     @fold.error
     async def fold_error(self, ctx: commands.Context, err: Exception):
         if isinstance(err, commands.NoPrivateMessage):
-            await ctx.send(
-                "You can't use this command here. "
-                f"Please go to {self.poker_channel.mention}, and use this "
-                "command there."
-            )
+            await self._wrong_channel(ctx)
         else:
             raise err
 
     @all_in.error
     async def all_in_error(self, ctx: commands.Context, err: Exception):
         if isinstance(err, commands.NoPrivateMessage):
-            await ctx.send(
-                "You can't use this command here. "
-                f"Please go to {self.poker_channel.mention}, and use this "
-                "command there."
-            )
+            await self._wrong_channel(ctx)
         else:
             raise err
 
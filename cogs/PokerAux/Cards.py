@@ -5,8 +5,8 @@ poker cards and deck.
 
 
 from enum import Enum, IntEnum, unique
-from random import shuffle
-from typing import List, Tuple
+from random import Random
+from typing import List, Optional, Tuple
 
 
 @unique
@@ -47,48 +47,144 @@ class CardSuit(Enum):
 
 
 class Card:
-    """A playing card."""
+    """
+    A playing card.
 
-    def __init__(self, rank: CardRank, suit: CardSuit) -> None:
-        self.rank = rank
-        self.suit = suit
+    A card is stored as its code, 4 * (rank - 2) + (suit - 1). There are only
+    52 cards, so Card(rank, suit) returns one of the shared instances in CARDS
+    instead of creating a new object.
+    """
+
+    __slots__ = ('code',)
+
+    def __new__(cls, rank: CardRank, suit: CardSuit) -> 'Card':
+        return CARDS[4 * (rank.value - 2) + (suit.value - 1)]
+
+    @classmethod
+    def from_code(cls, code: int) -> 'Card':
+        """Return the card with the given code."""
+
+        return CARDS[code]
+
+    @property
+    def rank(self) -> CardRank:
+        return _RANKS[self.code >> 2]
+
+    @property
+    def suit(self) -> CardSuit:
+        return _SUITS[self.code & 3]
 
     def pec(self) -> Tuple[int, int]:
         """Return a tuple that can be used to construct a pokereval.Card."""
 
-        return (self.rank.value, self.suit.value)
+        return _PECS[self.code]
 
     def __str__(self) -> str:
-        return f"{str(self.rank)} {self.suit}"
+        return _NAMES[self.code]
+
+
+def _make_card(code: int) -> Card:
+    """Create the one instance of the card with the given code."""
+
+    card = object.__new__(Card)
+    card.code = code
+    return card
+
+
+# lookup tables indexed by card code
+_RANKS = tuple(sorted(CardRank))
+_SUITS = tuple(sorted(CardSuit, key=lambda s: s.value))
+_PECS = tuple(
+    (r.value, s.value) for r in _RANKS for s in _SUITS
+)
+_NAMES = tuple(f"{str(r)} {s}" for r in _RANKS for s in _SUITS)
+
+CARDS = tuple(_make_card(code) for code in range(52))
+
+# a deck in its original order, copied into a deck when it is reset
+_FRESH_ORDER = bytes(range(52))
+
+
+# how ranks and suits are written in card names like 'As' or '10h'
+RANK_NAMES = {
+    **{str(r.value): r for r in CardRank if r <= CardRank.ten},
+    't': CardRank.ten,
+    'j': CardRank.jack,
+    'q': CardRank.queen,
+    'k': CardRank.king,
+    'a': CardRank.ace,
+}
+SUIT_NAMES = {s.name[0]: s for s in CardSuit}
+
+
+def parse_cards(text: str) -> List[Card]:
+    """Return the cards named in text, e.g. 'AsKd' or '10h 9h'."""
+
+    text = text.replace(' ', '').lower()
+
+    cards = []
+    i = 0
+    while i < len(text):
+        # all ranks have one character, except for 10
+        rank_len = 2 if text.startswith('10', i) else 1
+        rank = RANK_NAMES.get(text[i:i + rank_len])
+        suit = SUIT_NAMES.get(text[i + rank_len:i + rank_len + 1])
+        if rank is None or suit is None:
+            raise ValueError(f"'{text[i:i + rank_len + 1]}' is not a card.")
+
+        cards.append(Card(rank, suit))
+        i += rank_len + 1
+
+    return cards
 
 
 class Deck:
-    """A standard 52-card deck."""
+    """
+    A standard 52-card deck.
 
-    def __init__(self) -> None:
-        self.cards = [
-            Card(r, s) for s in list(CardSuit) for r in list(CardRank)
-        ]
+    The deck is a permutation of card codes. Dealing moves a marker past the
+    top cards, and shuffling reorders the undealt part in place, so nothing
+    is allocated from one hand to the next.
+    """
+
+    def __init__(self, rng: Optional[Random] = None) -> None:
+        self.rng = rng if rng is not None else Random()
+
+        self._order = bytearray(_FRESH_ORDER)
+
+        # index of the top card that hasn't been dealt yet
+        self._top = 0
+
+    def __len__(self) -> int:
+        return len(self._order) - self._top
 
     def shuffle_deck(self) -> None:
         """Shuffle all remaining cards."""
 
-        shuffle(self.cards)
+        self.rng.shuffle(memoryview(self._order)[self._top:])
 
     def deal(self, n: int = 1) -> List[Card]:
         """Deal n cards from top of the deck."""
         
-        if len(self.cards) < n:
+        if len(self) < n:
             raise ValueError("No enough cards to deal.")
 
-        cards = [self.cards.pop() for _ in range(n)]
+        top = self._top
+        self._top += n
+
+        return [CARDS[self._order[i]] for i in range(top, top + n)]
+
+    def reset(self, rng: Optional[Random] = None) -> None:
+        """
+        Start the deck anew, but shuffled.
 
-        return cards
+        If rng is given, it is used for this and all later shuffles.
+        """
 
-    def reset(self) -> None:
-        """Start the deck anew, but shuffled."""
+        if rng is not None:
+            self.rng = rng
 
-        self.cards = [
-            Card(r, s) for s in list(CardSuit) for r in list(CardRank)
-        ]
-        self.shuffle_deck()
\ No newline at end of file
+        # a shuffle must not depend on how the previous hand was shuffled
+        self._order[:] = _FRESH_ORDER
+        self._top = 0
+        self.shuffle_deck()
@@ -8,4 +8,10 @@ CHANNEL_NAME = 'poker'
 STARTING_CHIPS = 5000
 
 # the small blind bet amount; the big blind bet amount is always twice this
-SM_BLIND_BET = 10
\ No newline at end of file
+SM_BLIND_BET = 10
+
+# seconds to wait for a player's hole cards to be delivered by DM
+DM_TIMEOUT = 10
+
+# the number of finished hands each game keeps the logs of
+HISTORY_LEN = 50
\ No newline at end of file
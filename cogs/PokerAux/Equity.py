@@ -0,0 +1,291 @@
+"""
+Auxiliary module for the Poker Cog. This module calculates how often each of
+several hands of hole cards wins or ties on a partial board.
+
+When the number of ways to complete the board is small, every runout is
+enumerated and the odds are exact. Otherwise random runouts are sampled.
+NumPy, if it is installed, scores thousands of runouts in one go; it's
+imported the first time it's needed. Large simulations are split between
+the workers of a process pool.
+"""
+
+
+import asyncio
+import random
+from concurrent.futures import Executor
+from itertools import combinations
+from math import comb
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+from . import Evaluator
+from .Cards import Card
+
+
+# NumPy, once load_numpy has been called; None if it isn't installed
+np = None
+_numpy_checked = False
+
+# the board is enumerated exactly when it has at most this many runouts
+EXACT_LIMIT = 20000
+
+# the number of random runouts used when the board isn't enumerated
+DEFAULT_SAMPLES = 20000
+
+# the most runouts a single worker scores
+CHUNK_SIZE = 10000
+
+BOARD_SIZE = 5
+
+
+class Odds(NamedTuple):
+    """The chances of one hand of hole cards."""
+
+    # how often the hand wins the whole pot
+    win: float
+
+    # how often the hand splits the pot
+    tie: float
+
+    # the share of the pot the hand gets on average
+    equity: float
+
+
+# (wins, ties, share of the pot in split pots) of every hand, and the number
+# of runouts they were counted over
+Tally = Tuple[List[int], List[int], List[float], int]
+
+
+def load_numpy() -> bool:
+    """Import NumPy if it hasn't been yet; return whether it's installed."""
+
+    global np, _numpy_checked
+
+    if not _numpy_checked:
+        try:
+            import numpy
+        except ImportError:     # odds are still calculated, only slower
+            numpy = None
+        np = numpy
+        _numpy_checked = True
+
+    return np is not None
+
+
+def _check(holes: Sequence[Sequence[int]], board: Sequence[int]):
+    """Raise ValueError if the cards can't be dealt together."""
+
+    if len(holes) < 2:
+        raise ValueError("At least two hands are needed.")
+    if any(len(h) != 2 for h in holes):
+        raise ValueError("Every hand needs exactly two cards.")
+    if len(board) not in (0, 3, 4, 5):
+        raise ValueError("The board must have 0, 3, 4 or 5 cards.")
+
+    cards = [c for h in holes for c in h] + list(board)
+    if len(set(cards)) != len(cards):
+        raise ValueError("The same card can't be dealt twice.")
+
+    if 52 - len(cards) < BOARD_SIZE - len(board):
+        raise ValueError("Not enough cards left to deal the board.")
+
+
+def _remaining(holes: Sequence[Sequence[int]],
+                board: Sequence[int]) -> List[int]:
+    """Return the codes of the cards that are still in the deck."""
+
+    dealt = {c for h in holes for c in h} | set(board)
+    return [c for c in range(52) if c not in dealt]
+
+
+def _tally_python(holes, board, runouts) -> Tally:
+    """Count wins and ties over the given runouts, one at a time."""
+
+    hand_ranks = Evaluator.load()
+    n = len(holes)
+    wins, ties, shares = [0] * n, [0] * n, [0.0] * n
+
+    total = 0
+    for runout in runouts:
+        scores = hand_ranks.evaluate_many(list(board) + list(runout), holes)
+        best = max(scores)
+        winners = [i for i, s in enumerate(scores) if s == best]
+
+        if len(winners) == 1:
+            wins[winners[0]] += 1
+        else:
+            for i in winners:
+                ties[i] += 1
+                shares[i] += 1 / len(winners)
+        total += 1
+
+    return wins, ties, shares, total
+
+
+def _tally_numpy(holes, board, runouts) -> Tally:
+    """Count wins and ties over an array of runouts, all at once."""
+
+    hand_ranks = Evaluator.load()
+    flush = np.asarray(hand_ranks.flush)
+    ranks_table = np.asarray(hand_ranks.ranks)
+    combo = np.array(Evaluator._COMBO, dtype=np.int64)
+
+    n_runouts = len(runouts)
+    n_cards = len(board) + runouts.shape[1] + 2
+    offset = Evaluator._OFFSETS[n_cards]
+    positions = np.arange(n_cards)
+
+    common = np.hstack([
+        np.broadcast_to(
+            np.array(board, dtype=np.int64), (n_runouts, len(board))
+        ),
+        runouts.astype(np.int64)
+    ])
+
+    scores = np.empty((len(holes), n_runouts), dtype=np.int64)
+    for i, hole in enumerate(holes):
+        cards = np.hstack([
+            common,
+            np.broadcast_to(np.array(hole, dtype=np.int64), (n_runouts, 2))
+        ])
+        ranks = cards >> 2
+        suits = cards & 3
+        bits = np.left_shift(1, ranks)
+
+        # at most one suit can make a flush
+        best_flush = np.zeros(n_runouts, dtype=np.int64)
+        for s in range(4):
+            mask = np.where(suits == s, bits, 0).sum(axis=1)
+            np.maximum(best_flush, flush[mask], out=best_flush)
+
+        index = offset + combo[np.sort(ranks, axis=1), positions].sum(axis=1)
+        scores[i] = np.where(best_flush > 0, best_flush, ranks_table[index])
+
+    winning = scores == scores.max(axis=0)
+    n_winners = winning.sum(axis=0)
+    alone = winning & (n_winners == 1)
+    split = winning & (n_winners > 1)
+
+    return (
+        alone.sum(axis=1).tolist(),
+        split.sum(axis=1).tolist(),
+        (split / n_winners).sum(axis=1).tolist(),
+        n_runouts
+    )
+
+
+def _tally(holes: Sequence[Sequence[int]], board: Sequence[int],
+            samples: Optional[int], seed: Optional[int]) -> Tally:
+    """
+    Count wins and ties of the given hands.
+
+    With samples=None every runout is enumerated, otherwise that many random
+    runouts are used. This function runs in worker processes.
+    """
+
+    deck = _remaining(holes, board)
+    need = BOARD_SIZE - len(board)
+
+    if need == 0:
+        return _tally_python(holes, board, [()])
+
+    use_numpy = load_numpy()
+
+    if samples is None:
+        runouts = combinations(deck, need)
+        if not use_numpy:
+            return _tally_python(holes, board, runouts)
+        return _tally_numpy(
+            holes, board, np.array(list(runouts), dtype=np.int64)
+        )
+
+    if not use_numpy:
+        rng = random.Random(seed)
+        return _tally_python(
+            holes, board, (rng.sample(deck, need) for _ in range(samples))
+        )
+
+    # the first few columns of a random ordering of each row of the deck
+    rng = np.random.default_rng(seed)
+    order = np.argpartition(rng.random((samples, len(deck))), need, axis=1)
+    runouts = np.array(deck, dtype=np.int64)[order[:, :need]]
+
+    return _tally_numpy(holes, board, runouts)
+
+
+def _odds(tallies: Sequence[Tally]) -> List[Odds]:
+    """Combine the tallies of several workers into the odds of each hand."""
+
+    n = len(tallies[0][0])
+    total = sum(t[3] for t in tallies)
+
+    odds = []
+    for i in range(n):
+        wins = sum(t[0][i] for t in tallies)
+        ties = sum(t[1][i] for t in tallies)
+        shares = sum(t[2][i] for t in tallies)
+        odds.append(Odds(wins / total, ties / total, (wins + shares) / total))
+
+    return odds
+
+
+def _plan(holes: Sequence[Sequence[int]], board: Sequence[int],
+            samples: int) -> List[Optional[int]]:
+    """Return the number of samples for each chunk; None means exact."""
+
+    _check(holes, board)
+
+    n_left = 52 - 2 * len(holes) - len(board)
+    if comb(n_left, BOARD_SIZE - len(board)) <= EXACT_LIMIT:
+        return [None]
+
+    chunks = [CHUNK_SIZE] * (samples // CHUNK_SIZE)
+    if samples % CHUNK_SIZE:
+        chunks.append(samples % CHUNK_SIZE)
+
+    return chunks
+
+
+def _codes(holes: Sequence[Sequence[Card]],
+            board: Sequence[Card]) -> Tuple[List[List[int]], List[int]]:
+    return [[c.code for c in h] for h in holes], [c.code for c in board]
+
+
+def equity(holes: Sequence[Sequence[Card]], board: Sequence[Card] = (),
+            samples: int = DEFAULT_SAMPLES,
+            seed: Optional[int] = None) -> List[Odds]:
+    """Return the odds of every hand of hole cards on the given board."""
+
+    holes, board = _codes(holes, board)
+    rng = random.Random(seed)
+
+    return _odds([
+        _tally(holes, board, n, rng.getrandbits(64))
+        for n in _plan(holes, board, samples)
+    ])
+
+
+async def equity_async(holes: Sequence[Sequence[Card]],
+                        board: Sequence[Card] = (),
+                        samples: int = DEFAULT_SAMPLES,
+                        seed: Optional[int] = None,
+                        executor: Optional[Executor] = None) -> List[Odds]:
+    """
+    Return the odds of every hand without blocking the event loop.
+
+    The work is split into chunks that run in executor, which should be a
+    process pool for large simulations. The loop's default executor is used
+    if none is given.
+    """
+
+    holes, board = _codes(holes, board)
+    rng = random.Random(seed)
+    loop = asyncio.get_event_loop()
+
+    tallies = await asyncio.gather(*(
+        loop.run_in_executor(
+            executor, _tally, holes, board, n, rng.getrandbits(64)
+        )
+        for n in _plan(holes, board, samples)
+    ))
+
+    return _odds(tallies)
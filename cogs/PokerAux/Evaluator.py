@@ -0,0 +1,359 @@
+"""
+Auxiliary module for the Poker Cog. This module ranks poker hands of five to
+seven cards using precomputed lookup tables.
+
+Cards are small integers: 4 * (rank - 2) + (suit - 1), so that card >> 2 is
+the rank index (0 for twos, 12 for aces) and card & 3 is the suit index.
+
+A hand is ranked with at most two table lookups:
+
+- if five or more cards share a suit, the 13-bit mask of that suit's ranks
+  indexes the flush table;
+- otherwise the sorted ranks index the rank table through the combinatorial
+  number system; every multiset of ranks gets its own slot.
+
+Both tables hold the strength of the best five-card hand, a number from 1
+(7-5-4-3-2 offsuit) to 7462 (royal flush). Stronger hands have higher
+numbers, so hands can be compared directly.
+
+The tables are built once and saved to a file, which is then memory-mapped
+by every process that needs it.
+"""
+
+
+import mmap
+import os
+import struct
+import sys
+import threading
+from bisect import bisect_left
+from itertools import combinations
+from math import comb
+from typing import List, Optional, Sequence, Tuple
+
+
+# name of each category of hands, from the weakest to the strongest
+CATEGORIES = (
+    'high card',
+    'pair',
+    'two pair',
+    'three of a kind',
+    'straight',
+    'flush',
+    'full house',
+    'four of a kind',
+    'straight flush',
+)
+
+# how many distinct hand strengths each category has
+_CATEGORY_SIZES = (1277, 2860, 858, 858, 10, 1277, 156, 156, 10)
+
+# the strongest hand strength of each category
+_CATEGORY_TOPS = tuple(
+    sum(_CATEGORY_SIZES[:i + 1]) for i in range(len(_CATEGORY_SIZES))
+)
+
+# smallest and largest number of cards a hand can be ranked with
+MIN_CARDS = 5
+MAX_CARDS = 7
+
+_N_RANKS = 13
+
+# _COMBO[r][i] is the contribution of rank r at sorted position i to the
+# index of a rank multiset
+_COMBO = tuple(
+    tuple(comb(r + i, i + 1) for i in range(MAX_CARDS))
+    for r in range(_N_RANKS)
+)
+
+# where the slots for hands of n cards start in the rank table
+_OFFSETS = {}
+_RANK_TABLE_SIZE = 0
+for _n in range(MIN_CARDS, MAX_CARDS + 1):
+    _OFFSETS[_n] = _RANK_TABLE_SIZE
+    _RANK_TABLE_SIZE += comb(_N_RANKS + _n - 1, _n)
+
+_FLUSH_TABLE_SIZE = 1 << _N_RANKS
+
+_MAGIC = b'SVHR'
+_VERSION = 1
+_HEADER = struct.Struct('=4sHHII')
+
+TABLE_FILENAME = os.getenv(
+    'HAND_RANKS_FILENAME',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'hand_ranks.bin')
+)
+
+
+def _straight_high(mask: int) -> Optional[int]:
+    """Return the highest rank of the best straight in a rank mask."""
+
+    for high in range(_N_RANKS - 1, MIN_CARDS - 2, -1):
+        run = 0b11111 << (high - 4)
+        if mask & run == run:
+            return high
+
+    # the wheel: A-2-3-4-5
+    wheel = (1 << 12) | 0b1111
+    if mask & wheel == wheel:
+        return 3
+
+    return None
+
+
+def _key(category: int, *ranks: int) -> int:
+    """Pack a category and its tie-breaking ranks into one comparable key."""
+
+    key = category
+    for i in range(5):
+        key = (key << 4) | (ranks[i] if i < len(ranks) else 0)
+
+    return key
+
+
+def _flush_key(mask: int) -> int:
+    """Return the key of the best hand made from the ranks of one suit."""
+
+    high = _straight_high(mask)
+    if high is not None:
+        return _key(8, high)
+
+    ranks = [r for r in range(_N_RANKS - 1, -1, -1) if mask >> r & 1]
+    return _key(5, *ranks[:5])
+
+
+def _plain_key(counts: Sequence[int]) -> int:
+    """Return the key of the best hand from rank counts without a flush."""
+
+    by_rank = range(_N_RANKS - 1, -1, -1)
+    quads = [r for r in by_rank if counts[r] >= 4]
+    trips = [r for r in by_rank if counts[r] >= 3]
+    pairs = [r for r in by_rank if counts[r] >= 2]
+    singles = [r for r in by_rank if counts[r] >= 1]
+
+    if quads:
+        q = quads[0]
+        return _key(7, q, next(r for r in singles if r != q))
+
+    if trips and len(pairs) >= 2:
+        t = trips[0]
+        return _key(6, t, next(r for r in pairs if r != t))
+
+    high = _straight_high(sum(1 << r for r in singles))
+    if high is not None:
+        return _key(4, high)
+
+    if trips:
+        t = trips[0]
+        return _key(3, t, *[r for r in singles if r != t][:2])
+
+    if len(pairs) >= 2:
+        p1, p2 = pairs[:2]
+        return _key(2, p1, p2, next(r for r in singles if r not in (p1, p2)))
+
+    if pairs:
+        p = pairs[0]
+        return _key(1, p, *[r for r in singles if r != p][:3])
+
+    return _key(0, *singles[:5])
+
+
+def _rank_multisets(n: int):
+    """Yield every sorted multiset of n ranks with no rank more than 4 times."""
+
+    def rec(start: int, left: int, prefix: List[int]):
+        if left == 0:
+            yield prefix
+            return
+        for r in range(start, _N_RANKS):
+            if prefix[-4:] == [r] * 4:
+                continue
+            yield from rec(r, left - 1, prefix + [r])
+
+    yield from rec(0, n, [])
+
+
+def _rank_index(ranks: Sequence[int]) -> int:
+    """Return the rank table slot of a sorted sequence of ranks."""
+
+    return _OFFSETS[len(ranks)] + sum(
+        _COMBO[r][i] for i, r in enumerate(ranks)
+    )
+
+
+def build_tables(filename: str = TABLE_FILENAME) -> None:
+    """Compute the lookup tables and write them to filename."""
+
+    # every five-card hand key, so that keys can be turned into strengths
+    keys = set()
+    for ranks in _rank_multisets(MIN_CARDS):
+        counts = [0] * _N_RANKS
+        for r in ranks:
+            counts[r] += 1
+        keys.add(_plain_key(counts))
+    for ranks in combinations(range(_N_RANKS), MIN_CARDS):
+        keys.add(_flush_key(sum(1 << r for r in ranks)))
+
+    strength = {k: i + 1 for i, k in enumerate(sorted(keys))}
+    if len(strength) != _CATEGORY_TOPS[-1]:
+        raise RuntimeError("Unexpected number of distinct poker hands.")
+
+    flush_table = [0] * _FLUSH_TABLE_SIZE
+    for mask in range(_FLUSH_TABLE_SIZE):
+        if bin(mask).count('1') >= MIN_CARDS:
+            flush_table[mask] = strength[_flush_key(mask)]
+
+    rank_table = [0] * _RANK_TABLE_SIZE
+    for n in range(MIN_CARDS, MAX_CARDS + 1):
+        for ranks in _rank_multisets(n):
+            counts = [0] * _N_RANKS
+            for r in ranks:
+                counts[r] += 1
+            rank_table[_rank_index(ranks)] = strength[_plain_key(counts)]
+
+    tmp_filename = f'{filename}.{os.getpid()}.tmp'
+    with open(tmp_filename, 'wb') as f:
+        f.write(_HEADER.pack(
+            _MAGIC, _VERSION, 1 if sys.byteorder == 'little' else 2,
+            _FLUSH_TABLE_SIZE, _RANK_TABLE_SIZE
+        ))
+        f.write(struct.pack(f'={_FLUSH_TABLE_SIZE}H', *flush_table))
+        f.write(struct.pack(f'={_RANK_TABLE_SIZE}H', *rank_table))
+
+    # other processes never see a half-written file
+    os.replace(tmp_filename, filename)
+
+
+class HandRanks:
+    """The lookup tables, memory-mapped from a file."""
+
+    def __init__(self, filename: str) -> None:
+        with open(filename, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, order, flush_size, rank_size = _HEADER.unpack_from(
+            self._mm
+        )
+        if (magic != _MAGIC or version != _VERSION
+                or order != (1 if sys.byteorder == 'little' else 2)
+                or flush_size != _FLUSH_TABLE_SIZE
+                or rank_size != _RANK_TABLE_SIZE):
+            self._mm.close()
+            raise ValueError(f"{filename} is not a usable hand rank file.")
+
+        self._view = memoryview(self._mm)
+        self._table = self._view[_HEADER.size:].cast('H')
+        self.flush = self._table[:flush_size]
+        self.ranks = self._table[flush_size:]
+
+    def evaluate(self, cards: Sequence[int]) -> int:
+        """Return the strength of the best five-card hand among cards."""
+
+        masks = [0, 0, 0, 0]
+        for c in cards:
+            masks[c & 3] |= 1 << (c >> 2)
+
+        flush = self.flush
+        for m in masks:
+            s = flush[m]
+            if s:
+                return s
+
+        combo = _COMBO
+        i = _OFFSETS[len(cards)]
+        for pos, r in enumerate(sorted(c >> 2 for c in cards)):
+            i += combo[r][pos]
+
+        return self.ranks[i]
+
+    def evaluate_many(self, board: Sequence[int],
+                        holes: Sequence[Sequence[int]]) -> List[int]:
+        """Return the strength of every hand of hole cards on one board."""
+
+        board_masks = [0, 0, 0, 0]
+        for c in board:
+            board_masks[c & 3] |= 1 << (c >> 2)
+        board_ranks = [c >> 2 for c in board]
+
+        flush = self.flush
+        ranks = self.ranks
+        combo = _COMBO
+        offset = _OFFSETS[len(board) + 2]
+
+        strengths = []
+        for c1, c2 in holes:
+            masks = board_masks[:]
+            masks[c1 & 3] |= 1 << (c1 >> 2)
+            masks[c2 & 3] |= 1 << (c2 >> 2)
+
+            s = 0
+            for m in masks:
+                s = flush[m]
+                if s:
+                    break
+            else:
+                i = offset
+                hand = sorted(board_ranks + [c1 >> 2, c2 >> 2])
+                for pos, r in enumerate(hand):
+                    i += combo[r][pos]
+                s = ranks[i]
+
+            strengths.append(s)
+
+        return strengths
+
+    def close(self) -> None:
+        """Release the memory map."""
+
+        for view in (self.flush, self.ranks, self._table, self._view):
+            view.release()
+        self._mm.close()
+
+
+_hand_ranks: Optional[HandRanks] = None
+
+# the tables may be loaded on a worker thread while a game needs them
+_load_lock = threading.Lock()
+
+
+def load(filename: str = TABLE_FILENAME) -> HandRanks:
+    """Return the lookup tables, building the table file if needed."""
+
+    global _hand_ranks
+
+    if _hand_ranks is None:
+        with _load_lock:
+            if _hand_ranks is None:
+                try:
+                    _hand_ranks = HandRanks(filename)
+                except (OSError, ValueError):
+                    build_tables(filename)
+                    _hand_ranks = HandRanks(filename)
+
+    return _hand_ranks
+
+
+def evaluate(cards: Sequence[int]) -> int:
+    """Return the strength of the best five-card hand among 5 to 7 cards."""
+
+    return load().evaluate(cards)
+
+
+def evaluate_many(board: Sequence[int],
+                    holes: Sequence[Sequence[int]]) -> List[int]:
+    """Return the strengths of several pairs of hole cards on one board."""
+
+    return load().evaluate_many(board, holes)
+
+
+def category(strength: int) -> str:
+    """Return the name of the category a hand strength belongs to."""
+
+    return CATEGORIES[bisect_left(_CATEGORY_TOPS, strength)]
+
+
+def describe(cards: Sequence[int]) -> Tuple[int, str]:
+    """Return the strength of a hand along with its category's name."""
+
+    s = evaluate(cards)
+    return s, category(s)
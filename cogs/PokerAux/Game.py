@@ -5,30 +5,45 @@ the poker game.
 
 
 import asyncio
-from random import randint, choice
-from typing import List, Optional
-
-from pokereval.card import Card
-from pokereval.hand_evaluator import HandEvaluator
+import logging
+from collections import deque
+from random import Random
+from time import monotonic
+from typing import Deque, Dict, List, Optional, Set
 
+import discord
 from discord.ext.commands import Context
 
-from .Cards import Deck
-from .Cards import Card as PokerCard
+from . import Evaluator
+from .Cards import Card, Deck
+from .Constants import DM_TIMEOUT, HISTORY_LEN
+from .History import HandLog
 from .Player import Player, PlayerStatus
+from .Pots import PotLedger
+from ..utils.utils import dm, send
+
+
+log = logging.getLogger(__name__)
 
 
 class Game:
     """A game of poker."""
 
     def __init__(self, ctx: Context, players: List[Player],
-                    starting_chips: int, sm_blind: int):
+                    starting_chips: int, sm_blind: int,
+                    rng: Optional[Random] = None):
         self.ctx = ctx
 
-        self.pot = 0
+        # every chip put into the pot during the hand, by player
+        self.ledger = PotLedger()
         self.sm_blind_bet = sm_blind
 
-        self.deck = Deck()
+        # every hand is played with its own generator, seeded from this one,
+        # so that each hand can be replayed from its log
+        self.rng = rng if rng is not None else Random()
+        self.hand_rng = Random()
+
+        self.deck = Deck(self.hand_rng)
         self.deck.shuffle_deck()
 
         self.players = [Player(p, starting_chips) for p in players]
@@ -40,7 +55,7 @@ class Game:
         self.small_blind_i: Optional[int] = None
         self.big_blind_i: Optional[int] = None
 
-        self.community_cards: List[PokerCard] = []
+        self.community_cards: List[Card] = []
 
         # the minimum amount to bet during a particular turn
         self.min_bet = 0
@@ -49,20 +64,50 @@ class Game:
         self.pending_players: List[Player] = []
         self.pending_index = 0
 
+        # bookkeeping for the end-of-round checks; it is updated as players
+        # act instead of being recomputed from pending_players
+        self._turn_pending: Set[Player] = set()
+        self._unmatched: Set[Player] = set()
+        self._matched_bet = 0
+        self._n_not_folded = 0
+        self._n_not_all_in = 0
+
+        # set whenever a player acts or the game is ended
+        self._acted = asyncio.Event()
+        self.ended = False
+
         self.winner: Optional[Player] = None
 
+        # strength of the hand of every player at the latest showdown
+        self.scores: Dict[Player, int] = {}
+
+        # the log of the hand being played and of the latest finished hands
+        self.hand_log: Optional[HandLog] = None
+        self.history: Deque[HandLog] = deque(maxlen=HISTORY_LEN)
+        self._seats: Dict[int, int] = {}
+
+        # seconds from dealing the hole cards till the first player could
+        # act, for the latest hand
+        self._dealt_at: Optional[float] = None
+        self.deal_to_prompt: Optional[float] = None
+
+    @property
+    def pot(self) -> int:
+        """The number of chips in all the pots together."""
+
+        return self.ledger.total
+
     def place_bet(self, player: Player, amt: int):
         """Place a bet of given amout on behalf of the given player."""
 
-        self.pot += amt
         player.chips -= amt
         player.betted += amt
+        self.ledger.add(player, amt, all_in=player.chips == 0)
 
     async def start_betting(self):
         """Wait till all players have had their turn."""
 
-        # the first pending player bets first
-        self.pending_index = 0
+        self.begin_betting()
 
         # betting ends when:
         # - all active players have at least made one move
@@ -77,54 +122,98 @@ class Game:
         # OR
         #
         # - if everyone or everyone except one player is all in.
-        while True:
-            # players who have not had even one turn to act
-            turn_pending_players = [
-                p for p in self.pending_players if p.turn_pending
-            ]
-
-            # how many players have to bet more
-            # players don't have to bet more only if one of these is true:
-            # - they have matched min_bet
-            # - they have gone all-in
-            # - they have folded
-            held_players = []
-            for p in self.pending_players:
-                # player has matched min_bet
-                if self.min_bet == p.betted or p.all_in or not p.not_folded:
-                    continue
-                held_players.append(p)
-
-            if len(turn_pending_players) == len(held_players) == 0:
-                break
-
-            # all except one has folded; there's no one to bet
-            if self._all_folded():
-                break
-
-            if self._all_except_one_all_in():
-                break
-
-            # folded players shouldn't act
-            if not self.pending_players[self.pending_index].not_folded:
-                self.pending_index += 1
-                self.pending_index %= self.n
-
-            # players who are all-in shouldn't act
-            if self.pending_players[self.pending_index].all_in:
-                self.pending_index += 1
-                self.pending_index %= self.n
-
-            await asyncio.sleep(0)  # allow other tasks to continue
-        
-    async def preflop(self):
-        """Prepare the game for the next turn."""
+        #
+        # the round sleeps until a player acts; nothing runs while the table
+        # is waiting on someone
+        while not self.next_turn():
+            self._acted.clear()
+            await self._acted.wait()
+
+    def begin_betting(self):
+        """Prepare for a betting round."""
+
+        # the first pending player bets first
+        self.pending_index = 0
+
+        if self.deal_to_prompt is None and self._dealt_at is not None:
+            self.deal_to_prompt = monotonic() - self._dealt_at
+            log.debug("Deal to first prompt: %.3fs", self.deal_to_prompt)
+
+    def next_turn(self) -> bool:
+        """
+        Move the turn past players who can't act.
+
+        Return True if the betting round is over.
+        """
+
+        if self._betting_over():
+            return True
+
+        # folded players and players who are all-in shouldn't act
+        pp = self.pending_players[self.pending_index]
+        while not pp.not_folded or pp.all_in:
+            self.pending_index = (self.pending_index + 1) % self.n
+            pp = self.pending_players[self.pending_index]
+
+        return False
+
+    def end_turn(self, player: Player):
+        """Record that the given player has acted and wake up the round."""
+
+        player.turn_pending = False
+        self._turn_pending.discard(player)
+        self._unmatched.discard(player)
+
+        if not player.not_folded:
+            self._n_not_folded -= 1
+        if player.all_in:
+            self._n_not_all_in -= 1
+
+        # a raise puts everyone else who can still act back on the hook
+        if self.min_bet > self._matched_bet:
+            self._matched_bet = self.min_bet
+            self._unmatched = {
+                p for p in self.pending_players
+                if p.not_folded and not p.all_in and p.betted < self.min_bet
+            }
+
+        self.pending_index = (self.pending_index + 1) % self.n
+        self._acted.set()
+
+    def end(self):
+        """Stop the game; a betting round in progress returns immediately."""
 
-        await self.ctx.send("------ P R E F L O P ------")
+        self.ended = True
+        self._acted.set()
+
+    def record_action(self, player: Player, action: str, amt: int = 0):
+        """Add an action of the given player to the hand's log."""
+
+        self.hand_log.record(self._seats[player.member.id], action, amt)
+
+    async def preflop(self, seed: Optional[int] = None):
+        """
+        Prepare the game for the next turn.
+
+        The hand is shuffled and played with the given seed; if there's none,
+        a new one is drawn.
+        """
+
+        if seed is None:
+            seed = self.rng.getrandbits(64)
+        self.hand_rng = Random(seed)
+
+        self.hand_log = HandLog(
+            seed, self.di, self.sm_blind_bet,
+            [(p.member.id, p.chips) for p in self.players]
+        )
+        self._seats = {p.member.id: i for i, p in enumerate(self.players)}
+
+        await send(self.ctx, "------ P R E F L O P ------")
 
         self._pre_turn_setup()
 
-        self.deck.reset()
+        self.deck.reset(self.hand_rng)
         await self._deal_holes()
         await self._setup_blinds()
         await self._post_blinds()
@@ -138,7 +227,7 @@ class Game:
         if self._all_folded():
             return
 
-        await self.ctx.send("------ F L O P ------")
+        await send(self.ctx, "------ F L O P ------")
 
         self._pre_turn_setup()
         
@@ -156,7 +245,7 @@ class Game:
         if self._all_folded():
             return
 
-        await self.ctx.send("------ T U R N ------")
+        await send(self.ctx, "------ T U R N ------")
 
         self._pre_turn_setup()
         
@@ -174,7 +263,7 @@ class Game:
         if self._all_folded():
             return
 
-        await self.ctx.send("------ R I V E R ------")
+        await send(self.ctx, "------ R I V E R ------")
             
         self._pre_turn_setup()
         
@@ -188,54 +277,55 @@ class Game:
     async def showdown(self):
         """Time for remaining players to compare cards."""
 
-        # change the community cards to be compatible with pokereval's
-        # HandEvaluator
-        community_cards = [Card(*c.pec()) for c in self.community_cards]
-        
-        max_score = 0
-        winners = []
-
         active_players = [p for p in self.players if p.not_folded]
 
         # the unfolded player wins by default; no need to show his/her cards
         if len(active_players) == 1:
-            await self.ctx.send(
+            await send(
+                self.ctx,
                 f"{active_players[0].member.mention} wins this round."
             )
-            self._divide_pot(active_players)
+            self.scores = {active_players[0]: 0}
+            self._divide_pot()
+            self._finish_hand()
             return
 
-        for p in active_players:
-            await self.ctx.send(
+        # rank everyone's hand against the board in one go
+        scores = Evaluator.evaluate_many(
+            [c.code for c in self.community_cards],
+            [[c.code for c in p.hole_cards] for p in active_players]
+        )
+
+        for p, score in zip(active_players, scores):
+            await send(
+                self.ctx,
                 f"{p.member.mention} -- "
-                f"({p.hole_cards[0]}) ({p.hole_cards[1]})"
+                f"({p.hole_cards[0]}) ({p.hole_cards[1]}) -- "
+                f"{Evaluator.category(score)}"
             )
 
-            # change the hole cards to be compatible with pokereval's
-            # HandEvaluator
-            hole_cards = [Card(*c.pec()) for c in p.hole_cards]
-            score = HandEvaluator.evaluate_hand(hole_cards, community_cards)
-            
-            if score > max_score:
-                max_score = score
-                winners = [p]
-            elif score == max_score:
-                winners.append(p)
-
-        await self.ctx.send('Winners of this round are:')
-        for w in winners:
-            await self.ctx.send(
-                f'{w.member.mention} with '
-                f'({w.hole_cards[0]}) and ({w.hole_cards[1]})'
-            )
+        self.scores = dict(zip(active_players, scores))
+        winnings = self._divide_pot()
+
+        # the best hand may not win every side pot, so everyone who gets
+        # chips back is listed
+        await send(self.ctx, 'Winners of this round are:')
+        for w in active_players:
+            if winnings[w]:
+                await send(
+                    self.ctx,
+                    f'{w.member.mention} wins {winnings[w]} chips with '
+                    f'({w.hole_cards[0]}) and ({w.hole_cards[1]}) '
+                    f'({Evaluator.category(self.scores[w])})'
+                )
 
-        self._divide_pot(winners)
+        self._finish_hand()
 
     async def next_round(self):
         """Prepare the game for the next round."""
 
         self.community_cards = []
-        self.pot = 0
+        self.ledger.reset()
 
         for p in self.players:
             if p.chips == 0:
@@ -257,7 +347,7 @@ class Game:
     def _all_folded(self):
         """Have all except one player folded?"""
 
-        return len([p for p in self.pending_players if p.not_folded]) == 1
+        return self._n_not_folded == 1
 
     def _all_except_one_all_in(self):
         """
@@ -268,31 +358,40 @@ class Game:
             - or matched
         """
 
-        not_all_in = [p for p in self.pending_players if not p.all_in]
+        return not self._unmatched and self._n_not_all_in <= 1
 
-        # have all not all in players met their obligations
-        for p in not_all_in:
-            # this player has betted the most; everyone else is trying to match
-            # him/her
-            if p.betted == self.min_bet:
-                continue
+    def _betting_over(self):
+        """Has the current betting round ended?"""
 
-            if p.not_folded:
-                # if they have not, the betting must continue
-                return False
+        if self.ended:
+            return True
 
-        return len(not_all_in) <= 1
+        # everyone has made a move and no one owes anything to the pot
+        if not self._turn_pending and not self._unmatched:
+            return True
 
-    def _divide_pot(self, winners: List[Player]):
-        """Divide the pot among the winners."""
+        # all except one has folded; there's no one to bet
+        if self._all_folded():
+            return True
+
+        return self._all_except_one_all_in()
+
+    def _divide_pot(self) -> Dict[Player, int]:
+        """Pay out the main pot and the side pots by self.scores."""
+
+        winnings = self.ledger.payout(self.scores, self.hand_rng)
+        for p, amt in winnings.items():
+            p.chips += amt
 
-        amt_each = self.pot // len(winners)
-        amt_left = self.pot % len(winners)
+        return winnings
 
-        for p in winners:
-            p.chips += amt_each
+    def _finish_hand(self):
+        """Close the log of the hand that has just been paid out."""
 
-        choice(winners).chips += amt_left
+        self.hand_log.result = [p.chips for p in self.players]
+        self.history.append(self.hand_log)
+
+        log.info("Hand finished: %s", self.hand_log.dumps())
 
     def _assign_turns(self, start: int):
         """Change players to be pending turn."""
@@ -301,11 +400,19 @@ class Game:
             p = self.players[i % self.n]
             if p.not_folded and not p.all_in:
                 p.turn_pending = True
+                self._turn_pending.add(p)
+
+                if p.betted < self.min_bet:
+                    self._unmatched.add(p)
             self.pending_players.append(p)
 
+        self._matched_bet = self.min_bet
+        self._n_not_folded = sum(p.not_folded for p in self.pending_players)
+        self._n_not_all_in = sum(not p.all_in for p in self.pending_players)
+
     async def _display_community_cards(self):
         to_display = ' '.join(f'({c})' for c in self.community_cards)
-        await self.ctx.send(f"Community Cards: {to_display}")
+        await send(self.ctx, f"Community Cards: {to_display}")
     
     async def _post_blinds(self):
         """Enforce blind bets."""
@@ -318,9 +425,9 @@ class Game:
             sm_blind_bet = sm_b.chips
             sm_b.all_in = True
             
-        sm_b.chips -= sm_blind_bet
-        sm_b.betted += sm_blind_bet
-        await self.ctx.send(
+        self.place_bet(sm_b, sm_blind_bet)
+        await send(
+            self.ctx,
             f'{sm_b.member.mention} posts small blind of '
             f'{sm_blind_bet}.'
         )
@@ -330,29 +437,54 @@ class Game:
             bg_blind_bet = bg_b.chips
             bg_b.all_in = True
 
-        bg_b.chips -= bg_blind_bet
-        bg_b.betted += bg_blind_bet
-        await self.ctx.send(
+        self.place_bet(bg_b, bg_blind_bet)
+        await send(
+            self.ctx,
             f'{bg_b.member.mention} posts big blind of '
             f'{bg_blind_bet}'
         )
 
         self.min_bet = max(sm_blind_bet, bg_blind_bet)
-        self.pot += sm_blind_bet + bg_blind_bet
 
     async def _deal_holes(self):
-        """Deal hole cards to all players."""
+        """Deal hole cards to all players and DM them to everyone at once."""
 
-        for p in self.players:
-            if not p.active:
-                continue
+        self._dealt_at = monotonic()
+        self.deal_to_prompt = None
 
-            c1, c2 = self.deck.deal(2)
-            p.hole_cards = [c1, c2]
-            
-            await p.member.send("Here are your cards:")
-            await p.member.send(str(c1))
-            await p.member.send(str(c2))
+        players = [p for p in self.players if p.active]
+        for p in players:
+            p.hole_cards = self.deck.deal(2)
+
+        delivered = await asyncio.gather(
+            *(self._send_holes(p) for p in players)
+        )
+
+        for p, ok in zip(players, delivered):
+            if not ok:
+                await send(
+                    self.ctx,
+                    f"{p.member.mention} I couldn't send you your cards. "
+                    "Please allow direct messages from server members."
+                )
+
+    async def _send_holes(self, player: Player) -> bool:
+        """DM the player's hole cards; return whether it worked."""
+
+        c1, c2 = player.hole_cards
+        try:
+            await asyncio.wait_for(
+                dm(
+                    self.ctx.bot, player.member,
+                    f"Here are your cards: ({c1}) ({c2})"
+                ),
+                DM_TIMEOUT
+            )
+        except (discord.HTTPException, asyncio.TimeoutError) as ex:
+            log.info("Couldn't DM hole cards to %s: %s", player.member.id, ex)
+            return False
+
+        return True
 
     async def _setup_blinds(self):
         """Choose the dealer and the blinds."""
@@ -361,7 +493,8 @@ class Game:
             self.small_blind_i = 0
             
             self.players[self.small_blind_i].status = PlayerStatus.small_dealer
-            await self.ctx.send(
+            await send(
+                self.ctx,
                 f"{self.players[self.small_blind_i].member.mention} "
                  "You're the small blind."
             )
@@ -369,13 +502,14 @@ class Game:
             self.big_blind_i = 1
 
             self.players[self.big_blind_i].status = PlayerStatus.big_blind
-            await self.ctx.send(
+            await send(
+                self.ctx,
                 f"{self.players[self.big_blind_i].member.mention} "
                  "You're the big blind."
             )
         else:
             if self.di is None:
-                self.di = randint(0, self.n - 1)
+                self.di = self.hand_rng.randint(0, self.n - 1)
             else:
                 self.di = (self.di + 1) % self.n
 
@@ -388,21 +522,29 @@ class Game:
             bb = self.players[self.big_blind_i]
             
             sb.status = PlayerStatus.small_blind
-            await self.ctx.send(
+            await send(
+                self.ctx,
                 f"{sb.member.mention} You're the small blind."
             )
             bb.status = PlayerStatus.big_blind
-            await self.ctx.send(
+            await send(
+                self.ctx,
                 f"{bb.member.mention} You're the big blind."
             )
 
     def _pre_turn_setup(self):
         """Set up the game for a new turn."""
 
+        # all-in levels of the street that has just ended are sorted once
+        self.ledger.end_street()
+
         self.min_bet = 0
         self.pending_players = []
         self.pending_index = 0
 
+        self._turn_pending = set()
+        self._unmatched = set()
+
         for p in self.players:
             p.turn_pending = False
             p.betted = 0
\ No newline at end of file
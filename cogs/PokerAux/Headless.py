@@ -0,0 +1,228 @@
+"""
+Auxiliary module for the Poker Cog. This module plays poker without Discord.
+
+It provides stand-ins for the Context, Member and TextChannel objects the
+game talks to, policies that decide what simulated players do, and drivers
+that play full hands through preflop, flop, turn, river, showdown and
+next_round. Nothing here opens a connection.
+"""
+
+
+import random
+from collections import defaultdict
+from time import perf_counter
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from . import Implementation
+from .Constants import SM_BLIND_BET, STARTING_CHIPS
+from .Game import Game
+from .History import HandLog
+from .Player import Player
+
+
+class FakeGuild:
+    """Stand-in for discord.Guild."""
+
+    def __init__(self, id: int = 1) -> None:
+        self.id = id
+
+
+class FakeChannel:
+    """Stand-in for discord.TextChannel that only counts messages."""
+
+    def __init__(self, id: int = 1, guild: Optional[FakeGuild] = None,
+                    name: str = 'poker') -> None:
+        self.id = id
+        self.guild = guild or FakeGuild()
+        self.name = name
+        self.mention = f'<#{id}>'
+        self.sent = 0
+
+    async def send(self, content: str) -> None:
+        self.sent += 1
+
+
+class FakeMember:
+    """Stand-in for discord.Member that only counts the DMs it gets."""
+
+    def __init__(self, id: int) -> None:
+        self.id = id
+        self.name = f'player{id}'
+        self.display_name = self.name
+        self.mention = f'<@{id}>'
+        self.dms = 0
+
+    async def send(self, content: str) -> None:
+        self.dms += 1
+
+
+class FakeContext:
+    """Stand-in for commands.Context; there is no bot, so no outbox."""
+
+    def __init__(self, author: FakeMember, channel: FakeChannel) -> None:
+        self.author = author
+        self.channel = channel
+        self.guild = channel.guild
+        self.bot = None
+
+    async def send(self, content: str) -> None:
+        await self.channel.send(content)
+
+
+# a policy picks an action ('call', 'bet', 'fold' or 'all-in') and, for
+# bets, an amount
+Action = Tuple[str, int]
+Policy = Callable[[Game, Player, random.Random], Action]
+
+
+def calling_station(game: Game, player: Player,
+                    rng: random.Random) -> Action:
+    """Always call or check."""
+
+    return 'call', 0
+
+
+def random_player(game: Game, player: Player, rng: random.Random) -> Action:
+    """Pick any legal action at random, with a bias towards calling."""
+
+    to_call = game.min_bet - player.betted
+    r = rng.random()
+
+    if r < 0.15 and to_call > 0:
+        return 'fold', 0
+    if r < 0.25 and player.chips > to_call:
+        raise_by = rng.randint(1, max(1, (player.chips - to_call) // 4))
+        return 'bet', to_call + raise_by
+    if r < 0.28:
+        return 'all-in', 0
+
+    return 'call', 0
+
+
+async def act(game: Game, player: Player, action: Action) -> None:
+    """Make player take the given action through Implementation."""
+
+    ctx = FakeContext(player.member, game.ctx.channel)
+    name, amt = action
+
+    if name == 'call':
+        await Implementation.call(game, ctx)
+    elif name == 'bet':
+        await Implementation.bet(game, ctx, amt)
+    elif name == 'fold':
+        await Implementation.fold(game, ctx)
+    elif name == 'all-in':
+        await Implementation.all_in(game, ctx)
+    else:
+        raise ValueError(f"Unknown action: {name}")
+
+
+async def play_betting(game: Game, policies: Dict[int, Policy],
+                        rng: random.Random) -> None:
+    """
+    Play a betting round, asking each player's policy what to do.
+
+    This takes the same steps as Game.start_betting, but instead of waiting
+    for a player to act, the player is made to act right away.
+    """
+
+    game.begin_betting()
+
+    while not game.next_turn():
+        pp = game.pending_players[game.pending_index]
+        await act(game, pp, policies[pp.member.id](game, pp, rng))
+
+
+def new_game(n_players: int, channel: Optional[FakeChannel] = None,
+                starting_chips: int = STARTING_CHIPS,
+                sm_blind: int = SM_BLIND_BET,
+                rng: Optional[random.Random] = None) -> Game:
+    """Return a game between n_players stand-in members."""
+
+    members = [FakeMember(i + 1) for i in range(n_players)]
+    channel = channel or FakeChannel()
+
+    return Game(
+        FakeContext(members[0], channel), members, starting_chips, sm_blind,
+        rng
+    )
+
+
+# the stages of a hand, in order
+STAGES = ('preflop', 'flop', 'turn', 'river', 'showdown', 'next_round')
+
+
+async def play_hand(game: Game, policies: Dict[int, Policy],
+                    rng: random.Random,
+                    timings: Optional[Dict[str, List[float]]] = None,
+                    seed: Optional[int] = None) -> None:
+    """
+    Play one hand of poker from the deal to the next round.
+
+    If timings is given, the seconds each stage took (including its betting
+    round) are appended to timings[stage]. The hand is dealt with seed, if
+    one is given.
+    """
+
+    for stage in STAGES:
+        start = perf_counter()
+
+        if stage == 'preflop':
+            await game.preflop(seed)
+        else:
+            await getattr(game, stage)()
+        if stage in ('preflop', 'flop', 'turn', 'river'):
+            await play_betting(game, policies, rng)
+
+        if timings is not None:
+            timings[stage].append(perf_counter() - start)
+
+
+async def simulate(n_hands: int, n_players: int = 6,
+                    policy: Policy = random_player, seed: int = 0,
+                    timings: Optional[Dict[str, List[float]]] = None,
+                    logs: Optional[List[HandLog]] = None) -> int:
+    """
+    Play n_hands hands, starting a new game whenever one ends.
+
+    The same seed always plays the same hands. The log of every hand is
+    appended to logs, if it is given. Return the number of games played.
+    """
+
+    rng = random.Random(seed)
+    timings = defaultdict(list) if timings is None else timings
+
+    game = None
+    games = 0
+    for _ in range(n_hands):
+        if game is None or game.winner is not None:
+            game = new_game(
+                n_players, rng=random.Random(rng.getrandbits(64))
+            )
+            policies = {p.member.id: policy for p in game.players}
+            games += 1
+
+        await play_hand(game, policies, rng, timings)
+
+        if logs is not None:
+            logs.append(game.hand_log)
+
+    return games
+
+
+def summarize(samples: Sequence[float]) -> Dict[str, float]:
+    """Return the mean and a few percentiles of samples."""
+
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+
+    def pct(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    return {
+        'mean': sum(ordered) / len(ordered),
+        'p50': pct(0.50),
+        'p99': pct(0.99),
+        'max': ordered[-1],
+    }
@@ -0,0 +1,82 @@
+"""
+Auxiliary module for the Poker Cog. This module records hands of poker.
+
+A hand is fully determined by the state of the table before the deal, the
+seed its cards were shuffled with and the actions the players took, so that
+is all a HandLog keeps. Logs are saved as one line of JSON each.
+"""
+
+
+import json
+from typing import List, Optional, Tuple
+
+
+# action codes, as stored in a log
+CALL = 'c'
+BET = 'b'
+FOLD = 'f'
+ALL_IN = 'a'
+
+
+class HandLog:
+    """Everything needed to play a hand of poker again."""
+
+    def __init__(self, seed: int, dealer: Optional[int], sm_blind: int,
+                    stacks: List[Tuple[int, int]]) -> None:
+        # the seed of the random number generator used during the hand
+        self.seed = seed
+
+        # index of the dealer before the hand; None for the first hand
+        self.dealer = dealer
+
+        self.sm_blind = sm_blind
+
+        # (member id, chips) of every player, in seating order
+        self.stacks = stacks
+
+        # one entry per action: seat index, action code and amount for bets
+        self.actions: List[Tuple[int, str, int]] = []
+
+        # chips of every player after the pot has been paid out
+        self.result: Optional[List[int]] = None
+
+    def record(self, seat: int, action: str, amt: int = 0) -> None:
+        """Add an action to the log."""
+
+        self.actions.append((seat, action, amt))
+
+    def dumps(self) -> str:
+        """Return the log as a single line of JSON."""
+
+        actions = ' '.join(
+            f"{seat}{action}{amt if action == BET else ''}"
+            for seat, action, amt in self.actions
+        )
+
+        return json.dumps({
+            's': self.seed,
+            'd': self.dealer,
+            'b': self.sm_blind,
+            'p': self.stacks,
+            'a': actions,
+            'r': self.result,
+        }, separators=(',', ':'))
+
+    @classmethod
+    def loads(cls, line: str) -> 'HandLog':
+        """Return the log saved in line by dumps."""
+
+        data = json.loads(line)
+
+        log = cls(
+            data['s'], data['d'], data['b'],
+            [tuple(p) for p in data['p']]
+        )
+        for token in data['a'].split():
+            # the seat is all the digits before the action code
+            i = next(i for i, ch in enumerate(token) if not ch.isdigit())
+            amt = token[i + 1:]
+            log.record(int(token[:i]), token[i], int(amt) if amt else 0)
+        log.result = data['r']
+
+        return log
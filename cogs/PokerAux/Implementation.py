@@ -1,57 +1,61 @@
 """This module actually implements the methods of the poker cog."""
 
 
-from typing import List
+from typing import List, Optional, Sequence
 
 from discord.ext.commands import Context
 
+from . import Equity, History
+from .Cards import parse_cards
 from .Game import Game
 from .Player import Player
-from ..utils.utils import reply
+from ..utils.utils import reply, send
 from .Constants import STARTING_CHIPS, SM_BLIND_BET
 
 
 async def poker(cog, ctx: Context, players: List[Player]):
-    """Start the game of poker."""
+    """Start the game of poker at a new table in ctx.channel."""
 
-    cog.game = Game(
+    game = Game(
         ctx,
         players,
         STARTING_CHIPS,
         SM_BLIND_BET
     )
 
-    while cog.game.winner is None:
-        await ctx.send("------ N E W    R O U N D ------")
-
-        try:
-            await cog.game.preflop()
-            await cog.game.start_betting()
-
-            await cog.game.flop()
-            await cog.game.start_betting()
-            
-            await cog.game.turn()
-            await cog.game.start_betting()
-            
-            await cog.game.river()
-            await cog.game.start_betting()
-            
-            await cog.game.showdown()
-            await cog.game.next_round()
-        except AttributeError:  # the game has been ended by an admin
-            await ctx.send("The game has been ended prematurely.")
-            return
+    cog.tables.open(ctx.channel, game, play(game))
+
+async def play(game: Game):
+    """Play rounds of poker till someone wins the game."""
+
+    ctx = game.ctx
+
+    stages = (
+        game.preflop, game.start_betting,
+        game.flop, game.start_betting,
+        game.turn, game.start_betting,
+        game.river, game.start_betting,
+        game.showdown, game.next_round
+    )
+
+    while game.winner is None:
+        await send(ctx, "------ N E W    R O U N D ------")
+
+        for stage in stages:
+            if game.ended:  # the game has been ended by a player or an admin
+                await send(ctx, "The game has been ended prematurely.")
+                return
+
+            await stage()
 
-    await ctx.send(f"{cog.game.winner.member.mention} wins the game!")
-    await ctx.send(f"Game Over!")
-    cog.game = None
+    await send(ctx, f"{game.winner.member.mention} wins the game!")
+    await send(ctx, f"Game Over!")
 
-async def call(cog, ctx: Context):
+async def call(game: Game, ctx: Context):
     """Bet the minimum required chips."""
 
-    pp = cog.game.pending_players[cog.game.pending_index]
-    min_bet = cog.game.min_bet - pp.betted
+    pp = game.pending_players[game.pending_index]
+    min_bet = game.min_bet - pp.betted
 
     # player can't match the minimum amount without going all-in
     if min_bet >= pp.chips:
@@ -64,17 +68,15 @@ async def call(cog, ctx: Context):
     else:
         await reply(ctx, f"bets {min_bet} chips.")
 
-    cog.game.place_bet(pp, min_bet)
-    pp.turn_pending = False
+    game.place_bet(pp, min_bet)
+    game.record_action(pp, History.CALL)
+    game.end_turn(pp)
 
-    cog.game.pending_index += 1
-    cog.game.pending_index %= cog.game.n
-
-async def bet(cog, ctx: Context, amt: int):
+async def bet(game: Game, ctx: Context, amt: int):
     """Place a bet."""
 
-    pp = cog.game.pending_players[cog.game.pending_index]
-    min_bet = cog.game.min_bet - pp.betted
+    pp = game.pending_players[game.pending_index]
+    min_bet = game.min_bet - pp.betted
 
     if amt > pp.chips:
         await reply(ctx, "You don't have enough chips.")
@@ -96,57 +98,90 @@ async def bet(cog, ctx: Context, amt: int):
     else:
         await reply(ctx, f"bets {amt} chips.")
 
-    cog.game.place_bet(pp, amt)
-    pp.turn_pending = False
-    cog.game.min_bet = max(cog.game.min_bet, pp.betted)
-
-    cog.game.pending_index += 1
-    cog.game.pending_index %= cog.game.n
+    game.place_bet(pp, amt)
+    game.min_bet = max(game.min_bet, pp.betted)
+    game.record_action(pp, History.BET, amt)
+    game.end_turn(pp)
 
-async def fold(cog, ctx: Context):
+async def fold(game: Game, ctx: Context):
     await reply(ctx, "folds.")
     
-    pp = cog.game.pending_players[cog.game.pending_index]
+    pp = game.pending_players[game.pending_index]
     pp.not_folded = False
-    pp.turn_pending = False
-    
-    cog.game.pending_index += 1
-    cog.game.pending_index %= cog.game.n
+    game.record_action(pp, History.FOLD)
+    game.end_turn(pp)
 
-async def all_in(cog, ctx: Context):        
-    pp = cog.game.pending_players[cog.game.pending_index]
+async def all_in(game: Game, ctx: Context):        
+    pp = game.pending_players[game.pending_index]
     
     await reply(ctx, f"goes all in with {pp.chips}!")
     
-    cog.game.place_bet(pp, pp.chips)
-    
-    pp.turn_pending = False
+    game.place_bet(pp, pp.chips)
     pp.all_in = True
 
-    cog.game.min_bet = max(cog.game.min_bet, pp.betted)
+    game.min_bet = max(game.min_bet, pp.betted)
+    game.record_action(pp, History.ALL_IN)
+    game.end_turn(pp)
 
-    cog.game.pending_index += 1
-    cog.game.pending_index %= cog.game.n
-
-async def chips(cog, ctx: Context, player: Player):        
-    for p in cog.game.players:
+async def chips(game: Game, ctx: Context, player: Player):        
+    for p in game.players:
         if p.member == player:
-            await ctx.send(f"{p.member.mention} has {p.chips} chips.")
+            await send(ctx, f"{p.member.mention} has {p.chips} chips.")
             return
 
-    await ctx.send(f"{player.mention} is not playing with you.")
+    await send(ctx, f"{player.mention} is not playing with you.")
+
+async def pot(game: Game, ctx: Context):        
+    await send(ctx, f'Pot: {game.pot} chips')
+
+    pots = game.ledger.pots()
+    if len(pots) > 1:
+        for i, p in enumerate(pots):
+            name = 'Main pot' if i == 0 else f'Side pot {i}'
+            await send(ctx, f'{name}: {p.amount} chips')
 
-async def pot(cog, ctx: Context):        
-    await ctx.send(f'Pot: {cog.game.pot} chips')
+async def turn(game: Game, ctx: Context):    
+    if not game.pending_players:
+        await send(ctx, "The cards are being dealt. No one is to act yet.")
+        return
+
+    pp = game.pending_players[game.pending_index]
+    await send(ctx, f"It's {pp.member.mention}'s turn.")
+
+async def odds(cog, ctx: Context, args: Sequence[str]):
+    """Show the odds of the given hands, e.g. AsKd vs QhQc on 2c7d9h."""
+
+    args = [a for a in args if a.lower() != 'vs']
+    lowered = [a.lower() for a in args]
 
-async def turn(cog, ctx: Context):    
-    pp = cog.game.pending_players[cog.game.pending_index]
-    await ctx.send(f"It's {pp.member.mention}'s turn.")
+    if 'on' in lowered:
+        i = lowered.index('on')
+        hands, board = args[:i], ''.join(args[i + 1:])
+    else:
+        hands, board = args, ''
+
+    try:
+        holes = [parse_cards(h) for h in hands]
+        board_cards = parse_cards(board)
 
-async def runnable(cog, ctx: Context, pp=True):
+        result = await Equity.equity_async(
+            holes, board_cards, executor=cog.odds_executor()
+        )
+    except ValueError as ex:
+        await reply(ctx, f"{ex} Try something like `AsKd vs QhQc on 2c7d9h`.")
+        return
+
+    lines = [
+        f"{' '.join(f'({c})' for c in hole)}: "
+        f"{100 * o.win:.1f}% win, {100 * o.tie:.1f}% tie"
+        for hole, o in zip(holes, result)
+    ]
+    await send(ctx, '\n'.join(lines))
+
+async def runnable(game: Optional[Game], ctx: Context, pp=True):
     """Check against errors like wrong turn or not inside game."""
 
-    if cog.game is None:
+    if game is None:
         await reply(
             ctx,
             "We're not inside a poker game right now."
@@ -154,7 +189,15 @@ async def runnable(cog, ctx: Context, pp=True):
         return False
 
     if pp:
-        pending_player = cog.game.pending_players[cog.game.pending_index]
+        # no one acts while the hole cards are being sent
+        if not game.pending_players:
+            await reply(
+                ctx,
+                "The cards are being dealt. Please wait a moment."
+            )
+            return False
+
+        pending_player = game.pending_players[game.pending_index]
         if ctx.author != pending_player.member:
             await reply(
                 ctx,
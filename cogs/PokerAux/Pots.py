@@ -0,0 +1,147 @@
+"""
+Auxiliary module for the Poker Cog. This module keeps track of the chips put
+into the pot and splits them into a main pot and side pots.
+
+Every chip a player bets is written to their entry in a ledger. A player who
+goes all-in can only win up to their own contribution from every other
+player, so each all-in amount is a level at which a new side pot starts. The
+levels of a street are sorted once, when the street ends.
+"""
+
+
+from heapq import merge
+from random import Random
+from typing import Dict, List
+
+from .Player import Player
+
+
+class Pot:
+    """Chips that can be won by the same group of players."""
+
+    def __init__(self, amount: int, eligible: List[Player]) -> None:
+        self.amount = amount
+        self.eligible = eligible
+
+
+class PotLedger:
+    """The chips every player has put into the pot during a hand."""
+
+    def __init__(self) -> None:
+        self.contributions: Dict[Player, int] = {}
+        self.total = 0
+
+        # sorted contributions of the players who went all-in on earlier
+        # streets, and the unsorted ones of the current street
+        self._levels: List[int] = []
+        self._street_levels: List[int] = []
+
+    def add(self, player: Player, amt: int, all_in: bool = False) -> None:
+        """Record a bet; all_in tells if the player has no chips left."""
+
+        self.contributions[player] = self.contributions.get(player, 0) + amt
+        self.total += amt
+
+        if all_in:
+            self._street_levels.append(self.contributions[player])
+
+    def end_street(self) -> None:
+        """Fold the all-in levels of the street into the sorted levels."""
+
+        if self._street_levels:
+            self._street_levels.sort()
+            self._levels = list(merge(self._levels, self._street_levels))
+            self._street_levels = []
+
+    def reset(self) -> None:
+        """Empty the ledger for a new hand."""
+
+        self.contributions = {}
+        self.total = 0
+        self._levels = []
+        self._street_levels = []
+
+    def pots(self) -> List[Pot]:
+        """Return the main pot followed by the side pots."""
+
+        self.end_street()
+
+        live = [p for p in self.contributions if p.not_folded]
+        if not live:
+            return []
+
+        top = max(self.contributions[p] for p in live)
+
+        levels = []
+        for level in self._levels:
+            if level < top and (not levels or level > levels[-1]):
+                levels.append(level)
+        levels.append(top)
+
+        pots = []
+        prev = 0
+        for i, level in enumerate(levels):
+            if i == len(levels) - 1:
+                # whatever folded players put in above the top level goes to
+                # the last pot
+                amount = sum(
+                    c - min(c, prev) for c in self.contributions.values()
+                )
+            else:
+                amount = sum(
+                    min(c, level) - min(c, prev)
+                    for c in self.contributions.values()
+                )
+            eligible = [p for p in live if self.contributions[p] >= level]
+
+            pots.append(Pot(amount, eligible))
+            prev = level
+
+        return pots
+
+    def payout(self, scores: Dict[Player, int],
+                rng: Random) -> Dict[Player, int]:
+        """
+        Split the pots among the players and return what each one wins.
+
+        scores maps every player still in the hand to the strength of their
+        hand. Odd chips of a split pot go to one of the winners at random.
+        """
+
+        pots = self.pots()
+        winnings = {p: 0 for p in scores}
+
+        # the last pot each player can win; a player who can win a pot can
+        # also win every pot before it
+        reach = {p: -1 for p in scores}
+        for k, pot in enumerate(pots):
+            for p in pot.eligible:
+                if p in reach:
+                    reach[p] = k
+
+        ranked = sorted(scores, key=scores.get, reverse=True)
+
+        # pots are always paid from the main pot up; paid is the first pot
+        # that hasn't been paid yet
+        paid = 0
+        i = 0
+        while i < len(ranked) and paid < len(pots):
+            j = i
+            while j < len(ranked) and scores[ranked[j]] == scores[ranked[i]]:
+                j += 1
+            group = ranked[i:j]
+
+            last = max(reach[p] for p in group)
+            for k in range(paid, last + 1):
+                sharers = [p for p in group if reach[p] >= k]
+
+                amt_each, amt_left = divmod(pots[k].amount, len(sharers))
+                for p in sharers:
+                    winnings[p] += amt_each
+                if amt_left:
+                    winnings[rng.choice(sharers)] += amt_left
+
+            paid = max(paid, last + 1)
+            i = j
+
+        return winnings
@@ -0,0 +1,101 @@
+"""
+Auxiliary module for the Poker Cog. This module plays logged hands again.
+
+A hand is replayed by the same Game state machine that played it, with
+stand-in members and contexts from Headless, so replaying needs no Discord
+connection and runs as fast as the engine allows.
+"""
+
+
+import random
+from typing import Iterable, List, Tuple
+
+from . import Headless
+from .Game import Game
+from .History import BET, CALL, FOLD, ALL_IN, HandLog
+from .Player import Player
+
+
+# how the actions in a log map to the actions of Headless
+_ACTIONS = {CALL: 'call', BET: 'bet', FOLD: 'fold', ALL_IN: 'all-in'}
+
+
+class ReplayError(Exception):
+    """The log doesn't fit the game it is replayed on."""
+
+
+def _scripted(log: HandLog) -> Headless.Policy:
+    """Return a policy that takes the actions in log, one after another."""
+
+    actions = iter(log.actions)
+
+    def policy(game: Game, player: Player, rng: random.Random):
+        try:
+            seat, action, amt = next(actions)
+        except StopIteration:
+            raise ReplayError("The log ends before the hand does.")
+
+        if game.players[seat] is not player:
+            raise ReplayError(
+                f"Seat {seat} acts in the log, but it is "
+                f"seat {game.players.index(player)}'s turn."
+            )
+
+        return _ACTIONS[action], amt
+
+    return policy
+
+
+async def replay(log: HandLog) -> Game:
+    """Play the hand in log again and return the game it was played on."""
+
+    game = Headless.new_game(len(log.stacks), sm_blind=log.sm_blind)
+    for p, (member_id, chips) in zip(game.players, log.stacks):
+        p.member.id = member_id
+        p.chips = chips
+    game.di = log.dealer
+
+    policy = _scripted(log)
+    policies = {p.member.id: policy for p in game.players}
+
+    # replayed logs go through record_action again, so the new log can be
+    # compared with the old one
+    await Headless.play_hand(game, policies, random.Random(), seed=log.seed)
+
+    if len(game.hand_log.actions) != len(log.actions):
+        raise ReplayError("The hand ends before the log does.")
+
+    return game
+
+
+async def verify(log: HandLog) -> bool:
+    """Replay log and check that the chips end up where the log says."""
+
+    game = await replay(log)
+    return game.hand_log.result == log.result
+
+
+async def replay_corpus(lines: Iterable[str]) -> Tuple[int, List[int]]:
+    """
+    Verify every hand in a corpus of logs saved by HandLog.dumps.
+
+    Return the number of hands and the line numbers of those that didn't
+    replay to the same result.
+    """
+
+    n = 0
+    mismatches = []
+    for i, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        n += 1
+
+        try:
+            ok = await verify(HandLog.loads(line))
+        except ReplayError:
+            ok = False
+
+        if not ok:
+            mismatches.append(i)
+
+    return n, mismatches
@@ -0,0 +1,133 @@
+"""
+Auxiliary module for the Poker Cog. This module keeps track of the poker
+tables running in different channels.
+
+When the bot's shards run in several processes, every process keeps the
+tables of the guilds it serves; a table never moves between processes.
+Members are kept from sitting at two tables at once only among the tables
+of one process.
+"""
+
+
+import asyncio
+import logging
+from typing import Awaitable, Dict, Iterator, Optional, Tuple
+
+import discord
+
+from .Game import Game
+
+
+log = logging.getLogger(__name__)
+
+# a table is identified by the guild and the channel it is played in
+TableKey = Tuple[int, int]
+
+
+class Table:
+    """A game of poker running in a channel."""
+
+    def __init__(self, channel: discord.TextChannel, game: Game) -> None:
+        self.channel = channel
+        self.game = game
+        self.task: Optional[asyncio.Task] = None
+
+        # players who are knocked out keep their seat till the game ends
+        self.member_ids = [p.member.id for p in game.players]
+
+
+class TableRegistry:
+    """All poker tables of the bot, indexed by channel and by player."""
+
+    def __init__(self) -> None:
+        self._tables: Dict[TableKey, Table] = {}
+
+        # which table each member is sitting at
+        self._seats: Dict[int, TableKey] = {}
+
+    @staticmethod
+    def key(channel) -> Optional[TableKey]:
+        """Return the key of the table in the given channel."""
+
+        guild = getattr(channel, 'guild', None)
+        if guild is None:   # DMs can't host a table
+            return None
+
+        return (guild.id, channel.id)
+
+    def get(self, channel) -> Optional[Game]:
+        """Return the game running in the given channel, if any."""
+
+        table = self._tables.get(self.key(channel))
+        return None if table is None else table.game
+
+    def table_of(self, member: discord.abc.User) -> Optional[Table]:
+        """Return the table the given member is sitting at, if any."""
+
+        key = self._seats.get(member.id)
+        return None if key is None else self._tables.get(key)
+
+    def open(self, channel: discord.TextChannel, game: Game,
+                play: Awaitable) -> Table:
+        """Seat the players of game in channel and start playing."""
+
+        key = self.key(channel)
+        if key in self._tables:
+            raise ValueError("A game is already running in this channel.")
+
+        table = Table(channel, game)
+        self._tables[key] = table
+        for member_id in table.member_ids:
+            self._seats[member_id] = key
+
+        table.task = asyncio.ensure_future(play)
+        table.task.add_done_callback(
+            lambda task: self._on_done(key, table, task)
+        )
+
+        return table
+
+    def close(self, channel) -> Optional[Game]:
+        """End the game running in the given channel and free its seats."""
+
+        key = self.key(channel)
+        table = self._tables.get(key)
+        if table is None:
+            return None
+
+        table.game.end()
+        self._remove(key, table)
+
+        return table.game
+
+    def __len__(self) -> int:
+        return len(self._tables)
+
+    def __iter__(self) -> Iterator[Table]:
+        return iter(list(self._tables.values()))
+
+    def _remove(self, key: TableKey, table: Table):
+        """Forget the given table if it is still the one at key."""
+
+        if self._tables.get(key) is not table:
+            return
+
+        del self._tables[key]
+        for member_id in table.member_ids:
+            if self._seats.get(member_id) == key:
+                del self._seats[member_id]
+
+    def _on_done(self, key: TableKey, table: Table, task: asyncio.Task):
+        """Clean up after a game task finishes, however it finished."""
+
+        self._remove(key, table)
+
+        if task.cancelled():
+            return
+
+        err = task.exception()
+        if err is not None:
+            log.error(
+                "Poker game in channel %s crashed.", table.channel.id,
+                exc_info=(type(err), err, err.__traceback__)
+            )
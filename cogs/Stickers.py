@@ -5,15 +5,31 @@ from os import getenv
 
 from discord.ext import commands
 
-from .utils.utils import reply
+from .StickersAux.Registry import StickerRegistry
+from .utils.utils import reply, send
 
 
-class UtilityCog(commands.Cog):
-    """A general-purpose cog meant for simple utility commands."""
+class Stickers(commands.Cog):
+    """Display stickers from the registry."""
 
     def __init__(self, bot: commands.Bot) -> None:
         self.bot = bot
-        self.s_reg = self._get_s_registry()
+
+        # the registry is read once the bot is online, and again whenever
+        # the file changes
+        self.s_reg = bot.take_state(self).get('s_reg')
+        if self.s_reg is None:
+            self.s_reg = StickerRegistry(getenv('S_FILENAME'))
+            bot.warm_up('stickers', self.s_reg.reload)
+        self._watch_task = bot.after_ready(self.s_reg.watch)
+
+    def export_state(self):
+        """Hand the registry over to a new version of the cog."""
+
+        return {'s_reg': self.s_reg}
+
+    def cog_unload(self):
+        self._watch_task.cancel()
 
     @commands.command(
         name='s',
@@ -25,20 +41,22 @@ class UtilityCog(commands.Cog):
         if ctx.author.id != 711994085480726639:
             return
 
-        url = self.s_reg.get(s_name.strip().lower())
+        index = await self.s_reg.get_index()
+        url = index.get(s_name)
         if url:
-            await ctx.send(url)
-        else:
-            await reply(ctx, f"No such sticker: {s_name}")
-
-    def _get_s_registry(self):
-        """Return a dict mapping sticker name to sticker URL."""
+            await send(ctx, url)
+            return
 
-        with open(getenv('S_FILENAME')) as s_file:
-            return dict(
-                (t[0].lower(), t[1]) for t in [line.split() for line in s_file]
+        suggestions = index.suggest(s_name)
+        if suggestions:
+            await reply(
+                ctx,
+                f"No such sticker: {s_name}. Did you mean "
+                + ', '.join(f"`{name}`" for name in suggestions) + "?"
             )
+        else:
+            await reply(ctx, f"No such sticker: {s_name}")
 
 
 def setup(bot: commands.Bot):
-    bot.add_cog(UtilityCog(bot))
\ No newline at end of file
+    bot.add_cog(Stickers(bot))
\ No newline at end of file
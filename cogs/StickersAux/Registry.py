@@ -0,0 +1,219 @@
+"""
+Auxiliary module for the Stickers Cog. This module keeps the sticker
+registry and looks stickers up in it.
+
+The registry is read from S_FILENAME, one sticker per line: its name and
+its URL. Blank lines and lines starting with # are skipped, and so are
+malformed lines, which are logged. The file is checked every few seconds;
+when it has changed, a new index is built on a worker thread and swapped
+in whole, so commands always see either the old stickers or the new ones.
+If the file can't be read, the stickers already loaded are kept.
+
+Stickers are found by exact name; a name that isn't found is suggested the
+stickers that start with it, through a prefix trie, and those a typo or
+two away from it, through an index of the strings left after deleting up
+to MAX_DISTANCE characters of each name (see utils.text.TypoIndex).
+"""
+
+
+import asyncio
+import logging
+import os
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from ..utils.text import TypoIndex
+
+
+log = logging.getLogger(__name__)
+
+# seconds between two checks of the file
+RELOAD_INTERVAL = 5.0
+
+# the most edits between a name and a sticker it's suggested
+MAX_DISTANCE = 2
+
+# the most stickers suggested for a name
+SUGGESTIONS = 5
+
+
+class _Version(NamedTuple):
+    """What tells one version of the file from another."""
+
+    mtime_ns: int
+    size: int
+
+
+def parse(lines: Iterable[str]) -> Tuple[Dict[str, str], List[int]]:
+    """Return the stickers in lines, and the numbers of malformed lines."""
+
+    stickers: Dict[str, str] = {}
+    malformed: List[int] = []
+    for number, line in enumerate(lines, 1):
+        fields = line.split()
+        if not fields or fields[0].startswith('#'):
+            continue
+
+        if len(fields) != 2:
+            malformed.append(number)
+            continue
+
+        stickers[fields[0].lower()] = fields[1]
+
+    return stickers, malformed
+
+
+class _Node:
+    """A node of the prefix trie."""
+
+    __slots__ = ('children', 'names')
+
+    def __init__(self) -> None:
+        self.children: Dict[str, '_Node'] = {}
+
+        # the first SUGGESTIONS names under this node, shortest first
+        self.names: List[str] = []
+
+
+class StickerIndex:
+    """The stickers, indexed by name; never changed once built."""
+
+    def __init__(self, stickers: Dict[str, str]) -> None:
+        self.stickers = stickers
+
+        self._trie = _Node()
+        for name in sorted(stickers, key=lambda n: (len(n), n)):
+            node = self._trie
+            for ch in name:
+                node = node.children.setdefault(ch, _Node())
+                if len(node.names) < SUGGESTIONS:
+                    node.names.append(name)
+
+        self._typos = TypoIndex(stickers, MAX_DISTANCE)
+
+    def __len__(self) -> int:
+        return len(self.stickers)
+
+    def get(self, name: str) -> Optional[str]:
+        """Return the URL of the sticker called name, if there's one."""
+
+        return self.stickers.get(name.strip().lower())
+
+    def complete(self, prefix: str,
+                    limit: int = SUGGESTIONS) -> List[str]:
+        """Return the shortest names that start with prefix."""
+
+        node = self._trie
+        for ch in prefix.strip().lower():
+            node = node.children.get(ch)
+            if node is None:
+                return []
+
+        return node.names[:limit]
+
+    def closest(self, name: str, limit: int = SUGGESTIONS) -> List[str]:
+        """Return the names at most MAX_DISTANCE edits away, closest first."""
+
+        return self._typos.closest(name.strip().lower(), limit=limit)
+
+    def suggest(self, name: str, limit: int = SUGGESTIONS) -> List[str]:
+        """Return the names name may stand for: completions, then typos."""
+
+        suggestions = self.complete(name, limit)
+        for candidate in self.closest(name, limit):
+            if len(suggestions) == limit:
+                break
+            if candidate not in suggestions:
+                suggestions.append(candidate)
+
+        return suggestions
+
+
+class StickerRegistry:
+    """The stickers in a file, reloaded whenever the file changes."""
+
+    def __init__(self, path: Optional[str],
+                    reload_interval: float = RELOAD_INTERVAL) -> None:
+        self.path = path
+        self.reload_interval = reload_interval
+
+        # None till the file is first read
+        self.index: Optional[StickerIndex] = None
+
+        self._version: Optional[_Version] = None
+        self._lock = asyncio.Lock()
+
+        # whether the last attempt to read the file failed; the failure is
+        # only logged once
+        self._failing = False
+
+        self.reloads = 0
+
+    async def get_index(self) -> StickerIndex:
+        """Return the index, reading the file if it wasn't yet."""
+
+        if self.index is None:
+            await self.reload()
+
+        return self.index or StickerIndex({})
+
+    async def reload(self) -> bool:
+        """Read the file again if it changed; return whether it did."""
+
+        async with self._lock:
+            loop = asyncio.get_event_loop()
+            try:
+                version, built = await loop.run_in_executor(
+                    None, self._build, self._version
+                )
+            except (OSError, TypeError) as ex:
+                # TypeError if S_FILENAME isn't set
+                if not self._failing:
+                    log.warning("Couldn't read the stickers: %r", ex)
+                self._failing = True
+                return False
+
+            self._failing = False
+
+            if built is None:
+                return False
+
+            if self.index is not None:
+                added = built.stickers.keys() - self.index.stickers.keys()
+                removed = self.index.stickers.keys() - built.stickers.keys()
+                log.info(
+                    "Reloaded %d stickers: %d added, %d removed.",
+                    len(built), len(added), len(removed)
+                )
+
+            self.index = built
+            self._version = version
+            self.reloads += 1
+            return True
+
+    async def watch(self) -> None:
+        """Reload the file whenever it changes."""
+
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                await self.reload()
+            except Exception:
+                log.exception("Couldn't reload the stickers.")
+
+    def _build(self, known: Optional[_Version]
+                ) -> Tuple[_Version, Optional[StickerIndex]]:
+        # runs on a worker thread
+        st = os.stat(self.path)
+        version = _Version(st.st_mtime_ns, st.st_size)
+        if version == known:
+            return version, None
+
+        with open(self.path) as s_file:
+            stickers, malformed = parse(s_file)
+        if malformed:
+            log.warning(
+                "Skipped malformed lines in %s: %s", self.path,
+                ', '.join(map(str, malformed))
+            )
+
+        return version, StickerIndex(stickers)
@@ -1,12 +1,68 @@
 """A general-purpose Cog meant for simple utility commands."""
 
 
+from typing import Dict, List
+
 import discord
 from discord.ext import commands
 
+from .utils.metrics import Metrics, Summary
 from .utils.utils import reply
 
 
+# the histograms of the services shown by !stats io, and their labels
+IO_HISTOGRAMS = {
+    'http': ('svbot_http_request_seconds', 'endpoint'),
+    'db': ('svbot_db_query_seconds', 'statement'),
+    'discord': ('svbot_discord_request_seconds', 'route'),
+}
+
+# leaves room for the code block around the table
+MAX_STATS_LENGTH = 1900
+
+
+def _ms(seconds) -> str:
+    return '-' if seconds is None else f'{1e3 * seconds:.0f}'
+
+
+def _table(title: str, summaries: Dict[str, Summary]) -> List[str]:
+    lines = [f"{title:<32} {'calls':>6} {'errors':>6} {'p50ms':>6} "
+             f"{'p95ms':>6}"]
+    by_calls = sorted(summaries.items(), key=lambda item: -item[1].count)
+    for name, s in by_calls:
+        lines.append(
+            f"{name[:32]:<32} {s.count:>6} {s.errors:>6} "
+            f"{_ms(s.p50):>6} {_ms(s.p95):>6}"
+        )
+
+    return lines
+
+
+def _loop_lines(metrics: Metrics) -> List[str]:
+    lag = metrics.metrics.get('svbot_loop_lag_seconds')
+    series = lag.series.get(()) if lag is not None else None
+    if series is None:
+        return []
+
+    lines = [
+        "loop lag " + ', '.join(
+            f"p{round(100 * q)} {_ms(lag.quantile(q, series.counts))} ms"
+            for q in (0.5, 0.95, 0.99)
+        )
+    ]
+
+    stalls = metrics.metrics.get('svbot_loop_stall_seconds')
+    if stalls is not None and stalls.series:
+        by_source = sorted(
+            stalls.series.items(), key=lambda item: -item[1].count
+        )
+        lines.append("stalls: " + ', '.join(
+            f"{source} {s.count}" for (source,), s in by_source
+        ))
+
+    return lines + ['']
+
+
 class UtilityCog(commands.Cog):
     """A general-purpose cog meant for simple utility commands."""
 
@@ -22,6 +78,58 @@ class UtilityCog(commands.Cog):
 
         await reply(ctx, f"Your ID is `{ctx.author.id}`.")
 
+    @commands.command(
+        name='stats',
+        help='Display how often and how fast commands run. Add io to also '
+             'see web, database and Discord calls'
+    )
+    @commands.has_permissions(administrator=True)
+    async def stats(self, ctx: commands.Context, section: str = ''):
+        """Display the calls, errors and latencies of commands and cogs."""
+
+        metrics = self.bot.metrics
+        latency = metrics.histogram(
+            'svbot_command_seconds', '', ('command', 'cog', 'outcome')
+        )
+
+        lines = _loop_lines(metrics)
+        lines += _table('command', latency.summarize('command'))
+        lines.append('')
+        lines += _table('cog', latency.summarize('cog'))
+
+        if section == 'io':
+            for title, (name, label) in IO_HISTOGRAMS.items():
+                histogram = metrics.metrics.get(name)
+                if histogram is not None:
+                    lines.append('')
+                    lines += _table(title, histogram.summarize(label))
+
+        text = ''
+        for line in lines:
+            if len(text) + len(line) + 1 > MAX_STATS_LENGTH:
+                text += '...\n'
+                break
+            text += line + '\n'
+
+        await reply(ctx, f"```\n{text}```")
+
+    @commands.command(
+        name='reload',
+        help='Reload an extension, e.g. Poker, without restarting the bot'
+    )
+    @commands.is_owner()
+    async def reload_cmd(self, ctx: commands.Context, extension: str):
+        """Reload an extension; its cogs keep their state."""
+
+        name = extension if '.' in extension else f'cogs.{extension}'
+        try:
+            elapsed = self.bot.reload(name)
+        except commands.ExtensionError as ex:
+            await reply(ctx, f"Couldn't reload {name}: {ex}")
+            return
+
+        await reply(ctx, f"Reloaded {name} in {1e3 * elapsed:.0f} ms.")
+
 
 def setup(bot: commands.Bot):
     bot.add_cog(UtilityCog(bot))
\ No newline at end of file
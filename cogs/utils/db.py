@@ -0,0 +1,320 @@
+"""
+Database access for SVBot.
+
+All cogs share the bot's Database, a pool of PostgreSQL connections that is
+opened on first use. psycopg2 blocks, so every query runs on a worker thread
+with a connection of its own; there are as many workers as connections, so
+a query never waits on the pool while holding a thread. Connections are
+checked before they are handed out if they have been idle for a while, and
+every statement is cut off by the server after a timeout.
+
+Statements that run often are prepared once per connection:
+
+    lookup = db.prepare('tz_lookup', "SELECT ... WHERE member_id = $1")
+    row = await lookup.fetchone(member_id)
+"""
+
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic, perf_counter
+from typing import (
+    TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence, Tuple
+)
+
+from .metrics import Metrics
+
+# psycopg2 is imported when the pool is first opened, not when the bot
+# starts
+if TYPE_CHECKING:
+    from psycopg2.pool import ThreadedConnectionPool
+
+
+log = logging.getLogger(__name__)
+
+MIN_CONNECTIONS = 1
+MAX_CONNECTIONS = 4
+
+# the longest a single statement may run on the server, in milliseconds
+STATEMENT_TIMEOUT = 5000
+
+# a connection idle for longer than this is checked before it's used, in
+# seconds
+HEALTH_CHECK_INTERVAL = 30.0
+
+
+_connection_class = None
+
+
+def _connection_factory() -> type:
+    """Return the class of pooled connections, importing psycopg2."""
+
+    global _connection_class
+
+    if _connection_class is None:
+        import psycopg2.extensions
+
+        class _Connection(psycopg2.extensions.connection):
+            """A pooled connection that remembers what's prepared on it."""
+
+            def __init__(self, *args, **kwargs) -> None:
+                super().__init__(*args, **kwargs)
+
+                self.prepared = set()
+                self.used_at = monotonic()
+
+        _connection_class = _Connection
+
+    return _connection_class
+
+
+class Statement:
+    """A statement prepared on every connection of a Database."""
+
+    def __init__(self, db: 'Database', name: str, query: str) -> None:
+        self.db = db
+        self.name = name
+
+        # the query uses the $1, $2, ... placeholders of PREPARE
+        self.query = query
+
+    def _execute(self, cur, args: Sequence[Any]) -> None:
+        conn = cur.connection
+        if self.name not in conn.prepared:
+            cur.execute(f"PREPARE {self.name} AS {self.query}")
+            conn.prepared.add(self.name)
+
+        if args:
+            params = ', '.join(['%s'] * len(args))
+            cur.execute(f"EXECUTE {self.name} ({params})", args)
+        else:
+            cur.execute(f"EXECUTE {self.name}")
+
+    async def execute(self, *args: Any) -> None:
+        """Run the statement."""
+
+        await self.db.run(lambda cur: self._execute(cur, args), self.name)
+
+    async def fetchone(self, *args: Any) -> Optional[Tuple]:
+        """Run the statement and return the first row, if there's one."""
+
+        def fetch(cur):
+            self._execute(cur, args)
+            return cur.fetchone()
+
+        return await self.db.run(fetch, self.name)
+
+    async def fetchall(self, *args: Any) -> List[Tuple]:
+        """Run the statement and return all the rows."""
+
+        def fetch(cur):
+            self._execute(cur, args)
+            return cur.fetchall()
+
+        return await self.db.run(fetch, self.name)
+
+
+class Database:
+    """A pool of connections to the PostgreSQL database at dsn."""
+
+    def __init__(self, dsn: Optional[str], min_size: int = MIN_CONNECTIONS,
+                    max_size: int = MAX_CONNECTIONS,
+                    statement_timeout: int = STATEMENT_TIMEOUT,
+                    health_check_interval: float = HEALTH_CHECK_INTERVAL,
+                    sslmode: str = 'require',
+                    metrics: Optional[Metrics] = None) -> None:
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.statement_timeout = statement_timeout
+        self.health_check_interval = health_check_interval
+        self.sslmode = sslmode
+
+        self.statements: Dict[str, Statement] = {}
+
+        self._latency = None
+        if metrics is not None:
+            self._latency = metrics.histogram(
+                'svbot_db_query_seconds',
+                "Time taken by database calls, waiting for the pool included.",
+                ('statement', 'outcome')
+            )
+
+        self._pool: Optional['ThreadedConnectionPool'] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = asyncio.Lock()
+
+    def prepare(self, name: str, query: str) -> Statement:
+        """Register a statement, which is prepared when it's first used."""
+
+        if name in self.statements:
+            if self.statements[name].query != query:
+                raise ValueError(f"Statement {name} is already prepared.")
+            return self.statements[name]
+
+        stmt = Statement(self, name, query)
+        self.statements[name] = stmt
+
+        return stmt
+
+    async def execute(self, query: str, args: Sequence[Any] = ()) -> None:
+        """Run a query that returns nothing."""
+
+        await self.run(lambda cur: cur.execute(query, args))
+
+    async def fetchone(self, query: str,
+                        args: Sequence[Any] = ()) -> Optional[Tuple]:
+        """Run a query and return the first row, if there's one."""
+
+        def fetch(cur):
+            cur.execute(query, args)
+            return cur.fetchone()
+
+        return await self.run(fetch)
+
+    async def fetchall(self, query: str,
+                        args: Sequence[Any] = ()) -> List[Tuple]:
+        """Run a query and return all the rows."""
+
+        def fetch(cur):
+            cur.execute(query, args)
+            return cur.fetchall()
+
+        return await self.run(fetch)
+
+    async def run(self, fn: Callable[[Any], Any],
+                    statement: str = 'sql') -> Any:
+        """
+        Call fn with a cursor on a worker thread and return what it returns.
+
+        Every call is a transaction of its own; it's committed if fn
+        returns and rolled back if it raises. It's timed under the name of
+        the statement, if it runs one.
+        """
+
+        start = perf_counter()
+        outcome = 'error'
+        try:
+            if self._pool is None:
+                await self._open()
+
+            result = await asyncio.get_event_loop().run_in_executor(
+                self._executor, self._run, fn
+            )
+            outcome = 'ok'
+            return result
+        finally:
+            if self._latency is not None:
+                self._latency.observe(
+                    perf_counter() - start, statement, outcome
+                )
+
+    async def close(self) -> None:
+        """Close every connection; the pool is opened again if it's used."""
+
+        async with self._lock:
+            pool, self._pool = self._pool, None
+            executor, self._executor = self._executor, None
+
+        if executor is not None:
+            await asyncio.get_event_loop().run_in_executor(
+                None, executor.shutdown
+            )
+        if pool is not None:
+            pool.closeall()
+
+    async def _open(self) -> None:
+        async with self._lock:
+            if self._pool is not None:
+                return
+
+            executor = ThreadPoolExecutor(
+                self.max_size, thread_name_prefix='db'
+            )
+            options = f'-c statement_timeout={self.statement_timeout}'
+
+            def open_pool():
+                from psycopg2.pool import ThreadedConnectionPool
+
+                return ThreadedConnectionPool(
+                    self.min_size, self.max_size, self.dsn,
+                    sslmode=self.sslmode, options=options,
+                    connection_factory=_connection_factory()
+                )
+
+            try:
+                self._pool = await asyncio.get_event_loop().run_in_executor(
+                    executor, open_pool
+                )
+            except Exception:
+                executor.shutdown(wait=False)
+                raise
+            self._executor = executor
+
+            log.info(
+                "Opened a pool of %d-%d database connections.",
+                self.min_size, self.max_size
+            )
+
+    def _checkout(self) -> Any:
+        """Take a working connection from the pool."""
+
+        import psycopg2
+
+        # a connection that can't be used is dropped and replaced, at most
+        # once for every connection the pool may hold
+        for _ in range(self.max_size + 1):
+            conn = self._pool.getconn()
+            if conn.closed:
+                self._pool.putconn(conn, close=True)
+                continue
+
+            if monotonic() - conn.used_at < self.health_check_interval:
+                return conn
+
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                conn.rollback()
+            except psycopg2.Error as ex:
+                log.info("Dropping a broken database connection: %s", ex)
+                self._pool.putconn(conn, close=True)
+                continue
+
+            return conn
+
+        raise psycopg2.OperationalError("No working database connection.")
+
+    def _run(self, fn: Callable[[Any], Any], retry: bool = True) -> Any:
+        import psycopg2
+
+        conn = self._checkout()
+
+        try:
+            with conn:
+                with conn.cursor() as cur:
+                    result = fn(cur)
+        except psycopg2.Error:
+            # whether the server dropped the connection, rather than
+            # rejecting the statement; putconn closes it either way
+            dropped = bool(conn.closed)
+
+            # the connection may be broken, and what has been prepared on it
+            # isn't certain anymore; the pool opens a new one
+            self._pool.putconn(conn, close=True)
+
+            # a connection the server has dropped committed nothing, so the
+            # call is tried once more on a fresh one; anything else, like a
+            # statement that timed out, fails at once, so it never runs twice
+            if retry and dropped:
+                return self._run(fn, retry=False)
+            raise
+        except Exception:
+            self._pool.putconn(conn)
+            raise
+
+        conn.used_at = monotonic()
+        self._pool.putconn(conn)
+
+        return result
@@ -0,0 +1,295 @@
+"""
+Metrics for SVBot.
+
+The bot keeps one Metrics registry, which its services record into:
+commands, requests to web APIs, database queries and calls to Discord's
+REST API. Latencies go into histograms with fixed buckets, so recording is
+cheap and memory doesn't grow with traffic. Every series is labelled with
+an outcome, from which error rates follow.
+
+The registry can be served on a local port in the Prometheus text format,
+and summarized for the !stats command.
+"""
+
+
+import logging
+from bisect import bisect_left
+from time import perf_counter, time
+from typing import (
+    Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Sequence,
+    Tuple, Union
+)
+
+from aiohttp import web
+
+
+log = logging.getLogger(__name__)
+
+# upper bounds of the latency buckets, in seconds
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+Labels = Tuple[str, ...]
+
+
+def is_error(outcome: str) -> bool:
+    """Whether an outcome label stands for a failure."""
+
+    return outcome != 'ok' and not outcome[:1] in ('2', '3')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ''
+
+    pairs = []
+    for name, value in zip(names, values):
+        value = (
+            value.replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n')
+        )
+        pairs.append(f'{name}="{value}"')
+
+    return '{' + ','.join(pairs) + '}'
+
+
+class Counter:
+    """A number that only goes up, for every combination of labels."""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str,
+                    labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        return [
+            f'{self.name}{_format_labels(self.labels, labels)} {value}'
+            for labels, value in sorted(self.values.items())
+        ]
+
+
+class _Series:
+    """The observations of a histogram with one combination of labels."""
+
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self, n_buckets: int) -> None:
+        # observations in each bucket, the last one unbounded; not
+        # cumulative
+        self.counts = [0] * (n_buckets + 1)
+        self.sum = 0.0
+        self.count = 0
+
+
+class Summary(NamedTuple):
+    """The observations of a group of series, summed up."""
+
+    count: int
+    errors: int
+    p50: Optional[float]
+    p95: Optional[float]
+
+
+class Histogram:
+    """Observations counted in buckets, for every combination of labels."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                    buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.series: Dict[Labels, _Series] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = _Series(len(self.buckets))
+
+        series.counts[bisect_left(self.buckets, value)] += 1
+        series.sum += value
+        series.count += 1
+
+    def quantile(self, q: float, counts: Sequence[int]) -> Optional[float]:
+        """
+        Estimate the q-quantile of the observations counted in counts.
+
+        Like Prometheus, the value is interpolated within its bucket; in the
+        unbounded bucket it's the largest bound.
+        """
+
+        total = sum(counts)
+        if not total:
+            return None
+
+        rank = q * total
+        seen = 0
+        for i, n in enumerate(counts):
+            if seen + n >= rank and n:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i]
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+
+        return self.buckets[-1]
+
+    def summarize(self, by: str,
+                    outcome: str = 'outcome') -> Dict[str, Summary]:
+        """Sum up the series for every value of the label by."""
+
+        key = self.labels.index(by)
+        outcome_key = self.labels.index(outcome)
+
+        groups: Dict[str, Tuple[List[int], List[int]]] = {}
+        for labels, series in self.series.items():
+            counts, errors = groups.setdefault(
+                labels[key], ([0] * len(series.counts), [0])
+            )
+            for i, n in enumerate(series.counts):
+                counts[i] += n
+            if is_error(labels[outcome_key]):
+                errors[0] += series.count
+
+        return {
+            name: Summary(
+                sum(counts), errors[0],
+                self.quantile(0.5, counts), self.quantile(0.95, counts)
+            )
+            for name, (counts, errors) in groups.items()
+        }
+
+    def render(self) -> List[str]:
+        lines = []
+        for labels, series in sorted(self.series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), series.counts):
+                cumulative += n
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(
+                    f'{self.name}_bucket'
+                    f'{_format_labels(self.labels + ("le",), labels + (le,))}'
+                    f' {cumulative}'
+                )
+            tail = _format_labels(self.labels, labels)
+            lines.append(f'{self.name}_sum{tail} {series.sum}')
+            lines.append(f'{self.name}_count{tail} {series.count}')
+
+        return lines
+
+
+Metric = Union[Counter, Histogram]
+
+
+class Metrics:
+    """Every metric of the bot."""
+
+    def __init__(self) -> None:
+        self.metrics: Dict[str, Metric] = {}
+        self.started_at = time()
+
+        self._runner: Optional[web.AppRunner] = None
+
+    def counter(self, name: str, help: str,
+                labels: Sequence[str] = ()) -> Counter:
+        """Return the counter called name, creating it if needed."""
+
+        return self._get(Counter, name, help, labels)
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                    buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        """Return the histogram called name, creating it if needed."""
+
+        return self._get(Histogram, name, help, labels, buckets)
+
+    def render(self) -> str:
+        """Return every metric in the Prometheus text format."""
+
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines += metric.render()
+
+        return '\n'.join(lines) + '\n'
+
+    async def serve(self, host: str, port: int) -> None:
+        """Serve the metrics on http://host:port/metrics."""
+
+        async def handle(request: web.Request) -> web.Response:
+            return web.Response(
+                body=self.render().encode(),
+                headers={'Content-Type': CONTENT_TYPE}
+            )
+
+        app = web.Application()
+        app.router.add_get('/metrics', handle)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+        log.info("Serving metrics on http://%s:%d/metrics", host, port)
+
+    async def close(self) -> None:
+        """Stop serving the metrics."""
+
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def _get(self, cls: type, name: str, *args: Any) -> Any:
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = cls(name, *args)
+        elif not isinstance(metric, cls):
+            raise ValueError(f"{name} is already a {metric.kind}.")
+
+        return metric
+
+
+def instrument_discord(http: Any, metrics: Metrics) -> None:
+    """Time every call discord.py makes to Discord's REST API."""
+
+    # imported here so that this module doesn't need discord.py
+    from discord import HTTPException
+
+    latency = metrics.histogram(
+        'svbot_discord_request_seconds',
+        "Time taken by calls to Discord's REST API, rate limits included.",
+        ('route', 'outcome')
+    )
+    request: Callable[..., Awaitable[Any]] = http.request
+
+    async def timed_request(route: Any, **kwargs: Any) -> Any:
+        start = perf_counter()
+        outcome = 'error'
+        try:
+            result = await request(route, **kwargs)
+            outcome = 'ok'
+            return result
+        except HTTPException as ex:
+            outcome = str(ex.status)
+            raise
+        finally:
+            # the path has placeholders rather than IDs, e.g.
+            # /channels/{channel_id}/messages
+            latency.observe(
+                perf_counter() - start, f'{route.method} {route.path}',
+                outcome
+            )
+
+    http.request = timed_request
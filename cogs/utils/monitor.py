@@ -0,0 +1,172 @@
+"""
+Event loop monitor for SVBot.
+
+Anything that blocks the event loop holds up every cog, every shard and the
+gateway heartbeats. The LoopMonitor measures how late the loop runs a task
+that sleeps for a fixed interval, which is the loop's lag, and exports it
+as a histogram.
+
+A watchdog thread checks that the task keeps running. When the loop has
+been stuck for longer than the threshold, the thread captures the stack of
+the loop's thread and the command or task that was running; once the loop
+is back, the stall is logged with how long it lasted.
+"""
+
+
+import asyncio
+import logging
+import sys
+import threading
+import traceback
+from time import monotonic, perf_counter
+from typing import Any, List, NamedTuple, Optional
+from weakref import WeakKeyDictionary
+
+from .metrics import Metrics
+
+
+log = logging.getLogger(__name__)
+
+# how often the loop's lag is measured, in seconds
+INTERVAL = 0.1
+
+# how long the loop must be stuck to count as a stall, in seconds
+THRESHOLD = 0.25
+
+# frames of the stack logged with a stall, counted from the innermost
+STACK_DEPTH = 20
+
+LAG_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+    10.0
+)
+
+
+class Stall(NamedTuple):
+    """What the loop was doing when it got stuck."""
+
+    # the command that was running, or the task if it wasn't a command
+    source: str
+    stack: List[str]
+
+
+class LoopMonitor:
+    """Measure the event loop's lag and catch what blocks it."""
+
+    def __init__(self, metrics: Metrics, interval: float = INTERVAL,
+                    threshold: float = THRESHOLD) -> None:
+        self.interval = interval
+        self.threshold = threshold
+
+        self._lag = metrics.histogram(
+            'svbot_loop_lag_seconds',
+            "How late the event loop runs a task that sleeps.",
+            buckets=LAG_BUCKETS
+        )
+        self._stalls = metrics.histogram(
+            'svbot_loop_stall_seconds',
+            "Times the event loop was stuck, by what was running.",
+            ('source',), buckets=LAG_BUCKETS
+        )
+
+        # task -> the command it runs; read by the watchdog
+        self._commands: 'WeakKeyDictionary[asyncio.Task, str]' = (
+            WeakKeyDictionary()
+        )
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+        # when the loop last ran the sampling task, and the stall the
+        # watchdog caught since then; the thread only writes _stall
+        self._beat = monotonic()
+        self._stall: Optional[Stall] = None
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Start monitoring loop once it runs."""
+
+        self._loop = loop
+        self._task = loop.create_task(self._sample())
+
+    def enter(self, command: str) -> None:
+        """Attribute stalls in the current task to command."""
+
+        task = asyncio.current_task()
+        if task is not None:
+            self._commands[task] = command
+
+    def exit(self) -> None:
+        """Stop attributing stalls in the current task to a command."""
+
+        task = asyncio.current_task()
+        if task is not None:
+            self._commands.pop(task, None)
+
+    async def close(self) -> None:
+        """Stop the sampling task and the watchdog."""
+
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._watchdog is not None:
+            # it may be in the middle of capturing a stall, so it's waited
+            # for off the loop
+            watchdog, self._watchdog = self._watchdog, None
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(None, watchdog.join)
+
+    async def _sample(self) -> None:
+        self._thread_id = threading.get_ident()
+        self._beat = monotonic()
+        self._watchdog = threading.Thread(
+            target=self._watch, name='loop-watchdog', daemon=True
+        )
+        self._watchdog.start()
+
+        while True:
+            start = perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(perf_counter() - start - self.interval, 0.0)
+
+            self._beat = monotonic()
+            self._lag.observe(lag)
+
+            stall, self._stall = self._stall, None
+            if stall is not None:
+                self._stalls.observe(lag, stall.source)
+                log.warning(
+                    "The event loop was blocked for %.0f ms in %s:\n%s",
+                    1e3 * lag, stall.source, ''.join(stall.stack)
+                )
+
+    def _watch(self) -> None:
+        # runs on the watchdog thread
+        while not self._stopped.wait(self.threshold / 2):
+            stuck = monotonic() - self._beat - self.interval
+            if stuck > self.threshold and self._stall is None:
+                self._stall = self._capture()
+
+    def _capture(self) -> Stall:
+        # runs on the watchdog thread, while the loop's thread is stuck
+        frame = sys._current_frames().get(self._thread_id)
+        stack = (
+            traceback.format_stack(frame, STACK_DEPTH)
+            if frame is not None else []
+        )
+
+        task = asyncio.current_task(self._loop)
+        if task is None:
+            source = 'callback'
+        else:
+            source = self._commands.get(task) or _task_name(task)
+
+        return Stall(source, stack)
+
+
+def _task_name(task: Any) -> str:
+    coro = task.get_coro()
+    return getattr(coro, '__qualname__', None) or task.get_name()
@@ -0,0 +1,300 @@
+"""
+Outgoing message pipeline for SVBot.
+
+Every message the cogs send goes through the bot's Outbox. Messages are
+queued per channel and sent by one worker task per busy channel. Messages
+that arrive close together are merged into a single post, and posts are
+paced to stay within Discord's rate limits instead of running into 429s.
+"""
+
+
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from time import monotonic
+from typing import AsyncIterator, Deque, Dict, List, Optional
+
+import discord
+
+
+log = logging.getLogger(__name__)
+
+# the longest message Discord accepts
+MAX_MESSAGE_LEN = 2000
+
+# seconds added to the rate limit window of every channel: requests don't
+# reach Discord exactly when they're sent, and one that's a little late
+# would land in the next window and get a 429
+SLACK = 0.1
+
+
+class SlidingWindow:
+    """Allow at most rate events in any period of per seconds."""
+
+    def __init__(self, rate: int, per: float) -> None:
+        self.rate = rate
+        self.per = per
+
+        # the times of the last rate events, some maybe still to come
+        self._times: Deque[float] = deque(maxlen=rate)
+
+    def delay(self) -> float:
+        """Book the next free time and return how long to wait for it."""
+
+        now = monotonic()
+        at = now
+        if len(self._times) == self.rate:
+            # the event rate events before this one must be per seconds
+            # back
+            at = max(at, self._times[0] + self.per)
+        if self._times:
+            at = max(at, self._times[-1])
+
+        self._times.append(at)
+        return at - now
+
+    def idle(self) -> float:
+        """Return how long till the events so far hold up no others."""
+
+        if not self._times:
+            return 0.0
+
+        return max(0.0, self._times[-1] + self.per - monotonic())
+
+    async def acquire(self) -> None:
+        """Wait till an event is allowed."""
+
+        delay = self.delay()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class ResponseWindow:
+    """
+    Allow at most rate requests in any period of per seconds, counting each
+    one till per seconds after its response came back.
+
+    A request reaches Discord before its response comes back, however late
+    it was sent, so one sent per seconds after that can't land in the same
+    window.
+    """
+
+    def __init__(self, rate: int, per: float) -> None:
+        self.rate = rate
+        self.per = per
+        self._free = asyncio.Semaphore(rate)
+
+    @asynccontextmanager
+    async def hold(self) -> AsyncIterator[None]:
+        """Wait till a request is allowed, and count it while it's made."""
+
+        await self._free.acquire()
+        try:
+            yield
+        finally:
+            asyncio.get_event_loop().call_later(
+                self.per, self._free.release
+            )
+
+
+class _Message:
+    """A message waiting to be sent."""
+
+    __slots__ = ('content', 'queued', 'future')
+
+    def __init__(self, content: str, future: asyncio.Future) -> None:
+        self.content = content
+        self.queued = monotonic()
+        self.future = future
+
+
+class ChannelStats:
+    """Counters of the messages sent to one channel."""
+
+    def __init__(self) -> None:
+        self.queued = 0
+        self.sent = 0
+        self.posts = 0
+        self.failed = 0
+
+        # time from queueing a message to sending it, in seconds
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    @property
+    def latency_avg(self) -> float:
+        return self.latency_total / self.sent if self.sent else 0.0
+
+
+class _Channel:
+    """The queue of one channel."""
+
+    def __init__(self, channel: discord.abc.Messageable, rate: int,
+                    per: float) -> None:
+        self.channel = channel
+        self.pending: Deque[_Message] = deque()
+        self.limit = SlidingWindow(rate, per + SLACK)
+        self.worker: Optional[asyncio.Task] = None
+        self.stats = ChannelStats()
+
+
+class Outbox:
+    """Per-channel queues of outgoing messages."""
+
+    def __init__(self, window: float = 0.05, rate: int = 5, per: float = 5.0,
+                    global_rate: int = 50, global_per: float = 1.0) -> None:
+        # how long to wait for more messages to merge with the first one
+        self.window = window
+
+        # Discord's limit on messages per channel, and on all requests
+        self.rate = rate
+        self.per = per
+        self.global_limit = ResponseWindow(global_rate, global_per)
+
+        self._channels: Dict[int, _Channel] = {}
+
+    def post(self, channel: discord.abc.Messageable,
+                content: str) -> asyncio.Future:
+        """
+        Queue content to be sent to channel.
+
+        Return a future that resolves to the message it was sent in.
+        Cancelling the future before the message is sent drops it.
+        """
+
+        ch = self._channels.get(channel.id)
+        if ch is None:
+            ch = self._channels[channel.id] = _Channel(
+                channel, self.rate, self.per
+            )
+
+        future = asyncio.get_event_loop().create_future()
+        # failures are logged by the worker; callers that don't wait for the
+        # message shouldn't get asyncio's "exception never retrieved" too
+        future.add_done_callback(
+            lambda f: f.cancelled() or f.exception()
+        )
+        ch.pending.append(_Message(content, future))
+        ch.stats.queued += 1
+
+        if ch.worker is None or ch.worker.done():
+            ch.worker = asyncio.ensure_future(self._work(ch))
+
+        return future
+
+    async def send(self, channel: discord.abc.Messageable,
+                    content: str) -> discord.Message:
+        """Send content to channel and wait till it has been sent."""
+
+        return await self.post(channel, content)
+
+    def depth(self, channel: Optional[discord.abc.Messageable] = None) -> int:
+        """Return the number of messages waiting for channel, or for all."""
+
+        if channel is not None:
+            ch = self._channels.get(channel.id)
+            return 0 if ch is None else len(ch.pending)
+
+        return sum(len(ch.pending) for ch in self._channels.values())
+
+    def stats(self) -> Dict[int, ChannelStats]:
+        """Return the counters of the channels sent to lately, by ID."""
+
+        return {cid: ch.stats for cid, ch in self._channels.items()}
+
+    async def close(self, timeout: float = 5.0) -> None:
+        """Try to send what's left for a while, then drop the rest."""
+
+        workers = [
+            ch.worker for ch in self._channels.values()
+            if ch.worker is not None and not ch.worker.done()
+        ]
+        if not workers:
+            return
+
+        _, pending = await asyncio.wait(workers, timeout=timeout)
+        for w in pending:
+            w.cancel()
+
+    async def _work(self, ch: _Channel) -> None:
+        """Send the messages queued for a channel till none are left."""
+
+        while ch.pending:
+            if ch.pending[0].future.cancelled():
+                ch.pending.popleft()
+                continue
+
+            # give the messages that come right after this one a chance to
+            # be merged with it
+            wait = ch.pending[0].queued + self.window - monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+            await ch.limit.acquire()
+
+            try:
+                async with self.global_limit.hold():
+                    batch = self._take(ch.pending)
+                    if not batch:
+                        # they were all given up on while waiting
+                        continue
+                    content = '\n'.join(m.content for m in batch)
+
+                    message = await ch.channel.send(content)
+            except Exception as ex:
+                log.warning(
+                    "Couldn't send %d message(s) to channel %s: %s",
+                    len(batch), ch.channel.id, ex
+                )
+                ch.stats.failed += len(batch)
+                for m in batch:
+                    if not m.future.done():
+                        m.future.set_exception(ex)
+                continue
+
+            now = monotonic()
+            ch.stats.posts += 1
+            ch.stats.sent += len(batch)
+            for m in batch:
+                latency = now - m.queued
+                ch.stats.latency_total += latency
+                ch.stats.latency_max = max(ch.stats.latency_max, latency)
+                if not m.future.done():
+                    m.future.set_result(message)
+
+        # a channel is forgotten once its rate limit holds nothing back, so
+        # that the channels of DMs don't pile up
+        asyncio.get_event_loop().call_later(
+            ch.limit.idle(), self._forget, ch
+        )
+
+    def _forget(self, ch: _Channel) -> None:
+        if ch.pending or ch.limit.idle() > 0:
+            return
+
+        if self._channels.get(ch.channel.id) is ch:
+            del self._channels[ch.channel.id]
+
+    @staticmethod
+    def _take(pending: Deque[_Message]) -> List[_Message]:
+        """
+        Remove as many messages as fit into one post from pending.
+
+        Messages whose futures were cancelled are dropped on the way.
+        """
+
+        batch: List[_Message] = []
+        length = -1
+
+        while pending:
+            if pending[0].future.cancelled():
+                pending.popleft()
+                continue
+
+            length += 1 + len(pending[0].content)
+            if batch and length > MAX_MESSAGE_LEN:
+                break
+            batch.append(pending.popleft())
+
+        return batch
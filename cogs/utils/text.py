@@ -0,0 +1,96 @@
+"""Text functions for SVBot."""
+
+
+from typing import Dict, Iterable, List, Optional, Set
+
+
+def distance(a: str, b: str, limit: Optional[int] = None) -> int:
+    """
+    Return the edit distance of a and b; a swap of neighbours is one edit.
+
+    If limit is given, any distance over it is returned as limit + 1, and
+    only the cells of the table within limit of the diagonal are filled in.
+    """
+
+    if limit is None:
+        limit = max(len(a), len(b))
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+
+    over = limit + 1
+    prev2: List[int] = []
+    prev = [j if j <= limit else over for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        cur = [over] * (len(b) + 1)
+        if i <= limit:
+            cur[0] = i
+
+        for j in range(max(1, i - limit), min(len(b), i + limit) + 1):
+            cost = a[i - 1] != b[j - 1]
+            d = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if (i > 1 and j > 1 and a[i - 1] == b[j - 2]
+                    and a[i - 2] == b[j - 1]):
+                d = min(d, prev2[j - 2] + 1)
+            cur[j] = min(d, over)
+
+        if min(cur) > limit:
+            return over
+        prev2, prev = prev, cur
+
+    return prev[-1]
+
+
+def deletions(text: str, n: int) -> Set[str]:
+    """Return the strings left after deleting up to n characters."""
+
+    found = {text}
+    level = {text}
+    for _ in range(n):
+        level = {
+            s[:i] + s[i + 1:] for s in level for i in range(len(s))
+        }
+        found |= level
+
+    return found
+
+
+class TypoIndex:
+    """
+    Names indexed by the strings left after deleting up to max_distance of
+    their characters.
+
+    Two strings within max_distance edits of each other always share one of
+    those strings, so a query is only compared with the names it shares
+    one with instead of with every name.
+    """
+
+    def __init__(self, names: Iterable[str], max_distance: int) -> None:
+        self.max_distance = max_distance
+
+        self._index: Dict[str, List[str]] = {}
+        for name in names:
+            for variant in deletions(name, max_distance):
+                self._index.setdefault(variant, []).append(name)
+
+    def closest(self, query: str, max_distance: Optional[int] = None,
+                    limit: Optional[int] = None) -> List[str]:
+        """
+        Return the names at most max_distance edits from query, closest
+        and then shortest first.
+        """
+
+        if max_distance is None or max_distance > self.max_distance:
+            max_distance = self.max_distance
+
+        candidates: Set[str] = set()
+        for variant in deletions(query, max_distance):
+            candidates.update(self._index.get(variant, ()))
+
+        scored = []
+        for name in candidates:
+            d = distance(query, name, max_distance)
+            if d <= max_distance:
+                scored.append((d, len(name), name))
+        scored.sort()
+
+        return [name for _, _, name in scored[:limit]]
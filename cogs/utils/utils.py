@@ -1,9 +1,41 @@
 """Utility functions for SVBot."""
 
 
+async def send(ctx, msg):
+    """
+    Send a message to the channel of ctx.
+
+    The message goes through the bot's outbox, if it has one, and may be
+    merged with other messages for the same channel. This returns as soon as
+    the message is queued.
+    """
+
+    outbox = getattr(getattr(ctx, 'bot', None), 'outbox', None)
+    if outbox is None:
+        await ctx.send(msg)
+    else:
+        outbox.post(ctx.channel, msg)
+
+
+async def dm(bot, user, msg):
+    """
+    Send a direct message to user and wait till it has been sent.
+
+    Like send, the message goes through the bot's outbox, if it has one, so
+    that it counts towards the bot's rate limit.
+    """
+
+    outbox = getattr(bot, 'outbox', None)
+    if outbox is None:
+        return await user.send(msg)
+
+    return await outbox.send(user, msg)
+
+
 async def reply(ctx, msg):
     """Send a message but also tag the user."""
 
-    await ctx.send(
+    await send(
+        ctx,
         f"{ctx.author.mention} " + msg
     )
\ No newline at end of file
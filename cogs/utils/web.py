@@ -0,0 +1,254 @@
+"""
+HTTP client for SVBot.
+
+All cogs share the bot's HTTPClient. It keeps connections alive between
+requests, limits how many requests go to one host at a time, times requests
+out, retries those that fail in ways worth retrying, and keeps latency
+statistics for every endpoint it talks to, in the bot's metrics if it's
+given them. Nothing here blocks the event loop.
+"""
+
+
+import asyncio
+import json
+import logging
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from time import monotonic
+from typing import Any, Dict, Mapping, Optional
+
+import aiohttp
+
+from .metrics import Metrics
+
+log = logging.getLogger(__name__)
+
+# connections open at the same time, in total and to a single host
+MAX_CONNECTIONS = 100
+MAX_CONNECTIONS_PER_HOST = 10
+
+# seconds to wait for a whole request, and for the connection alone
+TIMEOUT = 10.0
+CONNECT_TIMEOUT = 3.0
+
+# times a failed request is tried again, and the base of the backoff in
+# seconds
+RETRIES = 2
+BACKOFF = 0.25
+
+# statuses that mean trying again later may work
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# the longest Retry-After waited for, in seconds; a response that asks for
+# longer is returned instead
+MAX_RETRY_AFTER = 10.0
+
+
+class RequestFailed(ConnectionError):
+    """A request couldn't be completed, even after retrying."""
+
+
+class Response:
+    """A response whose body has been read in full."""
+
+    def __init__(self, status: int, headers: Mapping[str, str],
+                    body: bytes) -> None:
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def json(self) -> Any:
+        return json.loads(self.body)
+
+
+def _retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """Return the seconds Retry-After asks to wait, if it's given."""
+
+    value = headers.get('Retry-After')
+    if value is None:
+        return None
+
+    # either a number of seconds or an HTTP date
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class EndpointStats:
+    """Counters of the requests made to one endpoint."""
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.retries = 0
+        self.failed = 0
+
+        # time from starting a request to reading its response, in seconds,
+        # retries included
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    @property
+    def latency_avg(self) -> float:
+        return self.latency_total / self.requests if self.requests else 0.0
+
+
+class HTTPClient:
+    """A pool of keep-alive HTTP connections shared by all cogs."""
+
+    def __init__(self, max_connections: int = MAX_CONNECTIONS,
+                    max_per_host: int = MAX_CONNECTIONS_PER_HOST,
+                    timeout: float = TIMEOUT,
+                    connect_timeout: float = CONNECT_TIMEOUT,
+                    retries: int = RETRIES, backoff: float = BACKOFF,
+                    metrics: Optional[Metrics] = None) -> None:
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.timeout = aiohttp.ClientTimeout(
+            total=timeout, connect=connect_timeout
+        )
+        self.retries = retries
+        self.backoff = backoff
+
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._stats: Dict[str, EndpointStats] = {}
+
+        self._latency = self._retries = None
+        if metrics is not None:
+            self._latency = metrics.histogram(
+                'svbot_http_request_seconds',
+                "Time taken by requests to web APIs, retries included.",
+                ('endpoint', 'outcome')
+            )
+            self._retries = metrics.counter(
+                'svbot_http_retries_total',
+                "Requests to web APIs that were tried again.",
+                ('endpoint',)
+            )
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """The session, which is opened on first use."""
+
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.max_connections,
+                    limit_per_host=self.max_per_host
+                ),
+                timeout=self.timeout
+            )
+
+        return self._session
+
+    async def get(self, url: str, *, endpoint: Optional[str] = None,
+                    **kwargs) -> Response:
+        """Send a GET request; see request."""
+
+        return await self.request('GET', url, endpoint=endpoint, **kwargs)
+
+    async def request(self, method: str, url: str, *,
+                        endpoint: Optional[str] = None,
+                        **kwargs) -> Response:
+        """
+        Send a request and return its response.
+
+        Requests that time out, can't connect or get a status in
+        RETRY_STATUSES are tried again after a random, growing delay, or
+        after the delay the response's Retry-After asks for; one that asks
+        for more than MAX_RETRY_AFTER isn't tried again. The last response
+        is returned whatever its status; RequestFailed is raised if there's
+        none. Statistics are kept under endpoint, which defaults to the URL
+        without its query; only that name is logged, as queries may hold
+        API keys.
+
+        Other keyword arguments are passed to aiohttp.
+        """
+
+        endpoint = endpoint or url.split('?', 1)[0]
+        stats = self._stats.setdefault(endpoint, EndpointStats())
+        stats.requests += 1
+        start = monotonic()
+
+        # the status of the response, or failed if there's none
+        outcome = 'failed'
+        try:
+            response = await self._request(
+                method, url, endpoint, stats, kwargs
+            )
+            outcome = str(response.status)
+            return response
+        except RequestFailed:
+            stats.failed += 1
+            raise
+        finally:
+            latency = monotonic() - start
+            stats.latency_total += latency
+            stats.latency_max = max(stats.latency_max, latency)
+            if self._latency is not None:
+                self._latency.observe(latency, endpoint, outcome)
+
+    async def _request(self, method: str, url: str, endpoint: str,
+                        stats: EndpointStats,
+                        kwargs: Dict[str, Any]) -> Response:
+        # the last response, and the error of the last attempt if it got
+        # none
+        response: Optional[Response] = None
+        error: Optional[Exception] = None
+
+        # how long the server asked to wait before trying again, if it did
+        retry_after: Optional[float] = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                stats.retries += 1
+                if self._retries is not None:
+                    self._retries.inc(endpoint)
+
+                delay = retry_after
+                if delay is None:
+                    # full jitter keeps clients that failed together from
+                    # retrying together
+                    delay = random.uniform(0, self.backoff * 2 ** attempt)
+                await asyncio.sleep(delay)
+                retry_after = None
+
+            try:
+                async with self.session.request(method, url, **kwargs) as r:
+                    response = Response(r.status, r.headers, await r.read())
+            except (aiohttp.ClientError, asyncio.TimeoutError) as ex:
+                log.info("%s %s failed: %r", method, endpoint, ex)
+                error = ex
+                continue
+
+            if response.status not in RETRY_STATUSES:
+                return response
+
+            retry_after = _retry_after(response.headers)
+            if retry_after is not None and retry_after > MAX_RETRY_AFTER:
+                return response
+
+        # a response, even one worth retrying, says more than an error
+        if response is not None:
+            return response
+        raise RequestFailed(f"{method} {endpoint} failed: {error!r}")
+
+    def stats(self) -> Dict[str, EndpointStats]:
+        """Return the statistics of every endpoint."""
+
+        return dict(self._stats)
+
+    async def close(self) -> None:
+        """Close every connection."""
+
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
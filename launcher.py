@@ -0,0 +1,228 @@
+"""
+Run the shards of the bot in several processes on one machine.
+
+    python launcher.py [processes] [shards]
+
+The shards are split into contiguous ranges, one range per process, and
+every process runs a complete bot for the guilds of its shards. By default
+there is a process per core and as many shards as Discord recommends.
+
+The processes take turns to IDENTIFY, as Discord only allows one IDENTIFY
+every few seconds. A process that dies is started again; if it keeps
+dying, it's started again less and less often.
+"""
+
+
+import asyncio
+import logging
+import multiprocessing
+import signal
+import sys
+import time
+from os import cpu_count, getenv
+from typing import Any, Callable, Dict, List, Optional
+
+import discord
+
+import bot
+
+
+log = logging.getLogger('launcher')
+
+# how long to wait before starting a process that died again, in seconds;
+# doubled every time it dies soon after starting, up to the maximum
+RESTART_DELAY = 5.0
+MAX_RESTART_DELAY = 300.0
+
+# a process that ran this long before it died is considered healthy, in
+# seconds
+STABLE_UPTIME = 600.0
+
+# seconds between two checks of the processes
+CHECK_INTERVAL = 1.0
+
+# how long processes get to exit when the launcher stops, in seconds
+STOP_TIMEOUT = 10.0
+
+# runs the given shards in the current process; called in every process of
+# the cluster with the ID of the process, its shards, the total number of
+# shards and the lock shared by the processes
+ClusterTarget = Callable[[int, List[int], int, Any], None]
+
+
+def shard_ranges(shard_count: int, processes: int) -> List[List[int]]:
+    """Split the shards into contiguous ranges of nearly the same size."""
+
+    processes = max(1, min(processes, shard_count))
+    size, extra = divmod(shard_count, processes)
+
+    ranges = []
+    start = 0
+    for i in range(processes):
+        end = start + size + (i < extra)
+        ranges.append(list(range(start, end)))
+        start = end
+
+    return ranges
+
+
+async def recommended_shards(token: str) -> int:
+    """Return the number of shards Discord recommends for the bot."""
+
+    http = discord.http.HTTPClient()
+    try:
+        await http.static_login(token, bot=True)
+        shard_count, _ = await http.get_bot_gateway()
+    finally:
+        await http.close()
+
+    return shard_count
+
+
+def run_cluster(cluster_id: int, shard_ids: List[int], shard_count: int,
+                identify_slot: Any) -> None:
+    """
+    Run one process of the cluster.
+
+    If METRICS_PORT is set, every process serves its metrics on the port
+    after it, in order: cluster 0 on METRICS_PORT, cluster 1 on the next.
+    """
+
+    port = getenv('METRICS_PORT')
+
+    bot.main(
+        sharded=True, shard_ids=shard_ids, shard_count=shard_count,
+        identify_slot=identify_slot,
+        metrics_port=int(port) + cluster_id if port else None
+    )
+
+
+class Launcher:
+    """The processes of the cluster, started again when they die."""
+
+    def __init__(self, shard_count: int, processes: int,
+                    target: ClusterTarget = run_cluster) -> None:
+        self.shard_count = shard_count
+        self.ranges = shard_ranges(shard_count, processes)
+        self.target = target
+
+        # every process starts afresh rather than as a copy of this one
+        self._mp = multiprocessing.get_context('spawn')
+
+        # the time the next shard may IDENTIFY, booked by the processes in
+        # turn; nothing is held while they wait, so one may die meanwhile
+        self.identify_slot = self._mp.Value('d', 0.0)
+
+        # cluster id -> its process, when it was started, the delay before
+        # it's started again and when that will be
+        self.processes: Dict[int, multiprocessing.Process] = {}
+        self._started_at: Dict[int, float] = {}
+        self._delays: Dict[int, float] = {}
+        self._restart_at: Dict[int, float] = {}
+
+        self.restarts = 0
+        self._stopping = False
+
+    def start(self) -> None:
+        """Start every process."""
+
+        log.info(
+            "Running %d shards in %d processes.",
+            self.shard_count, len(self.ranges)
+        )
+        for cluster_id in range(len(self.ranges)):
+            self._start(cluster_id)
+
+    def check(self) -> None:
+        """Start the processes that died again, once their delay is over."""
+
+        now = time.monotonic()
+        for cluster_id, process in self.processes.items():
+            if self._stopping or process.is_alive():
+                continue
+
+            if cluster_id not in self._restart_at:
+                uptime = now - self._started_at[cluster_id]
+                delay = self._delays.get(cluster_id, RESTART_DELAY)
+                if uptime >= STABLE_UPTIME:
+                    delay = RESTART_DELAY
+
+                log.warning(
+                    "Cluster %d exited with code %s after %.0fs; starting "
+                    "it again in %.0fs.",
+                    cluster_id, process.exitcode, uptime, delay
+                )
+                self._restart_at[cluster_id] = now + delay
+                self._delays[cluster_id] = min(2 * delay, MAX_RESTART_DELAY)
+
+            elif now >= self._restart_at[cluster_id]:
+                del self._restart_at[cluster_id]
+                self.restarts += 1
+                self._start(cluster_id)
+
+    def run(self) -> None:
+        """Start the processes and keep them running till SIGTERM."""
+
+        signal.signal(signal.SIGTERM, lambda *_: self.stop())
+
+        self.start()
+        try:
+            while not self._stopping:
+                self.check()
+                time.sleep(CHECK_INTERVAL)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self) -> None:
+        """Stop every process."""
+
+        self._stopping = True
+
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+
+        deadline = time.monotonic() + STOP_TIMEOUT
+        for process in self.processes.values():
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                process.kill()
+                process.join()
+
+    def _start(self, cluster_id: int) -> None:
+        shard_ids = self.ranges[cluster_id]
+
+        process = self._mp.Process(
+            target=self.target,
+            args=(cluster_id, shard_ids, self.shard_count, self.identify_slot),
+            name=f'cluster-{cluster_id}'
+        )
+        process.start()
+
+        self.processes[cluster_id] = process
+        self._started_at[cluster_id] = time.monotonic()
+
+        log.info(
+            "Started cluster %d (shards %d-%d), pid %d.",
+            cluster_id, shard_ids[0], shard_ids[-1], process.pid
+        )
+
+
+def main(processes: Optional[int] = None,
+            shard_count: Optional[int] = None) -> None:
+    bot.configure()
+
+    if processes is None:
+        processes = cpu_count() or 1
+    if shard_count is None:
+        shard_count = asyncio.run(
+            recommended_shards(getenv('DISCORD_TOKEN'))
+        )
+
+    Launcher(shard_count, processes).run()
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,41 @@
+"""Tests for the dog picture buffer of the DogPicture Cog."""
+
+
+import asyncio
+import itertools
+
+from cogs.DogPictureAux.Buffer import Image, ImageBuffer
+
+
+def test_refill_fills_the_buffer_in_batches():
+    ids = itertools.count()
+    asked = []
+
+    async def fetch(count):
+        # the API gives at most 10 pictures per request
+        asked.append(count)
+        return [
+            Image(f'dog{n}', f'https://cdn.example/dog{n}.jpg')
+            for n in itertools.islice(ids, min(count, 10))
+        ]
+
+    async def test():
+        images = ImageBuffer(fetch, capacity=25)
+        await images.refill()
+        assert len(images) == 25
+        assert asked == [25, 15, 5]
+
+    asyncio.run(test())
+
+
+def test_refill_stops_when_a_batch_brings_nothing_new():
+    async def fetch(count):
+        return [Image('dog0', 'https://cdn.example/dog0.jpg')]
+
+    async def test():
+        images = ImageBuffer(fetch, capacity=25)
+        await images.refill()
+        assert len(images) == 1
+        assert images.fetches == 2
+
+    asyncio.run(test())
@@ -0,0 +1,111 @@
+"""Tests for the database layer, on a stand-in for the connection pool."""
+
+
+import psycopg2
+import pytest
+
+from cogs.utils.db import Database
+
+
+class FakeConnection:
+    """A connection whose statements run the given function."""
+
+    def __init__(self, execute) -> None:
+        self.execute = execute
+        self.closed = 0
+        self.used_at = float('inf')
+        self.prepared = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+class FakeCursor:
+    def __init__(self, conn: FakeConnection) -> None:
+        self.connection = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, query, args=()):
+        self.connection.execute(self.connection, query)
+
+
+class FakePool:
+    """Hands out a new connection every time, and counts them."""
+
+    def __init__(self, execute) -> None:
+        self.execute = execute
+        self.checked_out = 0
+        self.closed = 0
+
+    def getconn(self):
+        self.checked_out += 1
+        return FakeConnection(self.execute)
+
+    def putconn(self, conn, close=False):
+        if close:
+            conn.closed = 1
+            self.closed += 1
+
+
+def database(execute) -> Database:
+    db = Database('fake')
+    db._pool = FakePool(execute)
+    return db
+
+
+def test_dropped_connection_is_retried_once():
+    calls = []
+
+    def execute(conn, query):
+        calls.append(query)
+        if len(calls) == 1:
+            # what psycopg2 does when the server goes away
+            conn.closed = 2
+            raise psycopg2.OperationalError("server closed the connection")
+
+    db = database(execute)
+    db._run(lambda cur: cur.execute("SELECT 1"))
+
+    assert calls == ["SELECT 1", "SELECT 1"]
+    assert db._pool.closed == 1
+
+
+def test_failed_statement_is_not_retried():
+    calls = []
+
+    def execute(conn, query):
+        calls.append(query)
+        raise psycopg2.extensions.QueryCanceledError(
+            "canceling statement due to statement timeout"
+        )
+
+    db = database(execute)
+    with pytest.raises(psycopg2.extensions.QueryCanceledError):
+        db._run(lambda cur: cur.execute("UPDATE t SET n = n + 1"))
+
+    assert calls == ["UPDATE t SET n = n + 1"]
+    # the connection is still replaced, since it may be in a bad state
+    assert db._pool.closed == 1
+
+
+def test_connection_dropped_twice_fails():
+    def execute(conn, query):
+        conn.closed = 2
+        raise psycopg2.OperationalError("server closed the connection")
+
+    db = database(execute)
+    with pytest.raises(psycopg2.OperationalError):
+        db._run(lambda cur: cur.execute("SELECT 1"))
+
+    assert db._pool.checked_out == 2
@@ -0,0 +1,26 @@
+"""Tests for the equity calculator behind !odds."""
+
+
+import pytest
+
+from cogs.PokerAux import Equity
+from cogs.PokerAux.Cards import Card
+
+
+def hands(n: int):
+    return [[Card.from_code(2 * i), Card.from_code(2 * i + 1)]
+            for i in range(n)]
+
+
+@pytest.mark.parametrize('n', [24, 25, 26])
+def test_too_many_hands_for_a_board(n):
+    with pytest.raises(ValueError, match="Not enough cards left"):
+        Equity.equity(hands(n))
+
+
+def test_most_hands_a_board_can_be_dealt_for():
+    # six cards are left, so every board is dealt
+    odds = Equity.equity(hands(23))
+
+    assert len(odds) == 23
+    assert sum(o.equity for o in odds) == pytest.approx(1.0)
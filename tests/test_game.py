@@ -0,0 +1,53 @@
+"""Tests for the turns of a game of poker."""
+
+
+import asyncio
+from typing import List
+
+from cogs.PokerAux import Headless, Implementation
+from cogs.PokerAux.Headless import FakeChannel, FakeContext
+
+
+class RecordingChannel(FakeChannel):
+    """A channel that keeps what it's sent."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.messages: List[str] = []
+
+    async def send(self, content: str) -> None:
+        self.messages.append(content)
+
+
+def test_no_one_acts_while_the_cards_are_dealt():
+    async def test():
+        channel = RecordingChannel()
+        game = Headless.new_game(3, channel)
+
+        # the hole cards take a while to reach the players
+        delivered = asyncio.Event()
+
+        async def slow_dm(content):
+            await delivered.wait()
+
+        for p in game.players:
+            p.member.send = slow_dm
+
+        preflop = asyncio.ensure_future(game.preflop(seed=1))
+        await asyncio.sleep(0)
+
+        ctx = FakeContext(game.players[0].member, channel)
+        await Implementation.turn(game, ctx)
+        assert not await Implementation.runnable(game, ctx)
+        assert channel.messages[-2:] == [
+            "The cards are being dealt. No one is to act yet.",
+            "<@1> The cards are being dealt. Please wait a moment.",
+        ]
+
+        delivered.set()
+        await preflop
+
+        await Implementation.turn(game, ctx)
+        assert channel.messages[-1].startswith("It's <@")
+
+    asyncio.run(test())
@@ -0,0 +1,63 @@
+"""Tests for the pacing of the IDENTIFYs of a cluster's shards."""
+
+
+import asyncio
+import multiprocessing
+from functools import partial
+from time import perf_counter
+from types import SimpleNamespace
+
+import pytest
+
+import bot
+
+
+def shard_process(slot) -> SimpleNamespace:
+    """Return a stand-in for the bot of one process of the cluster."""
+
+    return SimpleNamespace(identify_slot=slot, identify_interval=0.5)
+
+
+def test_turns_are_spaced_by_the_interval():
+    slot = multiprocessing.Value('d', 0.0)
+    processes = [shard_process(slot) for _ in range(3)]
+
+    delays = [
+        bot.ShardedSVBot._book_identify(p) for p in processes + processes
+    ]
+
+    # the bookings take a moment, which comes off the waits
+    assert delays == pytest.approx([0.0, 0.5, 1.0, 1.5, 2.0, 2.5], abs=0.1)
+
+
+def test_slot_is_free_between_bookings():
+    slot = multiprocessing.Value('d', 0.0)
+    bot.ShardedSVBot._book_identify(shard_process(slot))
+
+    # a process that dies while waiting for its turn holds up no one
+    lock = slot.get_lock()
+    assert lock.acquire(timeout=0)
+    lock.release()
+
+
+def test_locked_slot_still_paces_identifies(monkeypatch):
+    monkeypatch.setattr(bot, 'IDENTIFY_LOCK_TIMEOUT', 0.05)
+    # a plain lock, since the thread that holds it asks for it again
+    slot = multiprocessing.Value('d', 0.0, lock=multiprocessing.Lock())
+
+    # held by a process that died while booking
+    slot.get_lock().acquire()
+
+    async def test():
+        process = shard_process(slot)
+        process.loop = asyncio.get_event_loop()
+        process._book_identify = partial(
+            bot.ShardedSVBot._book_identify, process
+        )
+
+        start = perf_counter()
+        await bot.ShardedSVBot.before_identify_hook(process, 1)
+        return perf_counter() - start
+
+    # the wait for the lock, then a whole interval
+    assert asyncio.run(test()) >= 0.05 + 0.5
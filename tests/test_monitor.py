@@ -0,0 +1,44 @@
+"""Tests for the event loop monitor."""
+
+
+import asyncio
+import threading
+import time
+
+from cogs.utils.metrics import Metrics
+from cogs.utils.monitor import LoopMonitor
+
+
+def test_close_does_not_block_the_loop():
+    async def test():
+        monitor = LoopMonitor(Metrics(), interval=0.01)
+        monitor.start(asyncio.get_event_loop())
+        await asyncio.sleep(0.05)
+        watchdog = monitor._watchdog
+        assert watchdog.is_alive()
+
+        # a watchdog that takes a while to stop, like one capturing a stall
+        slow = threading.Thread(target=time.sleep, args=(0.3,))
+        slow.start()
+        monitor._watchdog = slow
+
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.get_event_loop().create_task(tick())
+        await monitor.close()
+        ticker.cancel()
+
+        assert not slow.is_alive()
+        # the loop kept running while it stopped
+        assert ticks > 10
+
+        watchdog.join(1)
+        assert not watchdog.is_alive()
+
+    asyncio.run(test())
@@ -0,0 +1,104 @@
+"""Tests for the outgoing message pipeline."""
+
+
+import asyncio
+from time import monotonic
+from typing import List
+
+from cogs.utils.outbox import Outbox, ResponseWindow
+
+
+class FakeChannel:
+    """A channel that keeps what it's sent."""
+
+    def __init__(self, id: int = 1) -> None:
+        self.id = id
+        self.sent: List[str] = []
+
+    async def send(self, content: str) -> str:
+        self.sent.append(content)
+        return content
+
+
+def test_messages_close_together_are_merged():
+    async def test():
+        outbox = Outbox()
+        channel = FakeChannel()
+        first = outbox.post(channel, 'one')
+        second = outbox.post(channel, 'two')
+
+        assert await first == await second == 'one\ntwo'
+        assert channel.sent == ['one\ntwo']
+
+    asyncio.run(test())
+
+
+def test_cancelled_message_isnt_sent():
+    async def test():
+        outbox = Outbox()
+        channel = FakeChannel()
+        kept = outbox.post(channel, 'kept')
+        outbox.post(channel, 'given up').cancel()
+
+        await kept
+        assert channel.sent == ['kept']
+
+    asyncio.run(test())
+
+
+def test_send_that_times_out_is_dropped():
+    async def test():
+        # one message per 0.3s in the channel
+        outbox = Outbox(window=0.0, rate=1, per=0.2)
+        channel = FakeChannel()
+        await outbox.send(channel, 'first')
+
+        try:
+            await asyncio.wait_for(outbox.send(channel, 'late'), 0.05)
+        except asyncio.TimeoutError:
+            pass
+        await asyncio.sleep(0.5)
+
+        assert channel.sent == ['first']
+
+    asyncio.run(test())
+
+
+def test_idle_channels_are_forgotten():
+    async def test():
+        outbox = Outbox(window=0.0, rate=1, per=0.1)
+        channels = [FakeChannel(id) for id in range(1, 4)]
+        for channel in channels:
+            await outbox.send(channel, 'hi')
+
+        # their rate limits still hold the next messages back
+        assert sorted(outbox.stats()) == [1, 2, 3]
+
+        await asyncio.sleep(0.3)
+        assert outbox.stats() == {}
+
+        # and they can be sent to again
+        await outbox.send(channels[0], 'again')
+        assert channels[0].sent == ['hi', 'again']
+
+    asyncio.run(test())
+
+
+def test_global_limit_counts_requests_till_their_responses():
+    async def test():
+        window = ResponseWindow(2, 0.2)
+        starts: List[float] = []
+
+        async def request():
+            async with window.hold():
+                starts.append(monotonic())
+                # the request is slow to come back
+                await asyncio.sleep(0.1)
+
+        await asyncio.gather(*(request() for _ in range(3)))
+
+        # the third waits for per seconds after the first came back, not
+        # after it was sent
+        assert starts[2] - starts[0] >= 0.29
+
+    asyncio.run(test())
@@ -0,0 +1,144 @@
+"""
+Tests for the pot ledger of the Poker Cog.
+
+The payout of random hands is compared with a reference that splits the
+pot into layers between every two amounts players put in, without any side
+pot bookkeeping. It's slow, but it's plainly right.
+"""
+
+
+import random
+from fractions import Fraction
+from typing import Dict, Tuple
+
+import pytest
+
+from cogs.PokerAux.Headless import FakeMember
+from cogs.PokerAux.Player import Player
+from cogs.PokerAux.Pots import PotLedger
+
+
+HANDS = 3000
+
+
+def reference_payout(contributions: Dict[Player, int],
+                        scores: Dict[Player, int]) -> Dict[Player, Fraction]:
+    """Return the exact share of every player; split chips are fractions."""
+
+    shares = {p: Fraction(0) for p in scores}
+    live_top = max(contributions[p] for p in scores)
+
+    prev = 0
+    for level in sorted(set(contributions.values())):
+        amount = sum(
+            min(c, level) - min(c, prev) for c in contributions.values()
+        )
+        prev = level
+        if not amount:
+            continue
+
+        # chips folded players put in above every live player go to those
+        # who put in the most
+        eligible = [
+            p for p in scores if contributions[p] >= min(level, live_top)
+        ]
+        best = max(scores[p] for p in eligible)
+        winners = [p for p in eligible if scores[p] == best]
+
+        for p in winners:
+            shares[p] += Fraction(amount, len(winners))
+
+    return shares
+
+
+def random_hand(rng: random.Random) -> Tuple[PotLedger, Dict[Player, int]]:
+    """
+    Bet four streets between players with stacks of all sizes; return the
+    ledger and the scores of the players who didn't fold.
+    """
+
+    players = [
+        Player(FakeMember(i + 1), rng.choice((
+            rng.randint(1, 30), rng.randint(30, 300), rng.randint(300, 3000)
+        )))
+        for i in range(rng.randint(2, 8))
+    ]
+
+    ledger = PotLedger()
+    for _ in range(4):
+        # every player who's still in matches the street's bet, or goes
+        # all-in for less
+        bet = rng.choice((0, rng.randint(1, 50), rng.randint(50, 1000)))
+        for p in players:
+            if not p.not_folded or p.chips == 0:
+                continue
+            if rng.random() < 0.15:
+                p.not_folded = False
+                continue
+
+            amt = min(p.chips, bet)
+            p.chips -= amt
+            ledger.add(p, amt, all_in=p.chips == 0)
+        ledger.end_street()
+
+    live = [p for p in players if p.not_folded]
+    if not live:
+        live = [players[0]]
+        players[0].not_folded = True
+        ledger.add(players[0], 0)
+
+    # few strengths, so that hands tie often
+    scores = {p: rng.randint(1, 4) for p in live}
+    return ledger, scores
+
+
+@pytest.mark.parametrize('seed', range(HANDS))
+def test_payout_matches_reference(seed):
+    rng = random.Random(seed)
+    ledger, scores = random_hand(rng)
+    contributions = dict(ledger.contributions)
+
+    pots = ledger.pots()
+    assert sum(pot.amount for pot in pots) == ledger.total
+
+    paid = ledger.payout(scores, rng)
+    assert sum(paid.values()) == ledger.total
+
+    # only the odd chips of split pots, fewer than the players sharing
+    # each one and all given to a random winner, may differ from the exact
+    # shares
+    slack = sum(len(pot.eligible) for pot in pots)
+    for p, share in reference_payout(contributions, scores).items():
+        assert abs(paid[p] - share) < slack
+
+
+def test_short_all_in_only_wins_what_it_matched():
+    short, big, other = (Player(FakeMember(i), 0) for i in (1, 2, 3))
+
+    ledger = PotLedger()
+    ledger.add(short, 50, all_in=True)
+    ledger.add(big, 200)
+    ledger.add(other, 200)
+
+    pots = ledger.pots()
+    assert [pot.amount for pot in pots] == [150, 300]
+    assert pots[0].eligible == [short, big, other]
+    assert pots[1].eligible == [big, other]
+
+    paid = ledger.payout({short: 3, big: 2, other: 1}, random.Random(0))
+    assert paid == {short: 150, big: 300, other: 0}
+
+
+def test_folded_chips_go_to_the_pot():
+    folded, a, b = (Player(FakeMember(i), 0) for i in (1, 2, 3))
+
+    ledger = PotLedger()
+    ledger.add(folded, 100)
+    ledger.add(a, 40, all_in=True)
+    ledger.add(b, 60, all_in=True)
+    folded.not_folded = False
+
+    paid = ledger.payout({a: 1, b: 1}, random.Random(0))
+    assert sum(paid.values()) == 200
+    # a ties b, so both split what a can reach; the rest is b's
+    assert paid == {a: 60, b: 140}
@@ -0,0 +1,89 @@
+"""Tests for the sticker registry of the Stickers Cog."""
+
+
+import asyncio
+import random
+import string
+
+import cogs.StickersAux.Registry as registry
+import cogs.utils.text as text
+from cogs.StickersAux.Registry import (
+    MAX_DISTANCE, StickerIndex, StickerRegistry
+)
+from cogs.utils.text import distance
+
+
+def _brute_closest(stickers, name, limit):
+    scored = sorted(
+        (distance(name, s, MAX_DISTANCE), len(s), s) for s in stickers
+    )
+    return [s for d, _, s in scored if d <= MAX_DISTANCE][:limit]
+
+
+def test_closest_finds_what_a_scan_finds():
+    rng = random.Random(0)
+    letters = string.ascii_lowercase[:6]
+    stickers = {
+        ''.join(rng.choice(letters) for _ in range(rng.randint(1, 8))):
+            'https://cdn.example/s.png'
+        for _ in range(500)
+    }
+    index = StickerIndex(stickers)
+
+    for _ in range(300):
+        name = ''.join(
+            rng.choice(letters) for _ in range(rng.randint(1, 9))
+        )
+        assert index.closest(name, 5) == _brute_closest(stickers, name, 5)
+
+
+def test_suggestions():
+    index = StickerIndex({
+        name: 'https://cdn.example/s.png'
+        for name in ('hello', 'help', 'helpme', 'yellow', 'cat')
+    })
+
+    assert index.closest(' Helo ') == ['help', 'hello']
+    assert index.closest('yelow') == ['yellow']
+    assert index.suggest('hel', 3) == ['help', 'hello', 'helpme']
+    assert index.closest('dog') == []
+
+
+def test_closest_does_not_compare_every_sticker(monkeypatch):
+    index = StickerIndex({
+        f'sticker{n}': 'https://cdn.example/s.png' for n in range(1000)
+    })
+
+    calls = []
+
+    def counting(a, b, limit=None):
+        calls.append(b)
+        return distance(a, b, limit)
+
+    monkeypatch.setattr(text, 'distance', counting)
+    monkeypatch.setattr(registry, 'distance', counting, raising=False)
+
+    assert index.closest('stikcer12', 3) == [
+        'sticker12', 'sticker1', 'sticker2'
+    ]
+    assert len(calls) < 100
+
+
+def test_missing_file_keeps_the_stickers(tmp_path):
+    path = tmp_path / 'stickers.txt'
+    path.write_text('hello https://cdn.example/hello.png\n')
+
+    async def test():
+        reg = StickerRegistry(str(path))
+        assert (await reg.get_index()).get('hello')
+
+        path.unlink()
+        assert not await reg.reload()
+        assert (await reg.get_index()).get('hello')
+
+        # S_FILENAME unset
+        unset = StickerRegistry(None)
+        assert not await unset.reload()
+        assert len(await unset.get_index()) == 0
+
+    asyncio.run(test())
@@ -0,0 +1,128 @@
+"""Tests for reloading extensions in place."""
+
+
+import asyncio
+import os
+
+import pytest
+from discord import ClientException
+from discord.ext import commands
+
+from bot import SVBot
+
+
+TZ_FILE = os.path.join(os.path.dirname(__file__), '..', 'tzinfo.txt')
+
+
+async def stickers_bot(tmp_path, monkeypatch) -> SVBot:
+    stickers = tmp_path / 'stickers.txt'
+    stickers.write_text('hello https://example.com/hello.png\n')
+    monkeypatch.setenv('S_FILENAME', str(stickers))
+
+    bot = SVBot(command_prefix='!')
+    bot.load_extension('cogs.Stickers')
+    bot.load_extension('cogs.UtilityCog')
+    return bot
+
+
+def test_reload_replaces_the_cogs_of_the_extension(tmp_path, monkeypatch):
+    async def test():
+        bot = await stickers_bot(tmp_path, monkeypatch)
+        try:
+            assert sorted(c.__module__ for c in bot.cogs.values()) == [
+                'cogs.Stickers', 'cogs.UtilityCog'
+            ]
+            old = bot.get_cog('Stickers')
+            utility = bot.get_cog('UtilityCog')
+
+            bot.reload('cogs.Stickers')
+            await asyncio.sleep(0)
+
+            new = bot.get_cog('Stickers')
+            assert new is not old
+            assert old._watch_task.cancelled()
+            assert not new._watch_task.done()
+
+            # the registry went to the new version, not to another cog
+            assert new.s_reg is old.s_reg
+            assert bot.get_cog('UtilityCog') is utility
+        finally:
+            await bot.close()
+
+    asyncio.run(test())
+
+
+def test_cog_names_are_unique(tmp_path, monkeypatch):
+    class Stickers(commands.Cog):
+        pass
+
+    async def test():
+        bot = await stickers_bot(tmp_path, monkeypatch)
+        try:
+            with pytest.raises(ClientException):
+                bot.add_cog(Stickers())
+            assert bot.get_cog('Stickers').__module__ == 'cogs.Stickers'
+        finally:
+            await bot.close()
+
+    asyncio.run(test())
+
+
+
+async def next_live_stream_bot(monkeypatch) -> SVBot:
+    monkeypatch.setenv('TZ_FILENAME', TZ_FILE)
+
+    # the bot never connects, so its warm-ups wait, and the database isn't
+    # read
+    bot = SVBot(command_prefix='!')
+    bot.load_extension('cogs.NextLiveStream')
+    return bot
+
+
+def test_loads_still_running_are_started_again(monkeypatch):
+    async def test():
+        bot = await next_live_stream_bot(monkeypatch)
+        try:
+            old = bot.get_cog('NextLiveStreamCog')
+            bot.reload('cogs.NextLiveStream')
+            await asyncio.sleep(0)
+
+            assert old._tz_load_task.cancelled()
+            assert old._reminders_load_task.cancelled()
+
+            new = bot.get_cog('NextLiveStreamCog')
+            assert new.member_timezones is not old.member_timezones
+            assert new.reminders is not old.reminders
+            assert not new._tz_load_task.done()
+            assert not new._reminders_load_task.done()
+
+            # what needs no loading is still handed over
+            assert new.schedule is old.schedule
+        finally:
+            await bot.close()
+
+    asyncio.run(test())
+
+
+def test_loaded_state_is_handed_over(monkeypatch):
+    async def test():
+        bot = await next_live_stream_bot(monkeypatch)
+        try:
+            old = bot.get_cog('NextLiveStreamCog')
+            for name in ('_tz_load_task', '_reminders_load_task'):
+                getattr(old, name).cancel()
+                loaded = asyncio.get_event_loop().create_future()
+                loaded.set_result(None)
+                setattr(old, name, loaded)
+
+            bot.reload('cogs.NextLiveStream')
+
+            new = bot.get_cog('NextLiveStreamCog')
+            assert new.member_timezones is old.member_timezones
+            assert new.reminders is old.reminders
+            assert new._tz_load_task is None
+            assert new._reminders_load_task is None
+        finally:
+            await bot.close()
+
+    asyncio.run(test())
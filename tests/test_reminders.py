@@ -0,0 +1,74 @@
+"""Tests for the livestream reminders of the NextLiveStream Cog."""
+
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from time import perf_counter
+
+from cogs.NextLiveStreamAux.Calendar import Livestream
+from cogs.NextLiveStreamAux.Reminders import Reminders
+from cogs.utils.db import Database
+
+
+# seconds it takes to look a member up before a DM
+LOOKUP_DELAY = 0.1
+
+
+async def no_table() -> None:
+    pass
+
+
+def test_dms_are_delivered_concurrently():
+    delivered = []
+
+    async def deliver(channel_id, member_id, text):
+        if member_id is not None:
+            await asyncio.sleep(LOOKUP_DELAY)
+        delivered.append((channel_id, member_id))
+
+    async def test():
+        reminders = Reminders(Database('fake'), 'tz', no_table, deliver)
+
+        start = datetime.now(timezone.utc) + timedelta(hours=1)
+        reminders.reschedule([
+            Livestream(start, start + timedelta(hours=2), 'Study with me')
+        ])
+        for member_id in range(1, 21):
+            reminders._subscribe(member_id, 15, None)
+        for member_id in range(21, 26):
+            reminders._subscribe(member_id, 15, 1000)
+
+        began = perf_counter()
+        await reminders._remind(start, 15)
+        return perf_counter() - began, reminders
+
+    elapsed, reminders = asyncio.run(test())
+
+    assert sorted(m for c, m in delivered if c is None) == list(range(1, 21))
+    assert [c for c, m in delivered if c is not None] == [1000]
+    assert reminders.sent == 25
+
+    # one lookup's time, not twenty
+    assert elapsed < 5 * LOOKUP_DELAY
+
+
+def test_failed_delivery_doesnt_stop_the_others():
+    delivered = []
+
+    async def deliver(channel_id, member_id, text):
+        if member_id == 2:
+            raise ConnectionError("Unknown user")
+        delivered.append(member_id)
+
+    async def test():
+        reminders = Reminders(Database('fake'), 'tz', no_table, deliver)
+
+        start = datetime.now(timezone.utc) + timedelta(hours=1)
+        reminders.reschedule([Livestream(start, start + timedelta(hours=2))])
+        for member_id in (1, 2, 3):
+            reminders._subscribe(member_id, 30, None)
+
+        await reminders._remind(start, 30)
+
+    asyncio.run(test())
+    assert sorted(delivered) == [1, 3]
@@ -0,0 +1,97 @@
+"""Tests for the timezone resolver of the NextLiveStream Cog."""
+
+
+import asyncio
+import os
+import threading
+
+import pytest
+
+from bot import SVBot
+from cogs.NextLiveStreamAux.Resolver import TimezoneResolver
+from cogs.utils.text import distance
+
+
+TZ_FILE = os.path.join(os.path.dirname(__file__), '..', 'tzinfo.txt')
+
+
+@pytest.fixture(scope='module')
+def resolver():
+    with open(TZ_FILE) as f:
+        aliases = dict(line.split() for line in f if line.strip())
+    return TimezoneResolver(aliases)
+
+
+@pytest.mark.parametrize('query, zone', [
+    ('india', 'Asia/Kolkata'),
+    ('Heleen', 'Europe/Brussels'),
+    ('kolkata', 'Asia/Kolkata'),
+    ('Asia/Tokyo', 'Asia/Tokyo'),
+    ('new york', 'America/New_York'),
+])
+def test_exact_names(resolver, query, zone):
+    resolution = resolver.resolve(query)
+    assert (resolution.zone, resolution.match) == (zone, 'exact')
+
+
+@pytest.mark.parametrize('query', ['ist', 'can', 'kolk'])
+def test_completions_are_not_exact(resolver, query):
+    resolution = resolver.resolve(query)
+    assert resolution.match == 'prefix'
+    assert resolution.name != query
+    assert resolution.name.startswith(query)
+
+
+@pytest.mark.parametrize('query, name', [
+    ('japna', 'japan'),
+    ('kolkatta', 'kolkata'),
+])
+def test_typos(resolver, query, name):
+    resolution = resolver.resolve(query)
+    assert (resolution.name, resolution.match) == (name, 'typo')
+    assert resolution.distance == distance(query, name)
+
+
+def test_nothing_close(resolver):
+    assert resolver.resolve('qqqqqqqq') is None
+
+
+def test_distance_counts_swaps_as_one_edit():
+    assert distance('japan', 'jpaan') == 1
+    assert distance('kitten', 'sitting') == 3
+    assert distance('kitten', 'sitting', limit=1) == 2
+
+
+def test_commands_wait_for_the_one_build(monkeypatch):
+    monkeypatch.setenv('TZ_FILENAME', TZ_FILE)
+
+    built_on = []
+
+    async def test():
+        # the bot never connects, so the warm-up doesn't start the build
+        bot = SVBot(command_prefix='!')
+        bot.load_extension('cogs.NextLiveStream')
+        try:
+            cog = bot.get_cog('NextLiveStreamCog')
+            read = cog._get_timezones
+
+            def counted():
+                built_on.append(threading.get_ident())
+                return read()
+
+            monkeypatch.setattr(cog, '_get_timezones', counted)
+
+            first, second = await asyncio.gather(
+                cog._get_resolver(), cog._get_resolver()
+            )
+            assert first is second is cog.resolver
+            assert cog.timezones['india'] == 'Asia/Kolkata'
+            assert await cog._get_resolver() is first
+        finally:
+            await bot.close()
+
+    asyncio.run(test())
+
+    # built once, and not on the event loop
+    assert len(built_on) == 1
+    assert built_on[0] != threading.get_ident()
@@ -0,0 +1,342 @@
+"""
+Tests for the synced copy of the study calendar.
+
+A local stand-in for the Calendar API serves the events of a recorded
+listing (fixtures/calendar_events.json), filtered like Google filters them:
+timeMin and timeMax by the time of the event, updatedMin by when it was last
+changed, cancelled events only with showDeleted, and maxResults to a page.
+The tests change the calendar between syncs like its owners would, and
+check the store keeps up.
+"""
+
+
+import asyncio
+import copy
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from cogs.NextLiveStreamAux import Schedule
+from cogs.NextLiveStreamAux.Schedule import EventStore
+from cogs.utils.web import HTTPClient
+
+
+FIXTURE = os.path.join(
+    os.path.dirname(__file__), 'fixtures', 'calendar_events.json'
+)
+
+# when the listing was recorded, and when the tests start
+START = datetime(2021, 1, 4, 12, 0, tzinfo=timezone.utc)
+
+# the ids of the events in the fixture are this followed by their number
+ID_PREFIX = '4k2s9bq1m0vtn8h3c6r7p5e'
+
+
+def event_id(n: int) -> str:
+    return f'{ID_PREFIX}{n:02d}'
+
+
+def parse_time(text: str) -> datetime:
+    if text.endswith('Z'):
+        text = text[:-1] + '+00:00'
+    return datetime.fromisoformat(text)
+
+
+def rfc3339(time: datetime) -> str:
+    return time.astimezone(timezone.utc).isoformat(
+        timespec='milliseconds'
+    ).replace('+00:00', 'Z')
+
+
+class Clock:
+    """The time the store sees, moved by the tests."""
+
+    now = START
+
+
+class FrozenDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return Clock.now.astimezone(tz)
+
+
+class FakeCalendar:
+    """The events.list endpoint of one calendar."""
+
+    def __init__(self) -> None:
+        with open(FIXTURE) as f:
+            self.items: List[Dict[str, Any]] = json.load(f)['items']
+
+        # the parameters of every request
+        self.requests: List[Dict[str, str]] = []
+
+    def item(self, n: int) -> Dict[str, Any]:
+        return next(i for i in self.items if i['id'] == event_id(n))
+
+    def move(self, n: int, start: datetime, hours: int = 2) -> None:
+        item = self.item(n)
+        item['start'] = {'dateTime': start.isoformat()}
+        end = start + timedelta(hours=hours)
+        item['end'] = {'dateTime': end.isoformat()}
+        item['sequence'] += 1
+        item['updated'] = rfc3339(Clock.now)
+
+    def cancel(self, n: int) -> None:
+        # a cancelled event keeps only its id and status, like Google's
+        item = self.item(n)
+        item.clear()
+        item.update({
+            'kind': 'calendar#event', 'id': event_id(n),
+            'status': 'cancelled', 'updated': rfc3339(Clock.now),
+        })
+
+    def add(self, n: int, start: datetime, summary: str) -> None:
+        self.items.append({
+            'kind': 'calendar#event', 'id': event_id(n),
+            'status': 'confirmed', 'summary': summary, 'sequence': 0,
+            'created': rfc3339(Clock.now), 'updated': rfc3339(Clock.now),
+            'start': {'dateTime': start.isoformat()},
+            'end': {'dateTime': (start + timedelta(hours=2)).isoformat()},
+        })
+
+    def listing(self, params: Dict[str, str]) -> Dict[str, Any]:
+        items = []
+        for item in self.items:
+            if item['status'] == 'cancelled':
+                if params.get('showDeleted') != 'true':
+                    continue
+            elif not self._in_range(item, params):
+                continue
+
+            if ('updatedMin' in params and parse_time(item['updated'])
+                    < parse_time(params['updatedMin'])):
+                continue
+
+            items.append(item)
+
+        offset = int(params.get('pageToken', 0))
+        size = int(params.get('maxResults', 250))
+        page = {
+            'kind': 'calendar#events',
+            'items': copy.deepcopy(items[offset:offset + size]),
+        }
+        if offset + size < len(items):
+            page['nextPageToken'] = str(offset + size)
+
+        return page
+
+    @staticmethod
+    def _in_range(item: Dict[str, Any], params: Dict[str, str]) -> bool:
+        def time(field):
+            if 'dateTime' in field:
+                return parse_time(field['dateTime'])
+            return datetime.fromisoformat(field['date']).replace(
+                tzinfo=timezone.utc
+            )
+
+        start, end = time(item['start']), time(item['end'])
+        if 'timeMin' in params and end <= parse_time(params['timeMin']):
+            return False
+        if 'timeMax' in params and start >= parse_time(params['timeMax']):
+            return False
+        return True
+
+    async def handle(self, request: web.Request) -> web.Response:
+        params = dict(request.query)
+        assert params.pop('key') == 'test'
+        self.requests.append(params)
+        return web.json_response(self.listing(params))
+
+
+@pytest.fixture
+def calendar(monkeypatch):
+    Clock.now = START
+    monkeypatch.setattr(Schedule, 'datetime', FrozenDatetime)
+    # small pages, so that listings take a few of them
+    monkeypatch.setattr(Schedule, 'PAGE_SIZE', 2)
+    return FakeCalendar()
+
+
+def run(calendar: FakeCalendar, test) -> None:
+    """Run test with a store that syncs from calendar over HTTP."""
+
+    async def main():
+        app = web.Application()
+        app.router.add_get(
+            '/calendar/v3/calendars/{calendar_id}/events', calendar.handle
+        )
+        server = TestServer(app)
+        await server.start_server()
+        client = HTTPClient(retries=0)
+
+        async def fetch_page(params):
+            resp = await client.get(
+                str(server.make_url(
+                    '/calendar/v3/calendars/study@group.calendar.google.com'
+                    '/events'
+                )),
+                params=dict(params, key='test')
+            )
+            if resp.status != 200:
+                raise ConnectionError(f"GET failed: {resp.status}")
+            return resp.json()
+
+        try:
+            await test(EventStore(fetch_page))
+        finally:
+            await client.close()
+            await server.close()
+
+    asyncio.run(main())
+
+
+def ids(store: EventStore) -> List[str]:
+    """Return the ids of the streams that haven't ended, in order."""
+
+    return [i for i in store._order if store._events[i].end > Clock.now]
+
+
+def numbers(*ns: int) -> List[str]:
+    return [event_id(n) for n in ns]
+
+
+async def later(store: EventStore, minutes: int = 10) -> None:
+    """Let time pass and sync again."""
+
+    Clock.now += timedelta(minutes=minutes)
+    await store.sync()
+
+
+def test_full_sync_keeps_the_timed_events_of_the_window(calendar):
+    async def test(store):
+        await store.sync()
+
+        # not the stream that's over, the all-day event or the stream after
+        # the window
+        assert ids(store) == numbers(2, 3, 4, 5, 7)
+        assert store.full_syncs == 1
+
+        stream = store.next_livestream()
+        assert stream.start == datetime(2021, 1, 4, 16, tzinfo=timezone.utc)
+        assert stream.summary == 'Study with me (2h pomodoro)'
+
+        # every page of the listing was asked for
+        assert [r.get('pageToken') for r in calendar.requests] == [
+            None, '2', '4'
+        ]
+        assert all(r['singleEvents'] == 'true' for r in calendar.requests)
+
+    run(calendar, test)
+
+
+def test_incremental_sync_only_asks_for_changes(calendar):
+    async def test(store):
+        await store.sync()
+        calendar.requests.clear()
+
+        await later(store)
+        assert store.incremental_syncs == 1
+        assert ids(store) == numbers(2, 3, 4, 5, 7)
+
+        (request,) = calendar.requests
+        assert request['showDeleted'] == 'true'
+        # the past isn't listed, but the changes after the window are
+        assert parse_time(request['timeMin']) == Clock.now
+        assert 'timeMax' not in request
+        assert parse_time(request['updatedMin']) == (
+            START - Schedule.CLOCK_SKEW
+        )
+
+    run(calendar, test)
+
+
+def test_cancelled_event_is_dropped(calendar):
+    async def test(store):
+        await store.sync()
+
+        calendar.cancel(3)
+        await later(store)
+
+        assert ids(store) == numbers(2, 4, 5, 7)
+
+    run(calendar, test)
+
+
+def test_event_moved_into_the_window_is_added(calendar):
+    async def test(store):
+        await store.sync()
+
+        calendar.move(8, datetime(2021, 1, 12, 16, tzinfo=timezone.utc))
+        calendar.add(9, START + timedelta(hours=1), 'Surprise stream')
+        await later(store)
+
+        assert ids(store) == numbers(9, 2, 3, 4, 5, 8, 7)
+        assert store.next_livestream().summary == 'Surprise stream'
+
+    run(calendar, test)
+
+
+def test_event_moved_out_of_the_window_is_dropped(calendar):
+    async def test(store):
+        await store.sync()
+
+        calendar.move(4, datetime(2021, 2, 20, 8, tzinfo=timezone.utc))
+        await later(store)
+
+        assert ids(store) == numbers(2, 3, 5, 7)
+
+    run(calendar, test)
+
+
+def test_event_moved_into_the_past_is_dropped_by_the_full_sync(calendar):
+    async def test(store):
+        await store.sync()
+
+        calendar.move(5, datetime(2021, 1, 2, 16, tzinfo=timezone.utc))
+        await later(store)
+
+        store._full_sync_at -= Schedule.FULL_SYNC_INTERVAL
+        await later(store)
+        assert ids(store) == numbers(2, 3, 4, 7)
+
+    run(calendar, test)
+
+
+def test_event_moved_within_the_window_is_reordered(calendar):
+    async def test(store):
+        await store.sync()
+
+        calendar.move(7, datetime(2021, 1, 5, 16, tzinfo=timezone.utc))
+        await later(store)
+
+        assert ids(store) == numbers(2, 7, 3, 4, 5)
+        assert store.upcoming(START + timedelta(days=2)) == [
+            store._events[i] for i in numbers(2, 7)
+        ]
+
+    run(calendar, test)
+
+
+def test_ended_streams_are_dropped_and_window_moves_daily(calendar):
+    async def test(store):
+        await store.sync()
+
+        # the first stream is over
+        Clock.now = datetime(2021, 1, 4, 19, 30, tzinfo=timezone.utc)
+        await store.sync()
+        assert numbers(2)[0] not in store._events
+
+        # a day later the window is listed again, and reaches the stream
+        # that was after it
+        Clock.now = START + timedelta(days=10)
+        store._full_sync_at -= Schedule.FULL_SYNC_INTERVAL
+        await store.sync()
+        assert store.full_syncs == 2
+        assert ids(store) == numbers(7, 8)
+
+    run(calendar, test)
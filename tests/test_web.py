@@ -0,0 +1,251 @@
+"""Tests for the HTTP client, against a local stand-in server."""
+
+
+import asyncio
+from typing import Awaitable, Callable, List
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from cogs.utils import web as web_client
+from cogs.utils.metrics import Metrics
+from cogs.utils.web import HTTPClient, RequestFailed
+
+
+Handler = Callable[[web.Request], Awaitable[web.StreamResponse]]
+
+
+def run(handler: Handler,
+        test: Callable[[TestServer], Awaitable[None]]) -> None:
+    """Serve handler on /api on a local port and run test against it."""
+
+    async def main():
+        app = web.Application()
+        app.router.add_get('/api', handler)
+        server = TestServer(app)
+        await server.start_server()
+        try:
+            await test(server)
+        finally:
+            await server.close()
+
+    asyncio.run(main())
+
+
+def url(server: TestServer) -> str:
+    return str(server.make_url('/api'))
+
+
+def failing(times: int, status: int = 503) -> Handler:
+    """Return a handler that answers status the first times requests."""
+
+    calls = 0
+
+    async def handler(request):
+        nonlocal calls
+        calls += 1
+        if calls <= times:
+            return web.Response(status=status)
+        return web.json_response({'calls': calls})
+
+    return handler
+
+
+def test_retries_until_it_works():
+    metrics = Metrics()
+
+    async def test(server):
+        client = HTTPClient(backoff=0.01, metrics=metrics)
+        try:
+            resp = await client.get(url(server) + '?key=secret')
+        finally:
+            await client.close()
+
+        assert resp.status == 200
+        assert resp.json() == {'calls': 3}
+
+        # the query, which may hold an API key, isn't part of the name
+        stats = client.stats()[url(server)]
+        assert (stats.requests, stats.retries, stats.failed) == (1, 2, 0)
+        assert 0 < stats.latency_avg <= stats.latency_max
+
+    run(failing(2), test)
+    assert 'svbot_http_retries_total' in metrics.render()
+
+
+def test_returns_the_last_response_once_out_of_retries():
+    async def test(server):
+        client = HTTPClient(retries=1, backoff=0.01)
+        try:
+            resp = await client.get(url(server), endpoint='api')
+        finally:
+            await client.close()
+
+        assert resp.status == 503
+        stats = client.stats()['api']
+        assert (stats.requests, stats.retries, stats.failed) == (1, 1, 0)
+
+    run(failing(5), test)
+
+
+def test_client_errors_are_not_retried():
+    async def test(server):
+        client = HTTPClient(backoff=0.01)
+        try:
+            resp = await client.get(url(server), endpoint='api')
+        finally:
+            await client.close()
+
+        assert resp.status == 404
+        assert client.stats()['api'].retries == 0
+
+    run(failing(5, status=404), test)
+
+
+def test_backoff_has_full_jitter(monkeypatch):
+    delays: List[tuple] = []
+
+    def uniform(a, b):
+        delays.append((a, b))
+        return 0.0
+
+    monkeypatch.setattr(web_client.random, 'uniform', uniform)
+
+    async def test(server):
+        client = HTTPClient(retries=2, backoff=0.25)
+        try:
+            await client.get(url(server))
+        finally:
+            await client.close()
+
+    run(failing(5), test)
+    assert delays == [(0, 0.5), (0, 1.0)]
+
+
+def test_retry_after_is_honoured(monkeypatch):
+    delays: List[tuple] = []
+
+    def uniform(a, b):
+        delays.append((a, b))
+        return 0.0
+
+    monkeypatch.setattr(web_client.random, 'uniform', uniform)
+
+    calls = 0
+
+    async def rate_limited(request):
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            return web.Response(status=429, headers={'Retry-After': '0.3'})
+        if calls == 2:
+            # a date in the past: try again at once
+            return web.Response(status=429, headers={
+                'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'
+            })
+        return web.json_response({'calls': calls})
+
+    async def test(server):
+        client = HTTPClient(retries=2, backoff=0.01)
+        try:
+            start = asyncio.get_event_loop().time()
+            resp = await client.get(url(server))
+            elapsed = asyncio.get_event_loop().time() - start
+        finally:
+            await client.close()
+
+        assert resp.json() == {'calls': 3}
+        assert 0.3 <= elapsed < 1.0
+
+    run(rate_limited, test)
+    # no jitter was used in place of either delay
+    assert delays == []
+
+
+def test_long_retry_after_is_not_waited_for():
+    async def rate_limited(request):
+        return web.Response(status=429, headers={'Retry-After': '3600'})
+
+    async def test(server):
+        client = HTTPClient(retries=2, backoff=0.01)
+        try:
+            resp = await client.get(url(server), endpoint='api')
+        finally:
+            await client.close()
+
+        assert resp.status == 429
+        assert client.stats()['api'].retries == 0
+
+    run(rate_limited, test)
+
+
+def test_timeout_raises_request_failed():
+    async def slow(request):
+        await asyncio.sleep(1.0)
+        return web.Response()
+
+    async def test(server):
+        client = HTTPClient(timeout=0.1, retries=1, backoff=0.01)
+        try:
+            with pytest.raises(RequestFailed):
+                await client.get(url(server), endpoint='api')
+        finally:
+            await client.close()
+
+        stats = client.stats()['api']
+        assert (stats.requests, stats.retries, stats.failed) == (1, 1, 1)
+
+    run(slow, test)
+
+
+def test_response_is_kept_when_the_last_attempt_fails():
+    calls = 0
+
+    async def unavailable_then_slow(request):
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            return web.Response(status=503)
+        await asyncio.sleep(1.0)
+        return web.Response()
+
+    async def test(server):
+        client = HTTPClient(timeout=0.1, retries=1, backoff=0.01)
+        try:
+            resp = await client.get(url(server), endpoint='api')
+        finally:
+            await client.close()
+
+        assert resp.status == 503
+        stats = client.stats()['api']
+        assert (stats.requests, stats.retries, stats.failed) == (1, 1, 0)
+
+    run(unavailable_then_slow, test)
+
+
+def test_requests_to_one_host_are_limited():
+    running = 0
+    most = 0
+
+    async def handler(request):
+        nonlocal running, most
+        running += 1
+        most = max(most, running)
+        await asyncio.sleep(0.05)
+        running -= 1
+        return web.Response()
+
+    async def test(server):
+        client = HTTPClient(max_per_host=2)
+        try:
+            responses = await asyncio.gather(*(
+                client.get(url(server)) for _ in range(8)
+            ))
+        finally:
+            await client.close()
+
+        assert [r.status for r in responses] == [200] * 8
+
+    run(handler, test)
+    assert most == 2